@@ -0,0 +1,111 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+"""Struct benchmark.
+
+Times building pool members and virtual server profiles with suds'
+typefactory, and with a StructFactory, against the WSDLs of a fake
+iControl portal.
+
+Usage:
+  bench_structs.py [options]
+
+Options:
+  -h --help            Show this screen
+  --members=<n>        Members to build [default: 10000]
+  --repeat=<n>         Best of <n> runs [default: 3]
+"""
+
+import shutil
+import tempfile
+import time
+
+from docopt import docopt
+
+import fake_icontrol
+import load_balancer
+import structs
+
+VSP = 'LocalLB.VirtualServer.VirtualServerProfile'
+
+
+def typefactory_members(pool, n):
+    members = []
+    for i in xrange(n):
+        member = pool.typefactory.create('Common.AddressPort')
+        member.address = '10.0.{0}.{1}'.format(i // 256, i % 256)
+        member.port = 80
+        members.append(member)
+    return members
+
+
+def struct_factory_members(pool, n):
+    factory = structs.StructFactory(pool)
+    return [factory.create('Common.AddressPort',
+                           address='10.0.{0}.{1}'.format(i // 256, i % 256),
+                           port=80) for i in xrange(n)]
+
+
+def typefactory_profiles(virtual_server, n):
+    profiles = []
+    for i in xrange(n):
+        vsp = virtual_server.typefactory.create(VSP)
+        vsp.profile_context = 'PROFILE_CONTEXT_TYPE_ALL'
+        vsp.profile_name = '/Common/tcp'
+        profiles.append(vsp)
+    return profiles
+
+
+def struct_factory_profiles(virtual_server, n):
+    factory = structs.StructFactory(virtual_server)
+    return [factory.create(VSP, profile_context='PROFILE_CONTEXT_TYPE_ALL',
+                           profile_name='/Common/tcp') for i in xrange(n)]
+
+
+def best_of(repeat, fn, *args):
+    times = []
+    for i in xrange(repeat):
+        start = time.time()
+        fn(*args)
+        times.append(time.time() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    n = int(args['--members'])
+    repeat = int(args['--repeat'])
+    server = fake_icontrol.FakeIControlServer().start()
+    wsdls = tempfile.mkdtemp()
+    try:
+        b = load_balancer.BigIP(host=server.host, proto='http',
+                                wsdl_cache=wsdls)
+        pool = b.pc.LocalLB.Pool
+        virtual_server = b.pc.LocalLB.VirtualServer
+        for name, slow, fast, interface in [
+                ('Common.AddressPort', typefactory_members,
+                 struct_factory_members, pool),
+                (VSP, typefactory_profiles, struct_factory_profiles,
+                 virtual_server)]:
+            t_slow = best_of(repeat, slow, interface, n)
+            t_fast = best_of(repeat, fast, interface, n)
+            print '{0} x {1}'.format(name, n)
+            print '  typefactory    {0:8.3f}s'.format(t_slow)
+            print '  StructFactory  {0:8.3f}s  ({1:.1f}x)'.format(
+                t_fast, t_slow / t_fast)
+    finally:
+        server.stop()
+        shutil.rmtree(wsdls)
@@ -0,0 +1,266 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import cPickle as pickle
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+import yaml
+
+import cert
+import utils
+
+# libyaml's loader parses many times faster, when PyYAML was built with it.
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'),
+                                 '.bigpyp', 'catalog')
+CACHE_VERSION = 1
+
+
+class Vip(object):
+    """
+    One VIP of a catalog, with every name derived from it computed once.
+    Key and certificate paths are relative to `Cert.FILE_BASEDIR`, and None
+    when the domain has no zone.  `digest` hashes the VIP's definition.
+    """
+
+    __slots__ = ('name',
+                 'domain',
+                 'ip',
+                 'front_port',
+                 'back_port',
+                 'monitor',
+                 'members',
+                 'public',
+                 'zone',
+                 'pool',
+                 'virtual_server',
+                 'ssl_profile',
+                 'key_path',
+                 'cert_path',
+                 'digest')
+
+    def __init__(self, name, vip_dict):
+        """
+        Construct a Vip with the supplied args.
+
+        :param name: A string containing the VIP name.
+        :param vip_dict: A dict containing the VIP's configuration.
+        :returns: None
+        """
+        domain = vip_dict['dns']
+        self.name = name
+        self.domain = domain
+        self.ip = vip_dict['ip']
+        self.front_port = vip_dict['front_port']
+        self.back_port = vip_dict['back_port']
+        self.monitor = vip_dict['monitor']
+        self.members = tuple(vip_dict['members'] or ())
+        self.public = utils.public_domain(domain)
+        match = cert.Cert.RE_ZONE.search(domain)
+        self.zone = match.group(1) if match else None
+        self.pool = utils.pool_name(domain, self.back_port)
+        self.virtual_server = '/Common/{0}_{1}'.format(domain,
+                                                       self.front_port)
+        self.ssl_profile = utils.ssl_profile_name(domain)
+        if self.zone:
+            path = os.path.join(self.zone, domain)
+            self.key_path = os.path.join(path, '{0}.pem'.format(domain))
+            self.cert_path = os.path.join(path, '{0}.crt'.format(domain))
+        else:
+            self.key_path = self.cert_path = None
+        self.digest = hashlib.sha1(json.dumps(vip_dict,
+                                              sort_keys=True)).hexdigest()
+
+    def __repr__(self):
+        return '<Vip {0} {1}:{2}>'.format(self.name, self.ip, self.front_port)
+
+
+class VipCatalog(object):
+    """
+    The VIPs of a zone, built once from its catalog, and indexed by domain,
+    by address and by pool.  `public` holds the VIPs served on a public
+    domain, and `configured` the ones with at least one member.
+    """
+
+    def __init__(self, vips_dict):
+        """
+        Construct a VipCatalog with the supplied args.
+
+        :param vips_dict: A dict containing VIP configuration, as returned
+                          by `load`.
+        :returns: None
+        """
+        vips = vips_dict.get('load_balancing') or {}
+        self._index([Vip(name, vips[name]) for name in sorted(vips)])
+
+    def subset(self, vips):
+        """
+        Return a VipCatalog holding only `vips`.
+
+        :param vips: A list of Vip objects of this catalog.
+        :returns: VipCatalog
+        """
+        subset = VipCatalog({})
+        subset._index(list(vips))
+        return subset
+
+    def _index(self, vips):
+        self.vips = vips
+        self.by_domain = {}
+        self.by_address = {}
+        self.by_pool = {}
+        self.public = [vip for vip in self.vips if vip.public]
+        self.configured = [vip for vip in self.vips if vip.members]
+        for vip in self.vips:
+            self.by_domain.setdefault(vip.domain, []).append(vip)
+            self.by_address[(vip.ip, vip.front_port)] = vip
+            self.by_pool.setdefault(vip.pool, []).append(vip)
+
+    def __iter__(self):
+        return iter(self.vips)
+
+    def __len__(self):
+        return len(self.vips)
+
+
+def catalog_files(path):
+    """
+    Return the YAML files of a catalog.
+
+    :param path: A string containing a catalog file, or a directory of
+                 catalog fragments.
+    :returns: list
+    """
+    if not os.path.isdir(path):
+        return [path]
+    files = glob.glob(os.path.join(path, '*.yml'))
+    files.extend(glob.glob(os.path.join(path, '*.yaml')))
+    return sorted(files)
+
+
+def file_stats(path):
+    """
+    Return the mtime and size of each YAML file of a catalog, which change
+    whenever a file is edited, added or removed.
+
+    :param path: A string containing a catalog file, or a directory of
+                 catalog fragments.
+    :returns: list of (file, mtime, size) tuples
+    """
+    return [(f, os.path.getmtime(f), os.path.getsize(f))
+            for f in catalog_files(path)]
+
+
+def parse(documents):
+    """
+    Parse and merge catalog documents into one catalog.
+
+    :param documents: A list of (file name, YAML string) tuples.
+    :returns: dict
+    :raises: ValueError when two documents define the same VIP
+    """
+    catalog = {'load_balancing': {}}
+    origin = {}
+    for name, data in documents:
+        doc = yaml.load(data, Loader=Loader) or {}
+        vips = doc.pop('load_balancing', None) or {}
+        for vipname, vip_dict in vips.iteritems():
+            if vipname in origin:
+                msg = '{0} is defined in both {1} and {2}'.format(
+                    vipname, origin[vipname], name)
+                raise ValueError(msg)
+            origin[vipname] = name
+            catalog['load_balancing'][vipname] = vip_dict
+        catalog.update(doc)
+    return catalog
+
+
+def load(path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load and return a catalog, from the cache when its files are unchanged.
+
+    The cache is trusted while every file keeps its mtime and size.  When
+    one changed, the files are hashed, and parsed again only when their
+    content differs from what was cached.
+
+    :param path: A string containing a catalog file, or a directory of
+                 catalog fragments.
+    :param cache_dir: A string containing the cache directory, or None to
+                      always parse.
+    :returns: dict
+    """
+    if cache_dir is None:
+        return parse(_read(catalog_files(path)))
+
+    stats = file_stats(path)
+    files = [f for f, mtime, size in stats]
+    cache_file = os.path.join(
+        cache_dir,
+        '{0}.pickle'.format(hashlib.sha1(os.path.abspath(path)).hexdigest()))
+    cached = _load_cache(cache_file)
+    if cached and cached['stats'] == stats:
+        return cached['catalog']
+
+    documents = _read(files)
+    digest = hashlib.sha1()
+    for name, data in documents:
+        digest.update(name)
+        digest.update(data)
+    digest = digest.hexdigest()
+    if cached and cached['digest'] == digest:
+        catalog = cached['catalog']
+    else:
+        catalog = parse(documents)
+    _save_cache(cache_file, {'version': CACHE_VERSION,
+                             'stats': stats,
+                             'digest': digest,
+                             'catalog': catalog})
+    return catalog
+
+
+def _read(files):
+    documents = []
+    for f in files:
+        with open(f, 'r') as file:
+            documents.append((os.path.basename(f), file.read()))
+    return documents
+
+
+def _load_cache(cache_file):
+    try:
+        with open(cache_file, 'rb') as file:
+            cached = pickle.load(file)
+    except Exception:
+        # Missing, or written by another version; parse again.
+        return None
+    if cached.get('version') != CACHE_VERSION:
+        return None
+    return cached
+
+
+def _save_cache(cache_file, cached):
+    directory = os.path.dirname(cache_file)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    with os.fdopen(fd, 'wb') as file:
+        pickle.dump(cached, file, pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp, cache_file)
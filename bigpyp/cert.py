@@ -14,7 +14,6 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 
-import datetime
 import os
 import re
 
@@ -33,46 +32,22 @@ class Cert(object):
     INTERMEDIATE_BUNDLE = '/Common/verisign_intermediate_bundle'
     RE_ZONE = re.compile(r'\.([a-z]{3}[0-9]).*\.com')
 
-    def __init__(self, bigip, vips_dict):
+    def __init__(self, bigip, plan):
         """
         Construct Cert with the supplied args.
 
         :param bigip: An instance of the BigIP object.
-        :param vips_dict: A dict containing VIP configuration.
+        :param plan: An instance of the Plan object.
         :returns: None
         """
         self._key_cert = bigip.pc.Management.KeyCertificate
-        self._vips_dict = vips_dict
+        self._plan = plan
 
     def create(self):
         print 'Cert'
-        self._upload_certs()
-        self._upload_intermediate_cert()
-
-    def _upload_certs(self):
-        filtered = utils.filter_on_public(self._vips_dict)
-        for vipname, vip_dict in filtered.iteritems():
-            domain = vip_dict['dns']
-            zone_name = self._zone_name(domain)
-            year = datetime.datetime.now().year
-            name = '/Common/%(year)s-%(domain)s' % locals()
-            if zone_name:
-                key_file = os.path.join(self.FILE_BASEDIR,
-                                        zone_name,
-                                        domain,
-                                        '%(domain)s.pem' % locals())
-                cert_file = os.path.join(self.FILE_BASEDIR,
-                                         zone_name,
-                                         domain,
-                                         '%(domain)s.crt' % locals())
-                self._import_key_from_file(name, key_file)
-                self._import_certificate_from_file(name, cert_file)
-
-    def _upload_intermediate_cert(self):
-        cert_name = self.INTERMEDIATE_BUNDLE
-        cert_basename = '%s.crt' % self.INTERMEDIATE_BUNDLE.split('/')[-1]
-        cert_file = os.path.join(self.FILE_BASEDIR, cert_basename)
-        self._import_certificate_from_file(cert_name, cert_file)
+        actions = self._plan.cert_actions()
+        # Every key, and every certificate, goes in one import call.
+        utils.apply_actions(self, actions, batch_size=len(actions) or 1)
 
     def _delete(self, name):
         self._key_cert.key_delete(mode=self.MANAGEMENT_MODE_TYPE,
@@ -80,59 +55,37 @@ class Cert(object):
         self._key_cert.certificate_delete(mode=self.MANAGEMENT_MODE_TYPE,
                                           cert_ids=[name])
 
-    def _import_key_from_file(self, key_name, key_file):
-        if self._get_key(key_name):
-            msg = '  - key {0} already exists'.format(key_name)
-            utils.print_yellow(msg)
-        else:
-            with open(key_file, 'r') as file:
-                data = file.read()
-                args_dict = {'mode': self.MANAGEMENT_MODE_TYPE,
-                             'key_ids': [key_name],
-                             'pem_data': [data],
-                             'overwrite': False}
-                self._key_cert.key_import_from_pem(**args_dict)
-                msg = '  - added key {0}'.format(key_name)
-                utils.print_green(msg)
-
-    def _import_certificate_from_file(self, cert_name, cert_file):
-        if self._get_certificate(cert_name):
-            msg = '  - cert {0} already exists'.format(cert_name)
-            utils.print_yellow(msg)
-        else:
-            with open(cert_file, 'r') as file:
-                data = file.read()
-                args_dict = {'mode': self.MANAGEMENT_MODE_TYPE,
-                             'cert_ids': [cert_name],
-                             'pem_data': [data],
-                             'overwrite': False}
-                self._key_cert.certificate_import_from_pem(**args_dict)
-                msg = '  - added cert {0}'.format(cert_name)
-                utils.print_green(msg)
-
-    def _get_certificate(self, cert):
-        args_dict = {'mode': self.MANAGEMENT_MODE_TYPE}
-        cert_list = self._key_cert.get_certificate_list(**args_dict)
-        for c in cert_list:
-            if c.certificate.cert_info['id'] == cert:
-                return True
-            else:
-                pass
-        return False
-
-    def _get_key(self, key):
-        args_dict = {'mode': self.MANAGEMENT_MODE_TYPE}
-        key_list = self._key_cert.get_key_list(**args_dict)
-        for k in key_list:
-            if k.key_info['id'] == key:
-                return True
-            else:
-                pass
-        return False
-
-    def _zone_name(self, domain):
-        match = self.RE_ZONE.search(domain)
-        if match:
-            return match.group(1)
-        else:
-            return False
+    def _import_key_from_file(self, actions):
+        pending = utils.report_skipped(actions,
+                                       '  - key {name} is up to date')
+        if not pending:
+            return
+        args_dict = {'mode': self.MANAGEMENT_MODE_TYPE,
+                     'key_ids': [a.name for a in pending],
+                     'pem_data': [self._read(a) for a in pending],
+                     'overwrite': True}
+        self._key_cert.key_import_from_pem(**args_dict)
+        for action in pending:
+            msg = '  - {0} key {1}'.format(self._verb(action), action.name)
+            utils.print_green(msg)
+
+    def _import_certificate_from_file(self, actions):
+        pending = utils.report_skipped(actions,
+                                       '  - cert {name} is up to date')
+        if not pending:
+            return
+        args_dict = {'mode': self.MANAGEMENT_MODE_TYPE,
+                     'cert_ids': [a.name for a in pending],
+                     'pem_data': [self._read(a) for a in pending],
+                     'overwrite': True}
+        self._key_cert.certificate_import_from_pem(**args_dict)
+        for action in pending:
+            msg = '  - {0} cert {1}'.format(self._verb(action), action.name)
+            utils.print_green(msg)
+
+    def _read(self, action):
+        with open(action.args['file'], 'r') as file:
+            return file.read()
+
+    def _verb(self, action):
+        return 'replaced' if action.args['replace'] else 'added'
@@ -0,0 +1,120 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import collections
+import time
+
+import utils
+
+SYNC_FAILOVER = 'DGT_SYNC_FAILOVER'
+ACTIVE = 'HA_STATE_ACTIVE'
+IN_SYNC = 'In Sync'
+FAILED = 'COLOR_RED'
+
+Member = collections.namedtuple('Member', ['name', 'address', 'state'])
+
+
+class Cluster(collections.namedtuple('Cluster', ['group', 'members'])):
+    """
+    A sync-failover device group, and the devices in it.
+    """
+
+    @property
+    def active(self):
+        """
+        Return the active member, or None when no member is active.
+
+        :returns: Member
+        """
+        for member in self.members:
+            if member.state == ACTIVE:
+                return member
+        return None
+
+    @property
+    def addresses(self):
+        return [m.address for m in self.members]
+
+
+class SyncError(Exception):
+    """
+    Raised when a device group did not come in sync.
+    """
+
+
+def discover(bigip):
+    """
+    Return the sync-failover device group of a device.
+
+    :param bigip: An instance of the BigIP object.
+    :returns: Cluster, or None when the device is not in one
+    """
+    device_group = bigip.pc.Management.DeviceGroup
+    device = bigip.pc.Management.Device
+    groups = device_group.get_list()
+    if not groups:
+        return None
+    types = device_group.get_type(device_groups=groups)
+    groups = [g for g, t in zip(groups, types) if t == SYNC_FAILOVER]
+    if not groups:
+        return None
+    local = device.get_local_device()
+    for group, names in zip(groups,
+                            device_group.get_device(device_groups=groups)):
+        names = list(names)
+        if local not in names:
+            continue
+        addresses = device.get_management_address(devices=names)
+        states = device.get_failover_state(devices=names)
+        return Cluster(group, [Member(*m)
+                               for m in zip(names, addresses, states)])
+    return None
+
+
+def sync(bigip, group, timeout=300, interval=2, sleep=time.sleep,
+         clock=time.time):
+    """
+    Sync a device's configuration to its device group, and wait until the
+    group reports it is in sync.
+
+    :param bigip: An instance of the BigIP object of the device to sync
+                  from.
+    :param group: A string containing the device group.
+    :param timeout: An int of seconds to wait for the sync.
+    :param interval: An int of seconds between status checks.
+    :param sleep: A callable taking seconds to wait.
+    :param clock: A callable returning the time in seconds.
+    :returns: None
+    :raises: SyncError when the sync fails or times out
+    """
+    print 'ConfigSync'
+    bigip.pc.System.ConfigSync.synchronize_to_group(group=group)
+    deadline = clock() + timeout
+    device_group = bigip.pc.Management.DeviceGroup
+    while True:
+        status = device_group.get_sync_status_overview()
+        if status.status == IN_SYNC:
+            msg = '  - {0} in sync'.format(group)
+            utils.print_green(msg)
+            return
+        if status.color == FAILED:
+            msg = '{0}: {1}'.format(status.status, status.summary)
+            raise SyncError(msg)
+        if clock() >= deadline:
+            msg = '{0} not in sync after {1}s: {2}'.format(group, timeout,
+                                                           status.status)
+            raise SyncError(msg)
+        sleep(interval)
@@ -0,0 +1,1666 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+"""Fake iControl.
+
+A local stand-in for a BigIP's iControl portal.  It serves generated WSDLs
+for the interfaces bigpyp uses, and keeps their objects in memory.
+
+Usage:
+  fake_icontrol.py [options]
+
+Options:
+  -h --help            Show this screen
+  --port=<port>        Port to listen on [default: 8080]
+  --latency=<seconds>  Delay every call by <seconds> [default: 0]
+  --error-rate=<rate>  Fail this fraction of calls at random [default: 0]
+"""
+
+import base64
+import BaseHTTPServer
+import collections
+import copy
+import gzip
+import random
+import re
+import socket
+import SocketServer
+import StringIO
+import threading
+import time
+import urlparse
+
+from xml.etree import cElementTree as etree
+from xml.sax import saxutils
+
+ICONTROL_URI = '/iControl/iControlPortal.cgi'
+NS_ICONTROL = 'urn:iControl'
+NS_SOAP_ENV = 'http://schemas.xmlsoap.org/soap/envelope/'
+NS_SOAP_ENC = 'http://schemas.xmlsoap.org/soap/encoding/'
+NS_XSD = 'http://www.w3.org/2001/XMLSchema'
+NS_XSI = 'http://www.w3.org/2001/XMLSchema-instance'
+
+
+def _array(item):
+    return ('array', item)
+
+
+def _struct(*fields):
+    return ('struct', fields)
+
+
+def _enum(*values):
+    return ('enum', values)
+
+
+# The statistics a fake pool member and virtual server report.
+MEMBER_STATISTICS = ('STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS',
+                     'STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS',
+                     'STATISTIC_SERVER_SIDE_BYTES_IN',
+                     'STATISTIC_SERVER_SIDE_BYTES_OUT')
+VIRTUAL_SERVER_STATISTICS = ('STATISTIC_CLIENT_SIDE_CURRENT_CONNECTIONS',
+                             'STATISTIC_CLIENT_SIDE_TOTAL_CONNECTIONS',
+                             'STATISTIC_CLIENT_SIDE_BYTES_IN',
+                             'STATISTIC_CLIENT_SIDE_BYTES_OUT',
+                             'STATISTIC_TOTAL_REQUESTS')
+
+# The iControl types bigpyp sends or receives.  Names without an `xsd:`
+# prefix live in the urn:iControl namespace.
+TYPES = {
+    'Common.StringSequence': _array('xsd:string'),
+    'Common.StringSequenceSequence': _array('Common.StringSequence'),
+    'Common.ULongSequence': _array('xsd:long'),
+    'Common.BooleanSequence': _array('xsd:boolean'),
+    'Common.EnabledState': _enum('STATE_DISABLED', 'STATE_ENABLED'),
+    'Common.HAState': _enum('HA_STATE_OFFLINE', 'HA_STATE_FORCED_OFFLINE',
+                            'HA_STATE_STANDBY', 'HA_STATE_ACTIVE'),
+    'Common.HAStateSequence': _array('Common.HAState'),
+    'Common.EnabledStateSequence': _array('Common.EnabledState'),
+    'Common.EnabledStateSequenceSequence':
+        _array('Common.EnabledStateSequence'),
+    'Common.AddressPort': _struct(('address', 'xsd:string'),
+                                  ('port', 'xsd:long')),
+    'Common.AddressPortSequence': _array('Common.AddressPort'),
+    'Common.AddressPortSequenceSequence':
+        _array('Common.AddressPortSequence'),
+    'Common.IPPortDefinition': _struct(('address', 'xsd:string'),
+                                       ('port', 'xsd:long')),
+    'Common.IPPortDefinitionSequence': _array('Common.IPPortDefinition'),
+    'Common.ULong64': _struct(('high', 'xsd:long'), ('low', 'xsd:long')),
+    'Common.StatisticType': _enum(
+        *(MEMBER_STATISTICS + VIRTUAL_SERVER_STATISTICS)),
+    'Common.Statistic': _struct(('type', 'Common.StatisticType'),
+                                ('value', 'Common.ULong64'),
+                                ('time_stamp', 'xsd:long')),
+    'Common.StatisticSequence': _array('Common.Statistic'),
+    'Common.TimeStamp': _struct(('year', 'xsd:long'),
+                                ('month', 'xsd:long'),
+                                ('day', 'xsd:long'),
+                                ('hour', 'xsd:long'),
+                                ('minute', 'xsd:long'),
+                                ('second', 'xsd:long')),
+    'Common.ProtocolType': _enum('PROTOCOL_ANY', 'PROTOCOL_TCP',
+                                 'PROTOCOL_UDP'),
+    'Common.VirtualServerDefinition': _struct(
+        ('name', 'xsd:string'),
+        ('address', 'xsd:string'),
+        ('port', 'xsd:long'),
+        ('protocol', 'Common.ProtocolType')),
+    'Common.VirtualServerSequence':
+        _array('Common.VirtualServerDefinition'),
+    'LocalLB.AvailabilityStatus': _enum(
+        'AVAILABILITY_STATUS_NONE', 'AVAILABILITY_STATUS_GREEN',
+        'AVAILABILITY_STATUS_YELLOW', 'AVAILABILITY_STATUS_RED',
+        'AVAILABILITY_STATUS_BLUE', 'AVAILABILITY_STATUS_GRAY'),
+    'LocalLB.EnabledStatus': _enum(
+        'ENABLED_STATUS_NONE', 'ENABLED_STATUS_ENABLED',
+        'ENABLED_STATUS_DISABLED', 'ENABLED_STATUS_DISABLED_BY_PARENT'),
+    'LocalLB.ObjectStatus': _struct(
+        ('availability_status', 'LocalLB.AvailabilityStatus'),
+        ('enabled_status', 'LocalLB.EnabledStatus'),
+        ('status_description', 'xsd:string')),
+    'LocalLB.ObjectStatusSequence': _array('LocalLB.ObjectStatus'),
+    'LocalLB.ObjectStatusSequenceSequence':
+        _array('LocalLB.ObjectStatusSequence'),
+    'LocalLB.LBMethod': _enum('LB_METHOD_ROUND_ROBIN',
+                              'LB_METHOD_LEAST_CONNECTION_MEMBER'),
+    'LocalLB.LBMethodSequence': _array('LocalLB.LBMethod'),
+    'LocalLB.MonitorRuleType': _enum('MONITOR_RULE_TYPE_NONE',
+                                     'MONITOR_RULE_TYPE_SINGLE',
+                                     'MONITOR_RULE_TYPE_AND_LIST',
+                                     'MONITOR_RULE_TYPE_M_OF_N'),
+    'LocalLB.MonitorRule': _struct(
+        ('type', 'LocalLB.MonitorRuleType'),
+        ('quorum', 'xsd:long'),
+        ('monitor_templates', 'Common.StringSequence')),
+    'LocalLB.Pool.MonitorAssociation': _struct(
+        ('pool_name', 'xsd:string'),
+        ('monitor_rule', 'LocalLB.MonitorRule')),
+    'LocalLB.Pool.MonitorAssociationSequence':
+        _array('LocalLB.Pool.MonitorAssociation'),
+    'LocalLB.Pool.MemberStatisticEntry': _struct(
+        ('member', 'Common.AddressPort'),
+        ('statistics', 'Common.StatisticSequence')),
+    'LocalLB.Pool.MemberStatisticEntrySequence':
+        _array('LocalLB.Pool.MemberStatisticEntry'),
+    'LocalLB.Pool.MemberStatistics': _struct(
+        ('statistics', 'LocalLB.Pool.MemberStatisticEntrySequence'),
+        ('time_stamp', 'Common.TimeStamp')),
+    'LocalLB.Pool.MemberStatisticsSequence':
+        _array('LocalLB.Pool.MemberStatistics'),
+    'LocalLB.Monitor.MonitorTemplate': _struct(
+        ('template_name', 'xsd:string'),
+        ('template_type', 'xsd:string')),
+    'LocalLB.Monitor.MonitorTemplateSequence':
+        _array('LocalLB.Monitor.MonitorTemplate'),
+    'LocalLB.ProfileMode': _enum('PROFILE_MODE_NONE',
+                                 'PROFILE_MODE_ENABLED',
+                                 'PROFILE_MODE_DISABLED'),
+    'LocalLB.ProfileProfileMode': _struct(
+        ('value', 'LocalLB.ProfileMode'),
+        ('default_flag', 'xsd:boolean')),
+    'LocalLB.ProfileProfileModeSequence':
+        _array('LocalLB.ProfileProfileMode'),
+    'LocalLB.ProfileString': _struct(('value', 'xsd:string'),
+                                     ('default_flag', 'xsd:boolean')),
+    'LocalLB.ProfileStringSequence': _array('LocalLB.ProfileString'),
+    'LocalLB.ProfileULong': _struct(('value', 'xsd:long'),
+                                    ('default_flag', 'xsd:boolean')),
+    'LocalLB.ProfileULongSequence': _array('LocalLB.ProfileULong'),
+    'LocalLB.ProfileContextType': _enum('PROFILE_CONTEXT_TYPE_ALL',
+                                        'PROFILE_CONTEXT_TYPE_CLIENT',
+                                        'PROFILE_CONTEXT_TYPE_SERVER'),
+    'LocalLB.Rule.RuleDefinition': _struct(
+        ('rule_name', 'xsd:string'),
+        ('rule_definition', 'xsd:string')),
+    'LocalLB.Rule.RuleDefinitionSequence':
+        _array('LocalLB.Rule.RuleDefinition'),
+    'LocalLB.VirtualServer.VirtualServerType': _enum(
+        'RESOURCE_TYPE_POOL', 'RESOURCE_TYPE_IP_FORWARDING',
+        'RESOURCE_TYPE_L2_FORWARDING', 'RESOURCE_TYPE_REJECT'),
+    'LocalLB.VirtualServer.VirtualServerResource': _struct(
+        ('type', 'LocalLB.VirtualServer.VirtualServerType'),
+        ('default_pool_name', 'xsd:string')),
+    'LocalLB.VirtualServer.VirtualServerResourceSequence':
+        _array('LocalLB.VirtualServer.VirtualServerResource'),
+    'LocalLB.VirtualServer.VirtualServerProfile': _struct(
+        ('profile_context', 'LocalLB.ProfileContextType'),
+        ('profile_name', 'xsd:string')),
+    'LocalLB.VirtualServer.VirtualServerProfileSequence':
+        _array('LocalLB.VirtualServer.VirtualServerProfile'),
+    'LocalLB.VirtualServer.VirtualServerProfileSequenceSequence':
+        _array('LocalLB.VirtualServer.VirtualServerProfileSequence'),
+    'LocalLB.VirtualServer.VirtualServerStatisticEntry': _struct(
+        ('virtual_server', 'Common.VirtualServerDefinition'),
+        ('statistics', 'Common.StatisticSequence')),
+    'LocalLB.VirtualServer.VirtualServerStatisticEntrySequence':
+        _array('LocalLB.VirtualServer.VirtualServerStatisticEntry'),
+    'LocalLB.VirtualServer.VirtualServerStatistics': _struct(
+        ('statistics',
+         'LocalLB.VirtualServer.VirtualServerStatisticEntrySequence'),
+        ('time_stamp', 'Common.TimeStamp')),
+    'Management.DeviceGroup.DeviceGroupType': _enum(
+        'DGT_UNKNOWN', 'DGT_SYNC_ONLY', 'DGT_SYNC_FAILOVER'),
+    'Management.DeviceGroup.DeviceGroupTypeSequence':
+        _array('Management.DeviceGroup.DeviceGroupType'),
+    'Management.DeviceGroup.SyncStatusColor': _enum(
+        'COLOR_GREEN', 'COLOR_YELLOW', 'COLOR_RED', 'COLOR_BLUE',
+        'COLOR_GRAY', 'COLOR_BLACK'),
+    'Management.DeviceGroup.SyncStatus': _struct(
+        ('status', 'xsd:string'),
+        ('color', 'Management.DeviceGroup.SyncStatusColor'),
+        ('member_state', 'xsd:string'),
+        ('summary', 'xsd:string'),
+        ('details', 'Common.StringSequence')),
+    'Management.KeyCertificate.ManagementModeType': _enum(
+        'MANAGEMENT_MODE_DEFAULT', 'MANAGEMENT_MODE_WEBSERVER',
+        'MANAGEMENT_MODE_EM', 'MANAGEMENT_MODE_IQUERY'),
+    'Management.KeyCertificate.Key': _struct(
+        ('id', 'xsd:string'),
+        ('key_type', 'xsd:string'),
+        ('bit_length', 'xsd:long')),
+    'Management.KeyCertificate.KeyInformation': _struct(
+        ('key_info', 'Management.KeyCertificate.Key'),
+        ('file_name', 'xsd:string')),
+    'Management.KeyCertificate.KeyInformationSequence':
+        _array('Management.KeyCertificate.KeyInformation'),
+    'Management.KeyCertificate.Certificate': _struct(
+        ('id', 'xsd:string'),
+        ('email', 'xsd:string')),
+    'Management.KeyCertificate.CertificateDetail': _struct(
+        ('cert_info', 'Management.KeyCertificate.Certificate'),
+        ('serial_number', 'xsd:string')),
+    'Management.KeyCertificate.CertificateInformation': _struct(
+        ('is_bundle', 'xsd:boolean'),
+        ('certificate', 'Management.KeyCertificate.CertificateDetail'),
+        ('file_name', 'xsd:string')),
+    'Management.KeyCertificate.CertificateInformationSequence':
+        _array('Management.KeyCertificate.CertificateInformation'),
+    'Management.DBVariable.VariableNameValue': _struct(
+        ('name', 'xsd:string'),
+        ('value', 'xsd:string')),
+    'Management.DBVariable.VariableNameValueSequence':
+        _array('Management.DBVariable.VariableNameValue'),
+    'Common.FileChainType': _enum('FILE_UNDEFINED', 'FILE_FIRST',
+                                  'FILE_MIDDLE', 'FILE_UNUSED', 'FILE_LAST',
+                                  'FILE_FIRST_AND_LAST'),
+    'System.ConfigSync.FileTransferContext': _struct(
+        ('file_data', 'xsd:base64Binary'),
+        ('chain_type', 'Common.FileChainType')),
+    'System.ConfigSync.LoadMode': _enum('LOAD_HIGH_LEVEL_CONFIG',
+                                        'LOAD_BASE_LEVEL_CONFIG'),
+    'System.TimeZoneInfo': _struct(('time_zone', 'xsd:string'),
+                                   ('gmt_offset', 'xsd:long'),
+                                   ('is_daylight_saving_time',
+                                    'xsd:boolean')),
+}
+
+_MODE = ('mode', 'Management.KeyCertificate.ManagementModeType')
+_PROFILE_NAMES = ('profile_names', 'Common.StringSequence')
+_POOL_NAMES = ('pool_names', 'Common.StringSequence')
+_MEMBERS = ('members', 'Common.AddressPortSequenceSequence')
+
+# The methods of every interface, as (parameters, return type), together
+# with the types bigpyp builds through the interface's typefactory.
+INTERFACES = {
+    'LocalLB.Monitor': ({
+        'get_template_list': ((), 'LocalLB.Monitor.MonitorTemplateSequence'),
+    }, ()),
+    'LocalLB.Pool': ({
+        'get_list': ((), 'Common.StringSequence'),
+        'create_v2': ((_POOL_NAMES,
+                       ('lb_methods', 'LocalLB.LBMethodSequence'),
+                       _MEMBERS), None),
+        'delete_pool': ((_POOL_NAMES,), None),
+        'get_member_v2': ((_POOL_NAMES,),
+                          'Common.AddressPortSequenceSequence'),
+        'add_member_v2': ((_POOL_NAMES, _MEMBERS), None),
+        'remove_member_v2': ((_POOL_NAMES, _MEMBERS), None),
+        'get_member_session_enabled_state': (
+            (_POOL_NAMES, _MEMBERS), 'Common.EnabledStateSequenceSequence'),
+        'set_member_session_enabled_state': (
+            (_POOL_NAMES, _MEMBERS,
+             ('session_states', 'Common.EnabledStateSequenceSequence')),
+            None),
+        'get_monitor_association': (
+            (_POOL_NAMES,), 'LocalLB.Pool.MonitorAssociationSequence'),
+        'get_all_member_statistics': (
+            (_POOL_NAMES,), 'LocalLB.Pool.MemberStatisticsSequence'),
+        'get_member_object_status': (
+            (_POOL_NAMES, _MEMBERS), 'LocalLB.ObjectStatusSequenceSequence'),
+        'set_monitor_association': (
+            (('monitor_associations',
+              'LocalLB.Pool.MonitorAssociationSequence'),), None),
+    }, ('Common.IPPortDefinitionSequence',)),
+    'LocalLB.ProfileClientSSL': ({
+        'get_list': ((), 'Common.StringSequence'),
+        'create_v2': ((_PROFILE_NAMES,
+                       ('keys', 'LocalLB.ProfileStringSequence'),
+                       ('certs', 'LocalLB.ProfileStringSequence')), None),
+        'get_chain_file': ((_PROFILE_NAMES,),
+                           'LocalLB.ProfileStringSequence'),
+        'set_chain_file': ((_PROFILE_NAMES,
+                            ('chains', 'LocalLB.ProfileStringSequence')),
+                           None),
+    }, ()),
+    'LocalLB.ProfileHttp': ({
+        'get_list': ((), 'Common.StringSequence'),
+        'create': ((_PROFILE_NAMES,), None),
+        'get_insert_xforwarded_for_header_mode': (
+            (_PROFILE_NAMES,), 'LocalLB.ProfileProfileModeSequence'),
+        'set_insert_xforwarded_for_header_mode': (
+            (_PROFILE_NAMES,
+             ('modes', 'LocalLB.ProfileProfileModeSequence')), None),
+        'get_default_profile': ((_PROFILE_NAMES,), 'Common.StringSequence'),
+        'set_default_profile': ((_PROFILE_NAMES,
+                                 ('defaults', 'Common.StringSequence')),
+                                None),
+    }, ()),
+    'LocalLB.ProfileTCP': ({
+        'get_list': ((), 'Common.StringSequence'),
+        'create': ((_PROFILE_NAMES,), None),
+        'get_keep_alive_interval': ((_PROFILE_NAMES,),
+                                    'LocalLB.ProfileULongSequence'),
+        'set_keep_alive_interval': (
+            (_PROFILE_NAMES,
+             ('intervals', 'LocalLB.ProfileULongSequence')), None),
+    }, ()),
+    'LocalLB.Rule': ({
+        'get_list': ((), 'Common.StringSequence'),
+        'create': ((('rules', 'LocalLB.Rule.RuleDefinitionSequence'),),
+                   None),
+    }, ()),
+    'LocalLB.VirtualServer': ({
+        'get_list': ((), 'Common.StringSequence'),
+        'create': (
+            (('definitions', 'Common.VirtualServerSequence'),
+             ('wildmasks', 'Common.StringSequence'),
+             ('resources',
+              'LocalLB.VirtualServer.VirtualServerResourceSequence'),
+             ('profiles',
+              'LocalLB.VirtualServer.VirtualServerProfileSequenceSequence')),
+            None),
+        'get_snat_pool': ((('virtual_servers', 'Common.StringSequence'),),
+                          'Common.StringSequence'),
+        'set_snat_pool': ((('virtual_servers', 'Common.StringSequence'),
+                           ('snatpools', 'Common.StringSequence')), None),
+        'get_statistics': (
+            (('virtual_servers', 'Common.StringSequence'),),
+            'LocalLB.VirtualServer.VirtualServerStatistics'),
+    }, ()),
+    'Management.Device': ({
+        'get_local_device': ((), 'xsd:string'),
+        'get_management_address': (
+            (('devices', 'Common.StringSequence'),), 'Common.StringSequence'),
+        'get_failover_state': (
+            (('devices', 'Common.StringSequence'),), 'Common.HAStateSequence'),
+    }, ()),
+    'Management.DeviceGroup': ({
+        'get_list': ((), 'Common.StringSequence'),
+        'get_type': (
+            (('device_groups', 'Common.StringSequence'),),
+            'Management.DeviceGroup.DeviceGroupTypeSequence'),
+        'get_device': (
+            (('device_groups', 'Common.StringSequence'),),
+            'Common.StringSequenceSequence'),
+        'get_sync_status_overview': (
+            (), 'Management.DeviceGroup.SyncStatus'),
+    }, ()),
+    'Management.DBVariable': ({
+        'query': ((('variables', 'Common.StringSequence'),),
+                  'Management.DBVariable.VariableNameValueSequence'),
+    }, ()),
+    'Management.KeyCertificate': ({
+        'get_key_list': (
+            (_MODE,), 'Management.KeyCertificate.KeyInformationSequence'),
+        'get_certificate_list': (
+            (_MODE,),
+            'Management.KeyCertificate.CertificateInformationSequence'),
+        'certificate_export_to_pem': (
+            (_MODE, ('cert_ids', 'Common.StringSequence')),
+            'Common.StringSequence'),
+        'key_import_from_pem': (
+            (_MODE, ('key_ids', 'Common.StringSequence'),
+             ('pem_data', 'Common.StringSequence'),
+             ('overwrite', 'xsd:boolean')), None),
+        'certificate_import_from_pem': (
+            (_MODE, ('cert_ids', 'Common.StringSequence'),
+             ('pem_data', 'Common.StringSequence'),
+             ('overwrite', 'xsd:boolean')), None),
+        'key_delete': ((_MODE, ('key_ids', 'Common.StringSequence')), None),
+        'certificate_delete': (
+            (_MODE, ('cert_ids', 'Common.StringSequence')), None),
+    }, ()),
+    'System.ConfigSync': ({
+        'synchronize_to_group': ((('group', 'xsd:string'),), None),
+        'upload_file': (
+            (('file_name', 'xsd:string'),
+             ('file_context', 'System.ConfigSync.FileTransferContext')),
+            None),
+        'install_single_configuration_file': (
+            (('filename', 'xsd:string'),
+             ('load_flag', 'System.ConfigSync.LoadMode'),
+             ('passphrase', 'xsd:string'),
+             ('tarfile', 'xsd:string'),
+             ('merge', 'xsd:boolean')), None),
+        'delete_file': ((('file_name', 'xsd:string'),), None),
+    }, ()),
+    'System.Inet': ({
+        'get_ntp_server_address': ((), 'Common.StringSequence'),
+        'set_ntp_server_address': (
+            (('ntp_addresses', 'Common.StringSequence'),), None),
+    }, ()),
+    'System.Session': ({
+        'get_session_identifier': ((), 'xsd:long'),
+        'set_transaction_timeout': ((('timeout', 'xsd:long'),), None),
+        'start_transaction': ((), None),
+        'submit_transaction': ((), None),
+        'rollback_transaction': ((), None),
+    }, ()),
+    'System.SystemInfo': ({
+        'get_version': ((), 'xsd:string'),
+        'get_time_zone': ((), 'System.TimeZoneInfo'),
+    }, ()),
+}
+
+
+class Fault(Exception):
+    """
+    Raised by a fake call to answer with a SOAP fault, as the device does.
+    """
+
+
+class FakeDevice(object):
+    """
+    The in-memory objects of a fake BigIP.  Each iControl call is answered
+    by the method named after the interface and method, e.g.
+    `LocalLB_Pool_get_list`.  Writes sent in a session with an open
+    transaction are queued, and applied as one commit on submit.
+    """
+
+    VERSION = 'BIG-IP_v11.4.1'
+    # Calls which leave the configuration, and its generation, unchanged.
+    READ_METHODS = ('get_', 'query', 'certificate_export_to_pem',
+                    'synchronize_to_group')
+    # State of the device itself, rather than configuration a sync copies
+    # or a failed transaction restores.
+    LOCAL = ('device_name', 'management_address', 'failover_state',
+             'device_groups', 'peers', 'synced_at', 'sync_polls',
+             'syncing', 'sessions', 'transactions', 'files', 'clock')
+
+    def __init__(self, version=VERSION):
+        self.version = version
+        self.pools = collections.OrderedDict()
+        self.virtual_servers = collections.OrderedDict()
+        self.http_profiles = collections.OrderedDict([
+            ('/Common/http', {'xff_mode': 'PROFILE_MODE_DISABLED',
+                              'default': ''})])
+        self.ssl_profiles = collections.OrderedDict([
+            ('/Common/clientssl', {'key': '/Common/default.key',
+                                   'cert': '/Common/default.crt',
+                                   'chain': ''})])
+        self.tcp_profiles = collections.OrderedDict([
+            ('/Common/tcp', {'keep_alive_interval': 1800})])
+        self.rules = collections.OrderedDict()
+        self.keys = collections.OrderedDict([('/Common/default', '')])
+        self.certificates = collections.OrderedDict([
+            ('/Common/default', '')])
+        self.monitors = ['/Common/http', '/Common/https', '/Common/tcp',
+                         '/Common/tcp_half_open', '/Common/gateway_icmp']
+        self.ntp_servers = []
+        self.time_zone = 'UTC'
+        self.config_time = 1
+        self.sessions = 0
+        self.transactions = {}
+        self.device_name = '/Common/bigip1'
+        self.management_address = None
+        self.failover_state = 'HA_STATE_ACTIVE'
+        self.device_groups = collections.OrderedDict([
+            ('/Common/device_trust_group',
+             ('DGT_SYNC_ONLY', [self.device_name]))])
+        self.peers = []
+        self.synced_at = self.config_time
+        self.sync_polls = 1
+        self.syncing = 0
+        self.files = {}
+        # The device's clock, timing its statistics.
+        self.clock = time.time
+
+    def call(self, wsdl, method, params, session=None):
+        """
+        Answer one iControl call.
+
+        :param wsdl: A string containing the interface, e.g. 'LocalLB.Pool'.
+        :param method: A string containing the method name.
+        :param params: A dict of the decoded parameters.
+        :param session: A string containing the call's X-iControl-Session
+                        header, or None.
+        :returns: the decoded return value, or None
+        :raises: Fault
+        """
+        name = '{0}_{1}'.format(wsdl.replace('.', '_'), method)
+        if wsdl == 'System.Session':
+            return getattr(self, name)(session, **params)
+        read = method.startswith(self.READ_METHODS)
+        queue = self.transactions.get(session)
+        if queue is not None and not read:
+            queue.append((name, params))
+            return None
+        result = getattr(self, name)(**params)
+        if not read:
+            self.config_time += 1
+        return result
+
+    # LocalLB.Monitor
+
+    def LocalLB_Monitor_get_template_list(self):
+        return [{'template_name': m, 'template_type': 'TTYPE_UNSET'}
+                for m in self.monitors]
+
+    # LocalLB.Pool
+
+    def LocalLB_Pool_get_list(self):
+        return self.pools.keys()
+
+    def LocalLB_Pool_create_v2(self, pool_names, lb_methods, members):
+        # A name given twice in one call exists by its second creation.
+        for i, name in enumerate(pool_names):
+            if name in self.pools or name in pool_names[:i]:
+                raise Fault('The requested pool ({0}) already '
+                            'exists.'.format(name))
+        # suds leaves out the empty member lists of pools without members.
+        members = members + [[]] * (len(pool_names) - len(members))
+        for name, lb_method, pool_members in zip(pool_names, lb_methods,
+                                                 members):
+            self.pools[name] = {'lb_method': lb_method,
+                                'members': collections.OrderedDict(),
+                                'monitors': []}
+            self._add_members(name, pool_members)
+
+    def LocalLB_Pool_delete_pool(self, pool_names):
+        for name in pool_names:
+            self._pool(name)
+        for name in pool_names:
+            del self.pools[name]
+
+    def LocalLB_Pool_get_member_v2(self, pool_names):
+        return [[{'address': '/Common/{0}'.format(a), 'port': p}
+                 for a, p in self._pool(name)['members']]
+                for name in pool_names]
+
+    def LocalLB_Pool_add_member_v2(self, pool_names, members):
+        for name, pool_members in zip(pool_names, members):
+            self._add_members(name, pool_members)
+
+    def LocalLB_Pool_remove_member_v2(self, pool_names, members):
+        for name, pool_members in zip(pool_names, members):
+            current = self._pool(name)['members']
+            for m in pool_members:
+                key = (self._address(m['address']), m['port'])
+                if key not in current:
+                    raise Fault('The requested pool member ({0} {1}:{2}) '
+                                'was not found.'.format(name, *key))
+                del current[key]
+
+    def LocalLB_Pool_get_member_session_enabled_state(self, pool_names,
+                                                      members):
+        return [[self._member(name, m)['session_state']
+                 for m in pool_members]
+                for name, pool_members in zip(pool_names, members)]
+
+    def LocalLB_Pool_set_member_session_enabled_state(self, pool_names,
+                                                      members,
+                                                      session_states):
+        for name, pool_members, states in zip(pool_names, members,
+                                              session_states):
+            for m, state in zip(pool_members, states):
+                self._member(name, m)['session_state'] = state
+
+    def LocalLB_Pool_get_all_member_statistics(self, pool_names):
+        result = []
+        for name in pool_names:
+            entries = []
+            for (a, p), m in self._pool(name)['members'].items():
+                entries.append({
+                    'member': {'address': '/Common/{0}'.format(a),
+                               'port': p},
+                    'statistics': [self._statistic(t, m['statistics'])
+                                   for t in MEMBER_STATISTICS]})
+            result.append({'statistics': entries,
+                           'time_stamp': self._time_stamp()})
+        return result
+
+    def LocalLB_Pool_get_member_object_status(self, pool_names, members):
+        result = []
+        for name, pool_members in zip(pool_names, members):
+            statuses = []
+            for m in pool_members:
+                member = self._member(name, m)
+                enabled = member['session_state'] == 'STATE_ENABLED'
+                statuses.append({
+                    'availability_status': member['availability'],
+                    'enabled_status': ('ENABLED_STATUS_ENABLED' if enabled
+                                       else 'ENABLED_STATUS_DISABLED'),
+                    'status_description': ''})
+            result.append(statuses)
+        return result
+
+    def _time_stamp(self):
+        now = time.gmtime(self.clock())
+        return {'year': now.tm_year, 'month': now.tm_mon, 'day': now.tm_mday,
+                'hour': now.tm_hour, 'minute': now.tm_min,
+                'second': now.tm_sec}
+
+    def _statistic(self, stat_type, statistics):
+        value = statistics.get(stat_type, 0)
+        return {'type': stat_type,
+                'value': {'high': value >> 32, 'low': value & 0xffffffff},
+                'time_stamp': 0}
+
+    def LocalLB_Pool_get_monitor_association(self, pool_names):
+        return [{'pool_name': name,
+                 'monitor_rule': {
+                     'type': ('MONITOR_RULE_TYPE_SINGLE'
+                              if self._pool(name)['monitors']
+                              else 'MONITOR_RULE_TYPE_NONE'),
+                     'quorum': 0,
+                     'monitor_templates': self._pool(name)['monitors']}}
+                for name in pool_names]
+
+    def LocalLB_Pool_set_monitor_association(self, monitor_associations):
+        for assoc in monitor_associations:
+            templates = assoc['monitor_rule']['monitor_templates']
+            for template in templates:
+                if template not in self.monitors:
+                    raise Fault('The requested monitor ({0}) was not '
+                                'found.'.format(template))
+            self._pool(assoc['pool_name'])['monitors'] = list(templates)
+
+    def _pool(self, name):
+        try:
+            return self.pools[name]
+        except KeyError:
+            raise Fault('The requested pool ({0}) was not '
+                        'found.'.format(name))
+
+    def _member(self, name, member):
+        key = (self._address(member['address']), member['port'])
+        try:
+            return self._pool(name)['members'][key]
+        except KeyError:
+            raise Fault('The requested pool member ({0} {1}:{2}) was not '
+                        'found.'.format(name, *key))
+
+    def _add_members(self, name, members):
+        current = self._pool(name)['members']
+        for m in members:
+            key = (self._address(m['address']), m['port'])
+            if key in current:
+                raise Fault('The requested pool member ({0} {1}:{2}) '
+                            'already exists.'.format(name, *key))
+            current[key] = {'session_state': 'STATE_ENABLED',
+                            'availability': 'AVAILABILITY_STATUS_GREEN',
+                            'statistics': {}}
+
+    def _address(self, address):
+        return address.replace('/Common/', '')
+
+    # LocalLB.ProfileClientSSL
+
+    def LocalLB_ProfileClientSSL_get_list(self):
+        return self.ssl_profiles.keys()
+
+    def LocalLB_ProfileClientSSL_create_v2(self, profile_names, keys, certs):
+        self._create(self.ssl_profiles, profile_names)
+        for name, key, cert in zip(profile_names, keys, certs):
+            self._file(self.keys, key['value'], '.key')
+            self._file(self.certificates, cert['value'], '.crt')
+        for name, key, cert in zip(profile_names, keys, certs):
+            self.ssl_profiles[name] = {'key': key['value'],
+                                       'cert': cert['value'],
+                                       'chain': ''}
+
+    def LocalLB_ProfileClientSSL_get_chain_file(self, profile_names):
+        return [{'value': self._profile(self.ssl_profiles, n)['chain'],
+                 'default_flag': False} for n in profile_names]
+
+    def LocalLB_ProfileClientSSL_set_chain_file(self, profile_names, chains):
+        for name, chain in zip(profile_names, chains):
+            self._file(self.certificates, chain['value'], '.crt')
+            self._profile(self.ssl_profiles, name)['chain'] = chain['value']
+
+    # LocalLB.ProfileHttp
+
+    def LocalLB_ProfileHttp_get_list(self):
+        return self.http_profiles.keys()
+
+    def LocalLB_ProfileHttp_create(self, profile_names):
+        self._create(self.http_profiles, profile_names)
+        for name in profile_names:
+            self.http_profiles[name] = {'xff_mode': 'PROFILE_MODE_DISABLED',
+                                        'default': '/Common/http'}
+
+    def LocalLB_ProfileHttp_get_insert_xforwarded_for_header_mode(
+            self, profile_names):
+        return [{'value': self._profile(self.http_profiles, n)['xff_mode'],
+                 'default_flag': False} for n in profile_names]
+
+    def LocalLB_ProfileHttp_set_insert_xforwarded_for_header_mode(
+            self, profile_names, modes):
+        for name, mode in zip(profile_names, modes):
+            self._profile(self.http_profiles, name)['xff_mode'] = \
+                mode['value']
+
+    def LocalLB_ProfileHttp_get_default_profile(self, profile_names):
+        return [self._profile(self.http_profiles, n)['default']
+                for n in profile_names]
+
+    def LocalLB_ProfileHttp_set_default_profile(self, profile_names,
+                                                defaults):
+        for name, default in zip(profile_names, defaults):
+            self._profile(self.http_profiles, default)
+            self._profile(self.http_profiles, name)['default'] = default
+
+    # LocalLB.ProfileTCP
+
+    def LocalLB_ProfileTCP_get_list(self):
+        return self.tcp_profiles.keys()
+
+    def LocalLB_ProfileTCP_create(self, profile_names):
+        self._create(self.tcp_profiles, profile_names)
+        for name in profile_names:
+            self.tcp_profiles[name] = {'keep_alive_interval': 1800}
+
+    def LocalLB_ProfileTCP_get_keep_alive_interval(self, profile_names):
+        return [{'value': self._profile(self.tcp_profiles,
+                                        n)['keep_alive_interval'],
+                 'default_flag': False} for n in profile_names]
+
+    def LocalLB_ProfileTCP_set_keep_alive_interval(self, profile_names,
+                                                   intervals):
+        for name, interval in zip(profile_names, intervals):
+            self._profile(self.tcp_profiles, name)['keep_alive_interval'] = \
+                interval['value']
+
+    def _create(self, profiles, names):
+        for i, name in enumerate(names):
+            if name in profiles or name in names[:i]:
+                raise Fault('The requested profile ({0}) already '
+                            'exists.'.format(name))
+
+    def _profile(self, profiles, name):
+        try:
+            return profiles[name]
+        except KeyError:
+            raise Fault('The requested profile ({0}) was not '
+                        'found.'.format(name))
+
+    def _file(self, files, name, extension):
+        # Profiles name a key or certificate by its file, e.g.
+        # /Common/2013-a.example.com.key for the key /Common/2013-a.example.com
+        key = name if name.startswith('/Common/') else '/Common/' + name
+        if key.endswith(extension):
+            key = key[:-len(extension)]
+        if key not in files:
+            raise Fault('The requested file ({0}) was not '
+                        'found.'.format(name))
+
+    # LocalLB.Rule
+
+    def LocalLB_Rule_get_list(self):
+        return self.rules.keys()
+
+    def LocalLB_Rule_create(self, rules):
+        names = [rule['rule_name'] for rule in rules]
+        for i, rule in enumerate(rules):
+            if rule['rule_name'] in self.rules or \
+                    rule['rule_name'] in names[:i]:
+                raise Fault('The requested rule ({0}) already '
+                            'exists.'.format(rule['rule_name']))
+        for rule in rules:
+            self.rules[rule['rule_name']] = rule['rule_definition']
+
+    # LocalLB.VirtualServer
+
+    def LocalLB_VirtualServer_get_list(self):
+        return self.virtual_servers.keys()
+
+    def LocalLB_VirtualServer_create(self, definitions, wildmasks, resources,
+                                     profiles):
+        names = [vsd['name'] for vsd in definitions]
+        for i, (vsd, resource, vs_profiles) in enumerate(
+                zip(definitions, resources, profiles)):
+            if vsd['name'] in self.virtual_servers or \
+                    vsd['name'] in names[:i]:
+                raise Fault('The requested virtual server ({0}) already '
+                            'exists.'.format(vsd['name']))
+            self._pool(resource['default_pool_name'])
+            for p in vs_profiles:
+                name = p['profile_name']
+                if not any(name in profiles for profiles in
+                           [self.http_profiles, self.ssl_profiles,
+                            self.tcp_profiles]):
+                    raise Fault('The requested profile ({0}) was not '
+                                'found.'.format(name))
+        for vsd, resource, vs_profiles in zip(definitions, resources,
+                                              profiles):
+            self.virtual_servers[vsd['name']] = {
+                'address': vsd['address'],
+                'port': vsd['port'],
+                'pool': resource['default_pool_name'],
+                'profiles': [p['profile_name'] for p in vs_profiles],
+                'snat_pool': '',
+                'statistics': {}}
+
+    def LocalLB_VirtualServer_get_snat_pool(self, virtual_servers):
+        return [self._virtual_server(name)['snat_pool']
+                for name in virtual_servers]
+
+    def LocalLB_VirtualServer_set_snat_pool(self, virtual_servers,
+                                            snatpools):
+        for name, snat_pool in zip(virtual_servers, snatpools):
+            self._virtual_server(name)['snat_pool'] = snat_pool
+
+    def LocalLB_VirtualServer_get_statistics(self, virtual_servers):
+        entries = []
+        for name in virtual_servers:
+            vs = self._virtual_server(name)
+            entries.append({
+                'virtual_server': {'name': name,
+                                   'address': vs['address'],
+                                   'port': vs['port'],
+                                   'protocol': 'PROTOCOL_TCP'},
+                'statistics': [self._statistic(t, vs['statistics'])
+                               for t in VIRTUAL_SERVER_STATISTICS]})
+        return {'statistics': entries, 'time_stamp': self._time_stamp()}
+
+    def _virtual_server(self, name):
+        try:
+            return self.virtual_servers[name]
+        except KeyError:
+            raise Fault('The requested virtual server ({0}) was not '
+                        'found.'.format(name))
+
+    # Management.DBVariable
+
+    def Management_DBVariable_query(self, variables):
+        db_variables = {'Configsync.LocalConfigTime': str(self.config_time)}
+        for name in variables:
+            if name not in db_variables:
+                raise Fault('The requested variable ({0}) was not '
+                            'found.'.format(name))
+        return [{'name': name, 'value': db_variables[name]}
+                for name in variables]
+
+    # Management.KeyCertificate
+
+    def Management_KeyCertificate_get_key_list(self, mode):
+        return [{'key_info': {'id': name, 'key_type': 'KTYPE_RSA_PRIVATE',
+                              'bit_length': 2048},
+                 'file_name': name} for name in self.keys]
+
+    def Management_KeyCertificate_get_certificate_list(self, mode):
+        return [{'is_bundle': pem.count('BEGIN CERTIFICATE') > 1,
+                 'certificate': {'cert_info': {'id': name, 'email': ''},
+                                 'serial_number': ''},
+                 'file_name': name} for name, pem in
+                self.certificates.iteritems()]
+
+    def Management_KeyCertificate_certificate_export_to_pem(self, mode,
+                                                            cert_ids):
+        for name in cert_ids:
+            self._file(self.certificates, name, '.crt')
+        return [self.certificates[name] for name in cert_ids]
+
+    def Management_KeyCertificate_key_import_from_pem(self, mode, key_ids,
+                                                      pem_data, overwrite):
+        self._import(self.keys, key_ids, pem_data, overwrite)
+
+    def Management_KeyCertificate_certificate_import_from_pem(self, mode,
+                                                              cert_ids,
+                                                              pem_data,
+                                                              overwrite):
+        self._import(self.certificates, cert_ids, pem_data, overwrite)
+
+    def Management_KeyCertificate_key_delete(self, mode, key_ids):
+        for name in key_ids:
+            self.keys.pop(name, None)
+
+    def Management_KeyCertificate_certificate_delete(self, mode, cert_ids):
+        for name in cert_ids:
+            self.certificates.pop(name, None)
+
+    def _import(self, files, names, pem_data, overwrite):
+        if not overwrite:
+            for i, name in enumerate(names):
+                if name in files or name in names[:i]:
+                    raise Fault('The requested file ({0}) already '
+                                'exists.'.format(name))
+        for name, pem in zip(names, pem_data):
+            files[name] = pem
+
+    # System.Inet
+
+    def System_Inet_get_ntp_server_address(self):
+        return list(self.ntp_servers)
+
+    def System_Inet_set_ntp_server_address(self, ntp_addresses):
+        self.ntp_servers = list(ntp_addresses)
+
+    # System.Session
+
+    def System_Session_get_session_identifier(self, session):
+        self.sessions += 1
+        return self.sessions
+
+    def System_Session_set_transaction_timeout(self, session, timeout):
+        pass
+
+    def System_Session_start_transaction(self, session):
+        if session is None:
+            raise Fault('A transaction needs an X-iControl-Session header.')
+        if session in self.transactions:
+            raise Fault('Session {0} already has an open '
+                        'transaction.'.format(session))
+        self.transactions[session] = []
+
+    def System_Session_submit_transaction(self, session):
+        queue = self._transaction(session)
+        del self.transactions[session]
+        saved = self._config()
+        try:
+            for name, params in queue:
+                getattr(self, name)(**params)
+        except Fault:
+            self.__dict__.update(saved)
+            raise
+        self.config_time += 1
+
+    def System_Session_rollback_transaction(self, session):
+        self._transaction(session)
+        del self.transactions[session]
+
+    def _transaction(self, session):
+        try:
+            return self.transactions[session]
+        except KeyError:
+            raise Fault('Session {0} has no open transaction.'.format(
+                session))
+
+    def _config(self):
+        return copy.deepcopy(dict((k, v) for k, v in vars(self).items()
+                                  if k not in self.LOCAL))
+
+    # Management.Device
+
+    def Management_Device_get_local_device(self):
+        return self.device_name
+
+    def Management_Device_get_management_address(self, devices):
+        return [self._device(name).management_address for name in devices]
+
+    def Management_Device_get_failover_state(self, devices):
+        return [self._device(name).failover_state for name in devices]
+
+    def _device(self, name):
+        for device in [self] + self.peers:
+            if device.device_name == name:
+                return device
+        raise Fault('The requested device ({0}) was not found.'.format(name))
+
+    # Management.DeviceGroup
+
+    def Management_DeviceGroup_get_list(self):
+        return self.device_groups.keys()
+
+    def Management_DeviceGroup_get_type(self, device_groups):
+        return [self._device_group(g)[0] for g in device_groups]
+
+    def Management_DeviceGroup_get_device(self, device_groups):
+        return [list(self._device_group(g)[1]) for g in device_groups]
+
+    def Management_DeviceGroup_get_sync_status_overview(self):
+        if not self.peers:
+            status, color = 'Standalone', 'COLOR_GREEN'
+        elif self.syncing:
+            self.syncing -= 1
+            status, color = 'Syncing', 'COLOR_BLUE'
+        elif self.synced_at == self.config_time:
+            status, color = 'In Sync', 'COLOR_GREEN'
+        else:
+            status, color = 'Changes Pending', 'COLOR_BLUE'
+        return {'status': status, 'color': color, 'member_state': '',
+                'summary': '', 'details': []}
+
+    def _device_group(self, name):
+        try:
+            return self.device_groups[name]
+        except KeyError:
+            raise Fault('The requested device group ({0}) was not '
+                        'found.'.format(name))
+
+    # System.ConfigSync
+
+    def System_ConfigSync_synchronize_to_group(self, group):
+        names = self._device_group(group)[1]
+        config = self._config()
+        for peer in self.peers:
+            if peer.device_name in names:
+                peer.__dict__.update(copy.deepcopy(config))
+                peer.synced_at = peer.config_time
+        self.synced_at = self.config_time
+        self.syncing = self.sync_polls
+
+    def System_ConfigSync_upload_file(self, file_name, file_context):
+        data = base64.b64decode(file_context['file_data'])
+        chain_type = file_context['chain_type']
+        if chain_type in ('FILE_FIRST', 'FILE_FIRST_AND_LAST'):
+            self.files[file_name] = data
+        elif file_name in self.files:
+            self.files[file_name] += data
+        else:
+            raise Fault('Upload of {0} has no first chunk.'.format(file_name))
+
+    def System_ConfigSync_delete_file(self, file_name):
+        if self.files.pop(file_name, None) is None:
+            raise Fault('The requested file ({0}) was not '
+                        'found.'.format(file_name))
+
+    def System_ConfigSync_install_single_configuration_file(
+            self, filename, load_flag, passphrase, tarfile, merge):
+        if not merge:
+            raise Fault('Only merge loads are supported.')
+        try:
+            data = self.files[filename]
+        except KeyError:
+            raise Fault('The requested file ({0}) was not '
+                        'found.'.format(filename))
+        # A load that fails leaves the configuration as it was.
+        config = self._config()
+        try:
+            for header, body in _stanzas(data):
+                kind, name = ' '.join(header[:-1]), header[-1]
+                try:
+                    load = self._LOADERS[kind]
+                except KeyError:
+                    raise Fault('Unsupported configuration: {0}'.format(
+                        kind))
+                load(self, name, body)
+        except Fault:
+            self.__dict__.update(config)
+            raise
+
+    def _load_http_profile(self, name, body):
+        props = _properties(body)
+        self._profile(self.http_profiles,
+                      props.get('defaults-from', '/Common/http'))
+        profile = self.http_profiles.setdefault(
+            name, {'xff_mode': 'PROFILE_MODE_DISABLED',
+                   'default': '/Common/http'})
+        if 'defaults-from' in props:
+            profile['default'] = props['defaults-from']
+        if 'insert-xforwarded-for' in props:
+            profile['xff_mode'] = 'PROFILE_MODE_{0}'.format(
+                props['insert-xforwarded-for'].upper())
+
+    def _load_tcp_profile(self, name, body):
+        props = _properties(body)
+        profile = self.tcp_profiles.setdefault(
+            name, {'keep_alive_interval': 1800})
+        if 'keep-alive-interval' in props:
+            profile['keep_alive_interval'] = int(
+                props['keep-alive-interval'])
+
+    def _load_ssl_profile(self, name, body):
+        props = _properties(body)
+        profile = self.ssl_profiles.setdefault(
+            name, {'key': '/Common/default.key',
+                   'cert': '/Common/default.crt', 'chain': ''})
+        for key, files, extension in [('key', self.keys, '.key'),
+                                      ('cert', self.certificates, '.crt'),
+                                      ('chain', self.certificates, '.crt')]:
+            if key in props:
+                self._file(files, props[key], extension)
+                profile[key] = props[key]
+
+    def _load_rule(self, name, body):
+        self.rules[name] = body.strip('\n')
+
+    def _load_pool(self, name, body):
+        props = _properties(body)
+        monitors = props.get('monitor', '').split()
+        for monitor in monitors:
+            if monitor not in self.monitors:
+                raise Fault('The requested monitor ({0}) was not '
+                            'found.'.format(monitor))
+        method = props.get('load-balancing-mode', 'round-robin')
+        self.pools[name] = {
+            'lb_method': 'LB_METHOD_{0}'.format(
+                method.upper().replace('-', '_')),
+            'members': collections.OrderedDict(),
+            'monitors': monitors}
+        self._add_members(name, [
+            {'address': member['address'],
+             'port': int(re.split(r'[:.]', key)[-1])}
+            for key, member in props.get('members', {}).iteritems()])
+
+    def _load_virtual_server(self, name, body):
+        props = _properties(body)
+        self._pool(props['pool'])
+        profiles = props.get('profiles', {}).keys()
+        for p in profiles:
+            if not any(p in existing for existing in
+                       [self.http_profiles, self.ssl_profiles,
+                        self.tcp_profiles]):
+                raise Fault('The requested profile ({0}) was not '
+                            'found.'.format(p))
+        destination = self._address(props['destination'])
+        separator = '.' if destination.count(':') > 1 else ':'
+        address, port = destination.rsplit(separator, 1)
+        snat = props.get('source-address-translation', {})
+        self.virtual_servers[name] = {
+            'address': address,
+            'port': int(port),
+            'pool': props['pool'],
+            'profiles': profiles,
+            'snat_pool': snat.get('pool', ''),
+            'statistics': {}}
+
+    _LOADERS = {'ltm profile http': _load_http_profile,
+                'ltm profile tcp': _load_tcp_profile,
+                'ltm profile client-ssl': _load_ssl_profile,
+                'ltm rule': _load_rule,
+                'ltm pool': _load_pool,
+                'ltm virtual': _load_virtual_server}
+
+    # System.SystemInfo
+
+    def System_SystemInfo_get_version(self):
+        return self.version
+
+    def System_SystemInfo_get_time_zone(self):
+        return {'time_zone': self.time_zone,
+                'gmt_offset': 0,
+                'is_daylight_saving_time': False}
+
+
+def type_closure(names):
+    """
+    Return the given types and every type they refer to.
+
+    :param names: A list of type names.
+    :returns: set
+    """
+    seen = set()
+    pending = [n for n in names if not n.startswith('xsd:')]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        kind, spec = TYPES[name]
+        if kind == 'array':
+            refs = [spec]
+        elif kind == 'struct':
+            refs = [t for f, t in spec]
+        else:
+            refs = []
+        pending.extend(r for r in refs if not r.startswith('xsd:'))
+    return seen
+
+
+def _qname(type_name):
+    if type_name.startswith('xsd:'):
+        return type_name
+    return 'iControl:{0}'.format(type_name)
+
+
+def _namespace(wsdl):
+    return 'urn:iControl:{0}'.format(wsdl.replace('.', '/'))
+
+
+def wsdl(name, location):
+    """
+    Render the WSDL of one interface, in the rpc/encoded style of the
+    device's own.
+
+    :param name: A string containing the interface, e.g. 'LocalLB.Pool'.
+    :param location: A string containing the URL of the iControl portal.
+    :returns: string
+    """
+    methods, extra = INTERFACES[name]
+    refs = list(extra)
+    for params, result in methods.values():
+        refs.extend(t for p, t in params)
+        if result:
+            refs.append(result)
+    types = []
+    for type_name in sorted(type_closure(refs)):
+        kind, spec = TYPES[type_name]
+        if kind == 'array':
+            types.append(
+                '<xsd:complexType name="{0}"><xsd:complexContent>'
+                '<xsd:restriction base="SOAP-ENC:Array">'
+                '<xsd:attribute ref="SOAP-ENC:arrayType" '
+                'wsdl:arrayType="{1}[]"/>'
+                '</xsd:restriction></xsd:complexContent>'
+                '</xsd:complexType>'.format(type_name, _qname(spec)))
+        elif kind == 'struct':
+            fields = ''.join('<xsd:element name="{0}" type="{1}"/>'.format(
+                f, _qname(t)) for f, t in spec)
+            types.append('<xsd:complexType name="{0}"><xsd:sequence>{1}'
+                         '</xsd:sequence></xsd:complexType>'.format(
+                             type_name, fields))
+        else:
+            values = ''.join('<xsd:enumeration value="{0}"/>'.format(v)
+                             for v in spec)
+            types.append('<xsd:simpleType name="{0}">'
+                         '<xsd:restriction base="xsd:string">{1}'
+                         '</xsd:restriction></xsd:simpleType>'.format(
+                             type_name, values))
+
+    messages = []
+    operations = []
+    bindings = []
+    body = ('<soap:body use="encoded" namespace="{0}" '
+            'encodingStyle="{1}"/>').format(_namespace(name), NS_SOAP_ENC)
+    for method, (params, result) in sorted(methods.items()):
+        parts = ''.join('<part name="{0}" type="{1}"/>'.format(p, _qname(t))
+                        for p, t in params)
+        messages.append('<message name="{0}.{1}Request">{2}'
+                        '</message>'.format(name, method, parts))
+        parts = ''
+        if result:
+            parts = '<part name="return" type="{0}"/>'.format(
+                _qname(result))
+        messages.append('<message name="{0}.{1}Response">{2}'
+                        '</message>'.format(name, method, parts))
+        operations.append(
+            '<operation name="{1}">'
+            '<input message="tns:{0}.{1}Request"/>'
+            '<output message="tns:{0}.{1}Response"/>'
+            '</operation>'.format(name, method))
+        bindings.append(
+            '<operation name="{0}">'
+            '<soap:operation soapAction="{1}"/>'
+            '<input>{2}</input><output>{2}</output>'
+            '</operation>'.format(method, _namespace(name), body))
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<definitions name="{name}" targetNamespace="{ns}" '
+        'xmlns:tns="{ns}" xmlns:iControl="{ns}" xmlns:xsd="{xsd}" '
+        'xmlns:SOAP-ENC="{enc}" xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" '
+        'xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" '
+        'xmlns="http://schemas.xmlsoap.org/wsdl/">'
+        '<types><xsd:schema targetNamespace="{ns}">'
+        '<xsd:import namespace="{enc}"/>{types}</xsd:schema></types>'
+        '{messages}'
+        '<portType name="{name}PortType">{operations}</portType>'
+        '<binding name="{name}Binding" type="tns:{name}PortType">'
+        '<soap:binding style="rpc" '
+        'transport="http://schemas.xmlsoap.org/soap/http"/>'
+        '{bindings}</binding>'
+        '<service name="{name}">'
+        '<port name="{name}Port" binding="tns:{name}Binding">'
+        '<soap:address location="{location}"/></port></service>'
+        '</definitions>').format(name=name,
+                                 ns=NS_ICONTROL,
+                                 xsd=NS_XSD,
+                                 enc=NS_SOAP_ENC,
+                                 types=''.join(types),
+                                 messages=''.join(messages),
+                                 operations=''.join(operations),
+                                 bindings=''.join(bindings),
+                                 location=saxutils.escape(location))
+
+
+def _stanzas(data):
+    """
+    Split a tmsh configuration file into its top level stanzas.
+
+    :param data: A string of the file.
+    :returns: list of (header words, body string) tuples
+    """
+    stanzas = []
+    pos = 0
+    while True:
+        start = data.find('{', pos)
+        if start < 0:
+            return stanzas
+        depth, end = 1, start + 1
+        while depth:
+            if end == len(data):
+                raise Fault('Unbalanced braces in configuration file.')
+            depth += {'{': 1, '}': -1}.get(data[end], 0)
+            end += 1
+        stanzas.append((data[pos:start].split(), data[start + 1:end - 1]))
+        pos = end
+
+
+def _properties(body):
+    """
+    Parse the body of a stanza, with one property or nested block per
+    line.
+
+    :param body: A string of the stanza's body.
+    :returns: collections.OrderedDict of names to strings or nested dicts
+    """
+    lines = iter(line.strip() for line in body.splitlines() if line.strip())
+
+    def block():
+        props = collections.OrderedDict()
+        for line in lines:
+            if line == '}':
+                break
+            if line.endswith('{'):
+                props[line[:-1].strip()] = block()
+            else:
+                name, _, value = line.partition(' ')
+                props[name] = value.strip()
+        return props
+    return block()
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def decode(elem, type_name):
+    """
+    Return the Python value of an encoded element.
+
+    :param elem: An Element.
+    :param type_name: A string containing the element's iControl type.
+    :returns: list, dict, int, bool or string
+    """
+    if type_name == 'xsd:long':
+        return int(elem.text)
+    if type_name == 'xsd:boolean':
+        return (elem.text or '').strip() in ('true', '1')
+    if type_name.startswith('xsd:'):
+        return elem.text or ''
+    kind, spec = TYPES[type_name]
+    if kind == 'array':
+        return [decode(child, spec) for child in elem]
+    if kind == 'struct':
+        children = dict((_local(c.tag), c) for c in elem)
+        return dict((f, decode(children[f], t) if f in children else None)
+                    for f, t in spec)
+    return elem.text or ''
+
+
+def encode(name, value, type_name):
+    """
+    Return the encoded element of a Python value, as a string.
+
+    :param name: A string containing the element name.
+    :param value: The value to encode.
+    :param type_name: A string containing the value's iControl type.
+    :returns: string
+    """
+    if type_name == 'xsd:boolean':
+        text = 'true' if value else 'false'
+        return '<{0} xsi:type="xsd:boolean">{1}</{0}>'.format(name, text)
+    if type_name.startswith('xsd:'):
+        return '<{0} xsi:type="{1}">{2}</{0}>'.format(
+            name, type_name, saxutils.escape(unicode(value)))
+    kind, spec = TYPES[type_name]
+    if kind == 'array':
+        items = ''.join(encode('item', v, spec) for v in value)
+        return ('<{0} xsi:type="SOAP-ENC:Array" '
+                'SOAP-ENC:arrayType="{1}[{2}]">{3}</{0}>').format(
+                    name, _qname(spec), len(value), items)
+    if kind == 'struct':
+        fields = ''.join(encode(f, value[f], t) for f, t in spec)
+        return '<{0} xsi:type="{1}">{2}</{0}>'.format(name, _qname(type_name),
+                                                      fields)
+    return '<{0} xsi:type="{1}">{2}</{0}>'.format(
+        name, _qname(type_name), saxutils.escape(value))
+
+
+def _envelope(body):
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<SOAP-ENV:Envelope xmlns:SOAP-ENV="{0}" xmlns:SOAP-ENC="{1}" '
+            'xmlns:xsd="{2}" xmlns:xsi="{3}" xmlns:iControl="{4}" '
+            'SOAP-ENV:encodingStyle="{1}"><SOAP-ENV:Body>{5}'
+            '</SOAP-ENV:Body></SOAP-ENV:Envelope>').format(
+                NS_SOAP_ENV, NS_SOAP_ENC, NS_XSD, NS_XSI, NS_ICONTROL, body)
+
+
+def fault(msg):
+    """
+    Return a SOAP fault envelope carrying `msg`.
+
+    :param msg: A string containing the fault.
+    :returns: string
+    """
+    return _envelope('<SOAP-ENV:Fault><faultcode>SOAP-ENV:Server</faultcode>'
+                     '<faultstring>{0}</faultstring>'
+                     '</SOAP-ENV:Fault>'.format(saxutils.escape(msg)))
+
+
+class FakeIControlServer(SocketServer.ThreadingMixIn,
+                         BaseHTTPServer.HTTPServer):
+    """
+    An HTTP server answering iControl calls from a FakeDevice, with
+    optional latency and failures injected per call.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, address=('127.0.0.1', 0), device=None, latency=0,
+                 error_rate=0, username='admin', password='admin'):
+        """
+        Construct a FakeIControlServer with the supplied args.
+
+        :param address: A (host, port) tuple to listen on, port 0 picks a
+                        free one.
+        :param device: A FakeDevice, a new one when None.
+        :param latency: A float of seconds every call is delayed by.
+        :param error_rate: A float fraction of calls failed at random.
+        :param username: A string containing the username to accept.
+        :param password: A string containing the password to accept.
+        :returns: None
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, address, FakeIControlHandler)
+        self.device = device or FakeDevice()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.latencies = {}
+        self.failures = {}
+        self.calls = collections.Counter()
+        self.connections = 0
+        self._sockets = set()
+        self.credentials = base64.b64encode('{0}:{1}'.format(username,
+                                                             password))
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def host(self):
+        return '{0}:{1}'.format(*self.server_address)
+
+    def set_latency(self, seconds, method=None):
+        """
+        Delay calls by `seconds`.
+
+        :param seconds: A float of seconds.
+        :param method: A string such as 'LocalLB.Pool.get_list' to delay
+                       only that method, or None for every call.
+        :returns: None
+        """
+        if method is None:
+            self.latency = seconds
+        else:
+            self.latencies[method] = seconds
+
+    def fail(self, method, times=1, msg='Injected failure'):
+        """
+        Answer the next `times` calls of `method` with a SOAP fault.
+
+        :param method: A string such as 'LocalLB.Pool.create_v2'.
+        :param times: An int of calls to fail.
+        :param msg: A string containing the fault.
+        :returns: None
+        """
+        with self._lock:
+            self.failures[method] = (times, msg)
+
+    def start(self):
+        """
+        Serve on a background thread.
+
+        :returns: FakeIControlServer
+        """
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        args=(self.POLL_INTERVAL,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving, and close the listening socket.
+
+        :returns: None
+        """
+        self.shutdown()
+        self.server_close()
+        with self._lock:
+            sockets = list(self._sockets)
+        # Wake the threads still waiting on keep-alive connections.
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        if self._thread:
+            self._thread.join()
+
+    def dispatch(self, body, session=None):
+        """
+        Answer one SOAP request.
+
+        :param body: A string containing the request envelope.
+        :param session: A string containing the request's X-iControl-Session
+                        header, or None.
+        :returns: (int, string) of HTTP status and response envelope
+        """
+        call = etree.fromstring(body).find(
+            '{{{0}}}Body'.format(NS_SOAP_ENV))[0]
+        wsdl = call.tag[1:].split('}')[0].split(':')[-1].replace('/', '.')
+        method = _local(call.tag)
+        key = '{0}.{1}'.format(wsdl, method)
+        with self._lock:
+            self.calls[key] += 1
+            times, msg = self.failures.get(key, (0, None))
+            if times:
+                self.failures[key] = (times - 1, msg)
+        time.sleep(self.latencies.get(key, self.latency))
+        if times or random.random() < self.error_rate:
+            return 500, fault(msg or 'Injected failure')
+
+        params, result = INTERFACES[wsdl][0][method]
+        children = dict((_local(c.tag), c) for c in call)
+        args = dict((p, decode(children[p], t)) for p, t in params
+                    if p in children)
+        try:
+            with self._lock:
+                value = self.device.call(wsdl, method, args, session)
+        except Fault as e:
+            msg = ('Exception caught in {0}::{1}()\nException: '
+                   'Common::OperationFailed\n  {2}').format(
+                       wsdl.replace('.', '::'), method, e)
+            return 500, fault(msg)
+        ret = encode('return', value, result) if result else ''
+        return 200, _envelope('<m:{0}Response xmlns:m="{1}">{2}'
+                              '</m:{0}Response>'.format(method,
+                                                        _namespace(wsdl),
+                                                        ret))
+
+
+class FakeIControlHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves WSDLs on GET and iControl calls on POST, over keep-alive
+    connections.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response into one write, so Nagle's algorithm does not
+    # hold back its body behind the headers.
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server._lock:
+            self.server.connections += 1
+            self.server._sockets.add(self.connection)
+
+    def finish(self):
+        with self.server._lock:
+            self.server._sockets.discard(self.connection)
+        BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        url = urlparse.urlsplit(self.path)
+        name = urlparse.parse_qs(url.query).get('WSDL', [None])[0]
+        if url.path != ICONTROL_URI or name not in INTERFACES:
+            self._send(404, 'text/plain', 'Not Found')
+            return
+        location = 'http://{0}{1}'.format(self.server.host, ICONTROL_URI)
+        self._send(200, 'text/xml', wsdl(name, location))
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.GzipFile(fileobj=StringIO.StringIO(body)).read()
+        status, data = self.server.dispatch(
+            body, self.headers.get('X-iControl-Session'))
+        self._send(status, 'text/xml; charset=utf-8', data)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _authorized(self):
+        auth = self.headers.get('Authorization', '')
+        if auth == 'Basic {0}'.format(self.server.credentials):
+            return True
+        self.send_response(401)
+        self.send_header('WWW-Authenticate', 'Basic realm="iControl"')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return False
+
+    def _send(self, status, content_type, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            buf = StringIO.StringIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as file:
+                file.write(data)
+            data = buf.getvalue()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def join_cluster(servers, group='/Common/failover'):
+    """
+    Put the devices of `servers` in one sync-failover device group, with
+    the first device active and the others standing by.
+
+    :param servers: A list of started FakeIControlServers.
+    :param group: A string containing the device group name.
+    :returns: None
+    """
+    devices = [s.device for s in servers]
+    for i, (server, device) in enumerate(zip(servers, devices)):
+        device.device_name = '/Common/bigip{0}'.format(i + 1)
+        device.management_address = server.host
+        device.failover_state = ('HA_STATE_ACTIVE' if i == 0
+                                 else 'HA_STATE_STANDBY')
+    names = [d.device_name for d in devices]
+    for device in devices:
+        device.peers = [d for d in devices if d is not device]
+        device.device_groups = collections.OrderedDict([
+            ('/Common/device_trust_group', ('DGT_SYNC_ONLY', names)),
+            (group, ('DGT_SYNC_FAILOVER', names))])
+
+
+if __name__ == '__main__':
+    from docopt import docopt
+
+    args = docopt(__doc__)
+    server = FakeIControlServer(('127.0.0.1', int(args['--port'])),
+                                latency=float(args['--latency']),
+                                error_rate=float(args['--error-rate']))
+    print 'Serving iControl on {0}'.format(server.host)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
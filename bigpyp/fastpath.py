@@ -0,0 +1,302 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+import StringIO
+
+from xml.etree import cElementTree as etree
+from xml.sax import saxutils
+
+from suds import transport
+
+import metrics
+
+LOG = logging.getLogger(__name__)
+
+ICONTROL_URI = '/iControl/iControlPortal.cgi'
+NS_SOAP_ENV = 'http://schemas.xmlsoap.org/soap/envelope/'
+NS_SOAP_ENC = 'http://schemas.xmlsoap.org/soap/encoding/'
+NS_XSD = 'http://www.w3.org/2001/XMLSchema'
+NS_XSI = 'http://www.w3.org/2001/XMLSchema-instance'
+
+_XSI_TYPE = '{{{0}}}type'.format(NS_XSI)
+_ARRAY_TYPE = '{{{0}}}arrayType'.format(NS_SOAP_ENC)
+_FAULT = '{{{0}}}Fault'.format(NS_SOAP_ENV)
+_INTEGERS = set(['xsd:long', 'xsd:int', 'xsd:short', 'xsd:byte',
+                 'xsd:unsignedLong', 'xsd:unsignedInt', 'xsd:unsignedShort',
+                 'xsd:unsignedByte'])
+
+_STRINGS = 'xsd:string[]'
+_MEMBERS = 'Common.AddressPort[][]'
+_MODE = 'Management.KeyCertificate.ManagementModeType'
+
+# The read-only methods bigpyp calls, with their parameters in order.
+# Parameter types are 'xsd:string[]', 'Common.AddressPort[][]' or an
+# iControl enum.
+METHODS = {
+    'LocalLB.Monitor.get_template_list': (),
+    'LocalLB.Pool.get_all_member_statistics': (('pool_names', _STRINGS),),
+    'LocalLB.Pool.get_list': (),
+    'LocalLB.Pool.get_member_object_status': (('pool_names', _STRINGS),
+                                              ('members', _MEMBERS)),
+    'LocalLB.Pool.get_member_v2': (('pool_names', _STRINGS),),
+    'LocalLB.Pool.get_monitor_association': (('pool_names', _STRINGS),),
+    'LocalLB.ProfileClientSSL.get_list': (),
+    'LocalLB.ProfileClientSSL.get_chain_file': (
+        ('profile_names', _STRINGS),),
+    'LocalLB.ProfileHttp.get_list': (),
+    'LocalLB.ProfileHttp.get_default_profile': (
+        ('profile_names', _STRINGS),),
+    'LocalLB.ProfileHttp.get_insert_xforwarded_for_header_mode': (
+        ('profile_names', _STRINGS),),
+    'LocalLB.ProfileTCP.get_list': (),
+    'LocalLB.ProfileTCP.get_keep_alive_interval': (
+        ('profile_names', _STRINGS),),
+    'LocalLB.Rule.get_list': (),
+    'LocalLB.VirtualServer.get_list': (),
+    'LocalLB.VirtualServer.get_snat_pool': (
+        ('virtual_servers', _STRINGS),),
+    'LocalLB.VirtualServer.get_statistics': (
+        ('virtual_servers', _STRINGS),),
+    'Management.DBVariable.query': (('variables', _STRINGS),),
+    'Management.KeyCertificate.get_certificate_list': (('mode', _MODE),),
+    'Management.KeyCertificate.get_key_list': (('mode', _MODE),),
+    'Management.KeyCertificate.certificate_export_to_pem': (
+        ('mode', _MODE), ('cert_ids', _STRINGS)),
+    'System.Inet.get_ntp_server_address': (),
+    'System.SystemInfo.get_version': (),
+}
+
+
+class FastPathError(Exception):
+    """
+    Raised when a call cannot be answered over the fast path, and has to go
+    through suds instead.
+    """
+
+
+class Record(dict):
+    """
+    A decoded iControl struct.  Fields read as keys or as attributes, like
+    the suds objects it stands in for.
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class FastPath(object):
+    """
+    Calls read-only iControl methods with pre-rendered SOAP envelopes, and
+    decodes their responses into lists, Records and scalars while parsing,
+    without building a suds object graph.
+    """
+
+    def __init__(self, transport, host, proto='https', methods=None,
+                 headers=None):
+        """
+        Construct a FastPath with the supplied args.
+
+        :param transport: A suds transport sending the requests, e.g. a
+                          KeepAliveTransport.
+        :param host: A string containing the device host.
+        :param proto: A string containing the scheme of the device's
+                      iControl portal.
+        :param methods: A list of '<wsdl>.<method>' names to call over the
+                        fast path, defaults to every one in `METHODS`.
+        :param headers: A callable returning a dict of extra HTTP headers
+                        for each request, e.g. the iControl session's.
+        :returns: None
+        """
+        if methods is None:
+            methods = METHODS.keys()
+        unknown = set(methods) - set(METHODS)
+        if unknown:
+            msg = 'no fast path for {0}'.format(', '.join(sorted(unknown)))
+            raise ValueError(msg)
+        self.methods = set(methods)
+        self.url = '{0}://{1}{2}'.format(proto, host, ICONTROL_URI)
+        self._transport = transport
+        self._headers = headers or dict
+        self._templates = {}
+
+    def enabled(self, wsdl, name):
+        return '{0}.{1}'.format(wsdl, name) in self.methods
+
+    def wrap(self, wsdl, name, method):
+        """
+        Return `method` answered over the fast path, and by `method` itself
+        whenever the fast path fails.
+
+        :param wsdl: A string containing the interface, e.g. 'LocalLB.Pool'.
+        :param name: A string containing the method name.
+        :param method: The suds callable to fall back to.
+        :returns: callable
+        """
+        def call(*args, **kwargs):
+            try:
+                return self.call(wsdl, name, *args, **kwargs)
+            except (FastPathError, transport.TransportError) as e:
+                LOG.debug('%s.%s falls back to suds: %s', wsdl, name, e)
+                return method(*args, **kwargs)
+        return call
+
+    def call(self, wsdl, name, *args, **kwargs):
+        """
+        Call a method over the fast path.
+
+        :param wsdl: A string containing the interface, e.g. 'LocalLB.Pool'.
+        :param name: A string containing the method name.
+        :param args: The method's parameters, in order.
+        :param kwargs: The method's parameters, by name.
+        :returns: the decoded return value
+        :raises: FastPathError, TransportError
+        """
+        head, tail, params = self._template(wsdl, name)
+        if len(args) > len(params):
+            raise FastPathError('too many parameters')
+        values = dict(zip([p for p, t in params], args))
+        values.update(kwargs)
+        if set(values) != set(p for p, t in params):
+            raise FastPathError('parameters do not match')
+        body = [head]
+        for param, type_name in params:
+            body.append(_render(param, type_name, values[param]))
+        body.append(tail)
+        message = ''.join(body)
+
+        request = transport.Request(self.url, message)
+        request.headers = {'Content-Type': 'text/xml; charset=utf-8',
+                           'SOAPAction': '"{0}"'.format(_namespace(wsdl))}
+        request.headers.update(self._headers())
+        reply = self._transport.send(request)
+        if reply is None:
+            raise FastPathError('empty reply')
+        metrics.add_payload(len(message), len(reply.message))
+        return parse(reply.message)
+
+    def _template(self, wsdl, name):
+        # The envelope around the parameters never changes for a method.
+        template = self._templates.get((wsdl, name))
+        if template is None:
+            params = METHODS['{0}.{1}'.format(wsdl, name)]
+            head = ('<?xml version="1.0" encoding="UTF-8"?>'
+                    '<SOAP-ENV:Envelope xmlns:SOAP-ENV="{0}" '
+                    'xmlns:SOAP-ENC="{1}" xmlns:xsd="{2}" xmlns:xsi="{3}" '
+                    'xmlns:iControl="urn:iControl" '
+                    'SOAP-ENV:encodingStyle="{1}"><SOAP-ENV:Body>'
+                    '<m:{4} xmlns:m="{5}">').format(
+                        NS_SOAP_ENV, NS_SOAP_ENC, NS_XSD, NS_XSI, name,
+                        _namespace(wsdl))
+            tail = '</m:{0}></SOAP-ENV:Body></SOAP-ENV:Envelope>'.format(name)
+            template = self._templates[(wsdl, name)] = (head, tail, params)
+        return template
+
+
+def parse(data):
+    """
+    Decode the return value of a SOAP response, element by element.
+    Arrays become lists, structs Records, and leaves ints, booleans,
+    strings or None, as suds would decode them.
+
+    :param data: A string containing the response envelope.
+    :returns: the decoded return value, or None
+    :raises: FastPathError on a fault, or on encoding it does not handle
+    """
+    # One frame per open element below the response: its xsi:type, and the
+    # (name, value) pairs of its children.
+    stack = []
+    depth = 0
+    result = None
+    for event, elem in etree.iterparse(StringIO.StringIO(data),
+                                       events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if elem.tag == _FAULT:
+                stack = None
+            elif depth > 3 and stack is not None:
+                if 'href' in elem.attrib:
+                    raise FastPathError('multi-ref encoding')
+                stack.append([])
+            continue
+
+        depth -= 1
+        if stack is None:
+            if elem.tag == _FAULT:
+                raise FastPathError(elem.findtext('faultstring') or 'fault')
+            continue
+        if depth < 3:
+            continue
+        children = stack.pop()
+        value = _value(elem, children)
+        name = elem.tag.rsplit('}', 1)[-1]
+        if stack:
+            stack[-1].append((name, value))
+        else:
+            result = value
+        elem.clear()
+    return result
+
+
+def _value(elem, children):
+    xsi_type = elem.get(_XSI_TYPE, '')
+    if children or _ARRAY_TYPE in elem.attrib or xsi_type.endswith(':Array'):
+        if _ARRAY_TYPE in elem.attrib or xsi_type.endswith(':Array'):
+            # suds reads empty items as empty strings, empty fields as None.
+            return ['' if v is None else v for n, v in children]
+        return Record(children)
+    text = elem.text
+    if not text:
+        return None
+    if xsi_type in _INTEGERS:
+        return int(text)
+    if xsi_type == 'xsd:boolean':
+        return text.strip() in ('true', '1')
+    return text
+
+
+def _render(name, type_name, value):
+    if type_name == _STRINGS:
+        items = ''.join('<item>{0}</item>'.format(saxutils.escape(v))
+                        for v in value)
+        return ('<{0} xsi:type="SOAP-ENC:Array" '
+                'SOAP-ENC:arrayType="xsd:string[{1}]">{2}</{0}>').format(
+                    name, len(value), items)
+    if type_name == _MEMBERS:
+        sequences = []
+        for sequence in value:
+            # A suds sequence object, or a plain list.
+            members = getattr(sequence, 'items', sequence)
+            items = ''.join('<item><address>{0}</address><port>{1}</port>'
+                            '</item>'.format(saxutils.escape(m.address),
+                                             int(m.port))
+                            for m in members)
+            sequences.append(
+                '<item xsi:type="SOAP-ENC:Array" '
+                'SOAP-ENC:arrayType="iControl:Common.AddressPort[{0}]">'
+                '{1}</item>'.format(len(members), items))
+        return ('<{0} xsi:type="SOAP-ENC:Array" '
+                'SOAP-ENC:arrayType="iControl:Common.AddressPort[][{1}]">'
+                '{2}</{0}>').format(name, len(value), ''.join(sequences))
+    return '<{0} xsi:type="iControl:{1}">{2}</{0}>'.format(
+        name, type_name, saxutils.escape(value))
+
+
+def _namespace(wsdl):
+    return 'urn:iControl:{0}'.format(wsdl.replace('.', '/'))
@@ -0,0 +1,187 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import collections
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import yaml
+
+import cluster
+import metrics
+import utils
+
+Job = collections.namedtuple('Job', ['zone', 'host', 'options', 'sync_group'])
+Job.__new__.__defaults__ = (None, None)
+Result = collections.namedtuple('Result', ['zone', 'host', 'ok', 'elapsed',
+                                           'error', 'log'])
+
+
+def load_devices(devices_file):
+    """
+    Load and return the zone to device hosts mapping.
+
+    :param devices_file: A string containing the path of a YAML file with a
+                         `devices` map of zone names to lists of hosts.
+    :returns: dict
+    """
+    with open(devices_file, 'r') as file:
+        return yaml.load(file)['devices']
+
+
+def zone_jobs(zones, devices, options=None):
+    """
+    Return one job per device of every zone.
+
+    :param zones: A list of zone names.
+    :param devices: A dict mapping zone names to lists of hosts.
+    :param options: A dict of options handed to every job.
+    :returns: list
+    """
+    return [Job(zone, host, options) for zone in zones
+            for host in devices[zone]]
+
+
+def cluster_jobs(jobs, bigip_options):
+    """
+    Replace the jobs of the devices of one sync-failover device group with
+    one job on its active device, which syncs the group once applied.
+    Jobs of devices in no group are kept.
+
+    :param jobs: A list of Job objects.
+    :param bigip_options: A dict of BigIP keyword arguments.
+    :returns: list
+    """
+    # Imported here, as load_balancer imports this module.
+    import load_balancer
+
+    result = []
+    covered = set()
+    for job in jobs:
+        if (job.zone, job.host) in covered:
+            continue
+        b = load_balancer.BigIP(host=job.host, **bigip_options)
+        c = cluster.discover(b)
+        if c is None or c.active is None:
+            result.append(job)
+            continue
+        covered.update((job.zone, address) for address in c.addresses)
+        result.append(job._replace(host=c.active.address, sync_group=c.group))
+    return result
+
+
+def apply(jobs, options, workers):
+    """
+    Apply every job on a pool of worker processes.
+
+    :param jobs: A list of Job objects.
+    :param options: A dict with the `bigip` keyword arguments, `stages`,
+                    `batch_size`, `concurrency`, `read_concurrency`,
+                    `prune_members`, `drain`, `catalog_cache`,
+                    `ledger_dir`, `full`, `transaction`, `bulk_load`,
+                    `log_dir` and `metrics_dir` shared by every job.
+    :param workers: An int of the most jobs run at once.
+    :returns: list of Result objects, in job order
+    """
+    if not os.path.isdir(options['log_dir']):
+        os.makedirs(options['log_dir'])
+    jobs = [job._replace(options=options) for job in jobs]
+    pool = multiprocessing.Pool(min(workers, len(jobs)) or 1)
+    try:
+        return pool.map(run, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def run(job):
+    """
+    Apply one zone to one device, with output going to the job's own log.
+
+    :param job: A Job object.
+    :returns: Result
+    """
+    # Imported here, as load_balancer imports this module.
+    import load_balancer
+
+    options = job.options
+    log = os.path.join(options['log_dir'],
+                       '{0}-{1}.log'.format(job.zone, job.host))
+    start = time.time()
+    stdout, stderr = sys.stdout, sys.stderr
+    os.environ['ANSI_COLORS_DISABLED'] = '1'
+    bigip_options = dict(options['bigip'])
+    m = None
+    if options.get('metrics_dir'):
+        m = bigip_options['metrics'] = metrics.Metrics({'zone': job.zone,
+                                                        'host': job.host})
+    with open(log, 'w') as file:
+        sys.stdout = sys.stderr = file
+        try:
+            vips = load_balancer.load_vips(
+                job.zone, options.get('catalog_cache'))
+            b = load_balancer.BigIP(host=job.host, **bigip_options)
+            zone_ledger = None
+            if options.get('ledger_dir'):
+                zone_ledger = load_balancer.load_ledger(
+                    options['ledger_dir'], job.zone, job.host,
+                    options.get('full', False))
+            load_balancer.apply_zone(b, vips, options['stages'],
+                                     options['batch_size'],
+                                     options.get('concurrency', 1),
+                                     options.get('prune_members', False),
+                                     options.get('drain', 0),
+                                     zone_ledger,
+                                     options.get('read_concurrency', 1),
+                                     options.get('transaction'),
+                                     options.get('bulk_load', False))
+            if job.sync_group:
+                cluster.sync(b, job.sync_group)
+            error = None
+        except Exception as e:
+            traceback.print_exc()
+            error = '{0}: {1}'.format(type(e).__name__, e)
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+    if m:
+        load_balancer.write_metrics(m, options['metrics_dir'])
+    return Result(job.zone, job.host, error is None, time.time() - start,
+                  error, log)
+
+
+def print_summary(results):
+    """
+    Print one line per job, followed by the totals.
+
+    :param results: A list of Result objects.
+    :returns: None
+    """
+    print 'Summary'
+    for r in results:
+        msg = '  - {0} on {1} ({2:.1f}s)'.format(r.zone, r.host, r.elapsed)
+        if r.ok:
+            utils.print_green(msg + ' ok')
+        else:
+            utils.print_red('{0} failed: {1}, see {2}'.format(msg, r.error,
+                                                              r.log))
+    failed = len([r for r in results if not r.ok])
+    msg = '{0} applied, {1} failed'.format(len(results) - failed, failed)
+    if failed:
+        utils.print_red(msg)
+    else:
+        utils.print_green(msg)
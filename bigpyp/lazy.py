@@ -0,0 +1,114 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import threading
+
+
+class LazyBIGIP(object):
+    """
+    A stand-in for pycontrol's BIGIP whose interfaces load their WSDL on
+    first attribute access, so a run only pays for the interfaces it uses.
+    """
+
+    def __init__(self, wsdls, loader, wrap=None):
+        """
+        Construct a LazyBIGIP with the supplied args.
+
+        :param wsdls: A list of WSDL names, e.g. 'LocalLB.Pool'.
+        :param loader: A callable taking a WSDL name, and returning a
+                       pycontrol BIGIP holding that interface.
+        :param wrap: A callable taking a WSDL name, method name and method,
+                     and returning the callable used in its place, e.g. to
+                     instrument every call.
+        :returns: None
+        """
+        self._modules = {}
+        for wsdl in wsdls:
+            module_name, interface_name = wsdl.split('.')
+            module = self._modules.setdefault(module_name,
+                                              LazyModule(module_name))
+            setattr(module, interface_name,
+                    LazyInterface(wsdl, loader, wrap))
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['_modules'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def interfaces(self):
+        """
+        Return every interface, loaded or not.
+
+        :returns: list
+        """
+        return [i for m in self._modules.values()
+                for i in vars(m).values()
+                if isinstance(i, LazyInterface)]
+
+
+class LazyModule(object):
+    """
+    An iControl module (e.g. LocalLB) holding lazy interfaces.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+
+class LazyInterface(object):
+    """
+    An iControl interface (e.g. LocalLB.Pool) which loads its WSDL on first
+    attribute access, and delegates to pycontrol's interface afterwards.
+    """
+
+    def __init__(self, wsdl, loader, wrap=None):
+        self.wsdl = wsdl
+        self._loader = loader
+        self._wrap = wrap
+        self._wrapped = {}
+        self._interface = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._interface is not None
+
+    def load(self):
+        """
+        Load the WSDL unless it is already loaded, and return pycontrol's
+        interface object.
+
+        :returns: pycontrol.InterfaceInstance
+        """
+        with self._lock:
+            if self._interface is None:
+                module_name, interface_name = self.wsdl.split('.')
+                b = self._loader(self.wsdl)
+                self._interface = getattr(getattr(b, module_name),
+                                          interface_name)
+            return self._interface
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attr = getattr(self.load(), name)
+        if self._wrap is None or not callable(attr):
+            return attr
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            wrapped = self._wrapped[name] = self._wrap(self.wsdl, name, attr)
+        return wrapped
@@ -0,0 +1,277 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+"""Per zone and device records of what bigpyp applied.
+
+A ledger is valid while the device's configuration generation,
+`Configsync.LocalConfigTime`, is the one recorded after its last run.  The
+generation covers the whole device, not one zone: a run of another zone
+that changes the device, like any other change to it, invalidates the
+ledger of every zone on it, and their next runs read and reconcile every
+object again.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+
+from suds import WebFault
+
+import cert
+import monitor
+import profile
+import rule
+import system
+
+# Bumped by the device on every configuration change, of any zone.
+GENERATION_VARIABLE = 'Configsync.LocalConfigTime'
+
+# The stages applying each VIP, and the shared objects of every stage.
+VIP_STAGES = ['cert', 'profile', 'pool', 'virtual_server']
+STAGE_SHARED = {'cert': ['intermediate_bundle'],
+                'profile': ['http_profile', 'tcp_profile'],
+                'system': ['ntp'],
+                'rule': ['rule'],
+                'monitor': ['monitor'],
+                'pool': [],
+                'virtual_server': []}
+
+
+def device_generation(bigip):
+    """
+    Return the device's configuration generation, or None when the device
+    does not report one.
+
+    :param bigip: An instance of the BigIP object.
+    :returns: string
+    """
+    db_variable = bigip.pc.Management.DBVariable
+    try:
+        result = db_variable.query(variables=[GENERATION_VARIABLE])
+    except WebFault:
+        return None
+    return result[0].value
+
+
+def shared_digests(year=None):
+    """
+    Return a digest of each shared object bigpyp manages.
+
+    :param year: An int of the year certificates are named after.
+    :returns: dict
+    """
+    year = year or datetime.datetime.now().year
+    bundle = cert.Cert.INTERMEDIATE_BUNDLE
+    bundle_file = os.path.join(cert.Cert.FILE_BASEDIR,
+                               '%s.crt' % bundle.split('/')[-1])
+    return {'intermediate_bundle': _digest(bundle, year,
+                                           _signature(bundle_file)),
+            'http_profile': _digest(profile.HTTPProfile.PROFILE_NAME,
+                                    profile.HTTPProfile.INSERT_X_FORWARDED_FOR,
+                                    profile.HTTPProfile.DEFAULT_PROFILE),
+            'tcp_profile': _digest(profile.TCPProfile.PROFILE_NAME,
+                                   profile.TCPProfile.KEEP_ALIVE_INTERVAL),
+            'ntp': _digest(sorted(system.System.NTP_SERVERS_LIST)),
+            'rule': _digest(rule.Rule.RULE_NAME, rule.Rule.IRULE),
+            'monitor': _digest(monitor.Monitor.MONITOR_NAME)}
+
+
+def vip_digest(vip, year=None):
+    """
+    Return a digest of a VIP's definition and of its local key and
+    certificate files.
+
+    :param vip: A Vip object.
+    :param year: An int of the year certificates are named after.
+    :returns: string
+    """
+    year = year or datetime.datetime.now().year
+    files = [os.path.join(cert.Cert.FILE_BASEDIR, path)
+             for path in (vip.key_path, vip.cert_path) if path]
+    return _digest(vip.digest, year, [_signature(f) for f in files])
+
+
+class Ledger(object):
+    """
+    What the last runs applied to one device: a digest per VIP and per
+    shared object, and the device's configuration generation right after
+    they were applied.  While the generation is unchanged, only VIPs and
+    objects whose digest changed have to be applied again.
+    """
+
+    FORMAT_VERSION = 1
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'),
+                                     '.bigpyp', 'ledger')
+
+    def __init__(self, path):
+        """
+        Construct a Ledger with the supplied args.
+
+        :param path: A string containing the ledger file.  A missing or
+                     unreadable file is an empty ledger.
+        :returns: None
+        """
+        self.path = path
+        self.generation = None
+        self.options = None
+        self.vips = {}
+        self.shared = {}
+        self._pending = None
+        try:
+            with open(path, 'r') as file:
+                doc = json.load(file)
+        except (IOError, ValueError):
+            return
+        if doc.get('format') != self.FORMAT_VERSION:
+            return
+        self.generation = doc['generation']
+        self.options = doc['options']
+        self.vips = doc['vips']
+        self.shared = doc['shared']
+
+    @classmethod
+    def for_device(cls, directory, zone, host):
+        """
+        Return the ledger of zone `zone` on device `host`.
+
+        :param directory: A string containing the ledger directory.
+        :param zone: A string containing the zone name.
+        :param host: A string containing the device host.
+        :returns: Ledger
+        """
+        return cls(os.path.join(directory, '{0}-{1}.json'.format(zone, host)))
+
+    def reset(self):
+        """
+        Forget every earlier run, so the next one applies everything.
+
+        :returns: None
+        """
+        self.generation = None
+        self.vips = {}
+        self.shared = {}
+
+    def changes(self, bigip, vips, stages, options):
+        """
+        Return what is left to apply, and remember it for `commit`.
+
+        :param bigip: An instance of the BigIP object.
+        :param vips: An instance of the VipCatalog object.
+        :param stages: A list of stage names, in apply order.
+        :param options: A dict of the apply options, e.g. prune_members.
+        :returns: (list of Vip objects, list of stage names)
+        """
+        year = datetime.datetime.now().year
+        vip_digests = dict((vip.name, vip_digest(vip, year)) for vip in vips)
+        shared = shared_digests(year)
+        generation = device_generation(bigip)
+        if generation is not None and (generation, options) == \
+                (self.generation, self.options):
+            dirty_vips = [vip for vip in vips
+                          if self.vips.get(vip.name) != vip_digests[vip.name]]
+            dirty_shared = set(key for key, digest in shared.iteritems()
+                               if self.shared.get(key) != digest)
+        else:
+            dirty_vips = list(vips)
+            dirty_shared = set(shared)
+        dirty_stages = []
+        for stage in stages:
+            if dirty_shared.intersection(STAGE_SHARED[stage]):
+                dirty_stages.append(stage)
+            elif dirty_vips and stage in VIP_STAGES:
+                dirty_stages.append(stage)
+        self._pending = {'options': options,
+                         'vips': vip_digests,
+                         'dirty_vips': set(vip.name for vip in dirty_vips),
+                         'shared': shared,
+                         'dirty_shared': dirty_shared}
+        return dirty_vips, dirty_stages
+
+    def commit(self, bigip, stages):
+        """
+        Record what `stages` applied, with the device's generation after it,
+        and save the ledger.  A VIP or shared object whose stages did not
+        all run is left out, so the next run applies it again.
+
+        :param bigip: An instance of the BigIP object.
+        :param stages: A list of the stage names which ran.
+        :returns: None
+        """
+        pending = self._pending
+        self._pending = None
+        if not stages:
+            return
+        all_vip_stages = set(VIP_STAGES).issubset(stages)
+        vips = {}
+        for name, digest in pending['vips'].iteritems():
+            if name not in pending['dirty_vips']:
+                if name in self.vips:
+                    vips[name] = self.vips[name]
+            elif all_vip_stages:
+                vips[name] = digest
+        shared = {}
+        for stage, keys in STAGE_SHARED.iteritems():
+            for key in keys:
+                if key not in pending['dirty_shared']:
+                    if key in self.shared:
+                        shared[key] = self.shared[key]
+                elif stage in stages:
+                    shared[key] = pending['shared'][key]
+        self.generation = device_generation(bigip)
+        self.options = pending['options']
+        self.vips = vips
+        self.shared = shared
+        self.save()
+
+    def refresh(self, bigip):
+        """
+        Record the device's current generation, once the changes made to it
+        since the last run were reverted by other means, and save the
+        ledger.
+
+        :param bigip: An instance of the BigIP object.
+        :returns: None
+        """
+        self.generation = device_generation(bigip)
+        self.save()
+
+    def save(self):
+        doc = {'format': self.FORMAT_VERSION,
+               'generation': self.generation,
+               'options': self.options,
+               'vips': self.vips,
+               'shared': self.shared}
+        directory = os.path.dirname(self.path) or '.'
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        with os.fdopen(fd, 'w') as file:
+            json.dump(doc, file, indent=2, sort_keys=True)
+        os.rename(tmp, self.path)
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+
+def _digest(*values):
+    return hashlib.sha1(json.dumps(values, sort_keys=True)).hexdigest()
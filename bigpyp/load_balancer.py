@@ -17,29 +17,125 @@
 """Load Balancer.
 
 Usage:
-  load_balancer.py zone <name>
+  load_balancer.py zone <name> [options]
+  load_balancer.py apply (--all | <name>...) [options]
+  load_balancer.py snapshot <file> [options]
+  load_balancer.py plan <name> <file> [options]
+  load_balancer.py watch <name> [options]
+  load_balancer.py report pools <name> [options]
+  load_balancer.py sample <name> <file> [options]
 
 Options:
-  -h --help     Show this screen
-  --version     Show version
+  -h --help            Show this screen
+  --version            Show version
+  --host=<host>        Device to configure a single zone on
+                       [default: 192.168.112.62]
+  --devices=<file>     YAML file mapping each zone to its device hosts
+                       [default: ../conf/devices.yml]
+  --all                Apply every zone with a catalog in ../conf
+  --workers=<n>        Apply up to <n> zone/device pairs at once
+                       [default: 4]
+  --log-dir=<dir>      Write one log per zone/device pair into <dir>
+                       [default: logs]
+  --metrics-dir=<dir>  Write the iControl call metrics of each zone/device
+                       pair into <dir>, as JSON and Prometheus text
+  --batch-size=<n>     Send up to <n> objects per iControl call [default: 1]
+  --concurrency=<n>    Run up to <n> independent stages at once [default: 1]
+  --read-concurrency=<n>
+                       Send up to <n> read calls to a device at once, and
+                       split bulk reads into chunks sent together
+                       [default: 1]
+  --prune-members      Remove pool members missing from the catalog
+  --drain=<seconds>    Disable pruned members, and wait <seconds> before
+                       removing them [default: 0]
+  --wsdl-cache=<dir>   Cache the device's WSDLs in <dir>
+                       [default: ~/.bigpyp/wsdl]
+  --no-wsdl-cache      Fetch the device's WSDLs on every run
+  --refresh-wsdl       Fetch the device's WSDLs into the cache again
+  --no-keepalive       Open a new connection for every iControl call
+  --gzip               Compress iControl request and response bodies
+  --no-verify-ssl      Skip verification of the device's certificate
+  --proto=<proto>      Scheme of the device's iControl portal [default: https]
+  --stages=<stages>    Comma separated stages to run, out of cert, profile,
+                       system, rule, monitor, pool and virtual_server.
+                       Runs every stage when omitted
+  --catalog-cache=<dir>
+                       Cache parsed VIP catalogs in <dir>
+                       [default: ~/.bigpyp/catalog]
+  --no-catalog-cache   Parse the VIP catalog on every run
+  --ledger-dir=<dir>   Remember what each run applied to a device in <dir>,
+                       and apply only what changed since.  Any change to
+                       the device, including by a run of another zone,
+                       makes the next run apply everything.  Off unless
+                       given, but for watch, which defaults to
+                       ~/.bigpyp/ledger
+  --full               Apply every VIP, whatever the ledger says
+  --max-inflight=<n>   Adapt the calls in flight to a device, up to <n>,
+                       to its latency and errors, and retry reads it is
+                       too busy to answer
+  --cluster            Apply once per HA device group, on its active
+                       device, then sync the configuration to its peers
+  --transaction=<scope>
+                       Commit the writes of each 'stage', or of the whole
+                       'run', as one iControl transaction, rolled back
+                       when it fails
+  --fast-path=<methods>
+                       Call read methods over a raw SOAP fast path, 'all'
+                       or comma separated names such as
+                       LocalLB.Pool.get_member_v2
+  --json               Print the plan or report as JSON
+  --interval=<seconds> Seconds between the checks of watch, or the samples
+                       of sample [default: 10]
+  --keep=<n>           Samples of each virtual server sample keeps, the
+                       oldest overwritten [default: 1440]
+  --bulk-load          Create missing objects by loading one configuration
+                       file, then verify them and run the stages for the
+                       rest
 """
 
+import collections
+import glob
+import json
 import logging
 import os
-import yaml
+import ssl
+import sys
+import threading
 
 import pycontrol.pycontrol as pc
 
 from docopt import docopt
 from pbr import version
+from suds import WebFault
+from suds import cache as suds_cache
 
+import catalog
 import cert
+import cluster
+import fastpath
+import fleet
+import lazy
+import ledger
+import metrics
 import monitor
+import parallel
+import plan
 import pool
 import profile
+import report
 import rule
+import sampler
+import scf
+import scheduler
+import state
 import system
+import throttle
+import transaction
+import transport
+import utils
 import virtual_server
+import watch
+import wsdl_cache
 
 
 class LoadBalancer(object):
@@ -66,6 +162,7 @@ class BigIP(LoadBalancer):
     DEFAULT_USER = "admin"
     DEFAULT_PASS = "admin"
     DEFAULT_HOST = "localhost"
+    DEFAULT_PROTO = "https"
     DEFAULT_LOGGING = False
     WSDL_LIST = ['LocalLB.Monitor',
                  'LocalLB.Pool',
@@ -74,8 +171,13 @@ class BigIP(LoadBalancer):
                  'LocalLB.ProfileTCP',
                  'LocalLB.Rule',
                  'LocalLB.VirtualServer',
+                 'Management.DBVariable',
+                 'Management.Device',
+                 'Management.DeviceGroup',
                  'Management.KeyCertificate',
+                 'System.ConfigSync',
                  'System.Inet',
+                 'System.Session',
                  'System.SystemInfo']
 
     def __init__(self, **kwargs):
@@ -85,48 +187,719 @@ class BigIP(LoadBalancer):
         :param kwargs['username']: A string containing the username to use.
         :param kwargs['password']: A string containing the password to use.
         :param kwargs['host']: A string containing host to connect.
+        :param kwargs['proto']: A string containing the scheme of the host's
+                                management interface.  WSDLs are only
+                                fetched over it through the WSDL cache.
         :param kwargs['debug']: A boolean toggling suds client logging.
+        :param kwargs['wsdl_cache']: A string containing a directory to cache
+                                     the device's WSDLs in, or None to
+                                     fetch them from `host` every time.
+        :param kwargs['wsdl_max_age']: An int of days before cached WSDLs
+                                       are fetched again.
+        :param kwargs['refresh_wsdl']: A boolean forcing cached WSDLs to be
+                                       fetched again.
+        :param kwargs['keepalive']: A boolean toggling the pooled keep-alive
+                                    transport for iControl calls.
+        :param kwargs['pool_size']: An int of the most idle connections the
+                                    keep-alive transport keeps open.
+        :param kwargs['gzip']: A boolean toggling gzip of request and
+                               response bodies on the keep-alive transport.
+        :param kwargs['verify_ssl']: A boolean toggling verification of the
+                                     device's certificate on the keep-alive
+                                     transport.
+        :param kwargs['metrics']: A Metrics object recording every iControl
+                                  call, or None.
+        :param kwargs['fast_path']: A list of '<wsdl>.<method>' read methods
+                                    to call over the raw SOAP fast path.
+        :param kwargs['max_inflight']: An int of the most calls in flight to
+                                       the device, adapted to its load, or
+                                       None to send calls unthrottled.
         :returns: None
         """
         if kwargs.get('debug', self.DEFAULT_LOGGING):
             logging.basicConfig(level=logging.INFO)
             logging.getLogger('suds.client').setLevel(logging.DEBUG)
-        username = kwargs.get('username', self.DEFAULT_USER)
-        password = kwargs.get('password', self.DEFAULT_PASS)
-        host = kwargs.get('host', self.DEFAULT_HOST)
-        self.pc = self._get_pc(username, password, host)
+        self._kwargs = kwargs
+        self._username = kwargs.get('username', self.DEFAULT_USER)
+        self._password = kwargs.get('password', self.DEFAULT_PASS)
+        self.host = kwargs.get('host', self.DEFAULT_HOST)
+        self.proto = kwargs.get('proto', self.DEFAULT_PROTO)
+        self._wsdl_cache = None
+        self._wsdl_version = None
+        self._refresh_wsdl = kwargs.get('refresh_wsdl', False)
+        self._lock = threading.Lock()
+        self._session = None
+        self._clients = []
+        self._clients_lock = threading.Lock()
+        directory = kwargs.get('wsdl_cache')
+        if directory:
+            max_age = kwargs.get('wsdl_max_age',
+                                 wsdl_cache.WsdlCache.DEFAULT_MAX_AGE)
+            self._wsdl_cache = wsdl_cache.WsdlCache(self.host,
+                                                    directory,
+                                                    max_age,
+                                                    self.proto)
+        self.transport = None
+        if kwargs.get('keepalive', True):
+            self.transport = self._keepalive_transport()
+        self.fastpath = None
+        if kwargs.get('fast_path'):
+            self.fastpath = fastpath.FastPath(
+                self.transport or self._keepalive_transport(),
+                self.host,
+                self.proto,
+                kwargs['fast_path'],
+                self._session_headers)
+        self.metrics = kwargs.get('metrics')
+        self.throttle = None
+        if kwargs.get('max_inflight'):
+            limiter = throttle.device_limiter(self.host,
+                                              kwargs['max_inflight'],
+                                              self.metrics)
+            self.throttle = throttle.Throttle(limiter)
+        wrap = None
+        if self.metrics or self.fastpath or self.throttle:
+            wrap = self._wrap
+        self.pc = lazy.LazyBIGIP(self.WSDL_LIST, self._load_interface, wrap)
 
-    def _get_pc(self, username, password, host, fromurl=True):
+    def clone(self):
+        """
+        Create and return a BigIP for the same device and options, with its
+        own iControl clients.
+
+        :returns: BigIP
+        """
+        b = BigIP(**self._kwargs)
+        if self._wsdl_cache is not None:
+            # Settle the cache's version once, rather than in clones
+            # racing to fill it.
+            b._wsdl_version = self._get_wsdl_version()
+        b.set_session(self._session)
+        return b
+
+    def for_host(self, host):
+        """
+        Create and return a BigIP for another device, with the same
+        options.
+
+        :param host: A string containing the host to connect.
+        :returns: BigIP
+        """
+        return BigIP(**dict(self._kwargs, host=host))
+
+    def set_session(self, session_id):
+        """
+        Send every later call in an iControl session, e.g. to take part in
+        its transaction.
+
+        :param session_id: A session identifier from
+                           `System.Session.get_session_identifier`, or None
+                           to stop sending one.
+        :returns: None
+        """
+        with self._clients_lock:
+            self._session = session_id
+            clients = list(self._clients)
+        for client in clients:
+            client.set_options(headers=self._session_headers())
+
+    def _session_headers(self):
+        if self._session is None:
+            return {}
+        return {'X-iControl-Session': str(self._session)}
+
+    def _keepalive_transport(self):
+        context = None
+        if not self._kwargs.get('verify_ssl', True):
+            context = ssl._create_unverified_context()
+        t = transport.KeepAliveTransport
+        return t(self._username, self._password,
+                 pool_size=self._kwargs.get('pool_size', t.DEFAULT_POOL_SIZE),
+                 compress=self._kwargs.get('gzip', False),
+                 context=context)
+
+    def _wsdl_transport(self):
+        # WSDLs are fetched like the calls: over the shared connections,
+        # with the same certificate verification.
+        if self.transport:
+            return self.transport.share()
+        return self._keepalive_transport()
+
+    def _wrap(self, wsdl, name, method):
+        if self.fastpath and self.fastpath.enabled(wsdl, name):
+            method = self.fastpath.wrap(wsdl, name, method)
+        if self.throttle:
+            method = self.throttle.wrap(wsdl, name, method)
+        if self.metrics:
+            method = self.metrics.wrap(wsdl, name, method)
+        return method
+
+    def _get_pc(self, wsdls, fromurl=True, directory=None, cache=None):
         """
         Create and return an instance of the BigIP object.
 
-        :param username: A string containing the username to use.
-        :param password: A string containing the password to use.
-        :param host: A string containing host to connect.
+        :param wsdls: A list of WSDL names to load.
         :param fromurl: A boolean to determine if the WSDL should
                         be fetched from the `host`.
+        :param directory: A string containing the directory to read the
+                          WSDL from when `fromurl` is False.
+        :param cache: A suds cache for the parsed WSDL.
+        :returns: BigIP
+        """
+        b = pc.BIGIP(username=self._username,
+                     password=self._password,
+                     hostname=self.host,
+                     proto=self.proto,
+                     fromurl=fromurl,
+                     directory=directory,
+                     cache=cache,
+                     wsdls=wsdls)
+        for client in b.clients:
+            if self.transport:
+                client.set_options(transport=self.transport.share())
+            if self.metrics:
+                client.set_options(plugins=[self.metrics.plugin])
+        with self._clients_lock:
+            self._clients.extend(b.clients)
+            headers = self._session_headers()
+        for client in b.clients:
+            client.set_options(headers=headers)
+        return b
+
+    def _load_interface(self, wsdl):
+        """
+        Create and return an instance of the BigIP object holding only the
+        interface of `wsdl`, read from the WSDL cache when one is in use.
+
+        :param wsdl: A string containing the WSDL name, e.g. 'LocalLB.Pool'.
         :returns: BigIP
         """
-        return pc.BIGIP(username=username,
-                        password=password,
-                        hostname=host,
-                        fromurl=fromurl,
-                        wsdls=self.WSDL_LIST)
+        cache = self._wsdl_cache
+        if cache is None:
+            return self._get_pc([wsdl])
+        version = self._get_wsdl_version()
+        path = cache.path(version)
+        if not cache.is_fresh(version, [wsdl]):
+            cache.download(wsdl, path, self._wsdl_transport())
+        return self._get_pc([wsdl],
+                            fromurl=False,
+                            directory=path,
+                            cache=cache.suds_cache(version))
+
+    def _get_wsdl_version(self):
+        """
+        Return the device version the WSDL cache holds WSDLs for.  On first
+        use the cache is trusted when the device still reports the version
+        it was filled from, and started again under the device's current
+        version otherwise.
+
+        :returns: string
+        """
+        with self._lock:
+            if self._wsdl_version is None:
+                self._wsdl_version = self._validate_wsdl_cache()
+            return self._wsdl_version
+
+    def _validate_wsdl_cache(self):
+        cache = self._wsdl_cache
+        wsdl = 'System.SystemInfo'
+        version = cache.version()
+        fresh = version and cache.is_fresh(version, [wsdl])
+        if fresh and not self._refresh_wsdl:
+            b = self._get_pc([wsdl],
+                             fromurl=False,
+                             directory=cache.path(version),
+                             cache=cache.suds_cache(version))
+            if self._get_version(b) == version:
+                return version
+
+        staging = cache.stage()
+        cache.download(wsdl, staging, self._wsdl_transport())
+        b = self._get_pc([wsdl],
+                         fromurl=False,
+                         directory=staging,
+                         cache=suds_cache.NoCache())
+        version = self._get_version(b)
+        cache.commit(staging, version, replace=self._refresh_wsdl)
+        return version
+
+    def _get_version(self, b):
+        return b.System.SystemInfo.get_version()
+
+
+CONF_DIR = os.path.join('..', 'conf')
+STAGES = collections.OrderedDict([
+    ('cert', lambda b, p, n: cert.Cert(b, p)),
+    ('profile', lambda b, p, n: profile.Profile(b, p, n)),
+    ('system', lambda b, p, n: system.System(b)),
+    ('rule', lambda b, p, n: rule.Rule(b, p)),
+    ('monitor', lambda b, p, n: monitor.Monitor(b)),
+    ('pool', lambda b, p, n: pool.Pool(b, p, n)),
+    ('virtual_server', lambda b, p, n: virtual_server.VirtualServer(b, p, n)),
+])
+
+
+def parse_stages(value):
+    """
+    Return the stage names of a comma separated `value`, in apply order.
+
+    :param value: A string such as 'pool,virtual_server', or None for every
+                  stage.
+    :returns: list
+    """
+    if not value:
+        return STAGES.keys()
+    names = [s.strip() for s in value.split(',')]
+    unknown = set(names) - set(STAGES)
+    if unknown:
+        msg = 'unknown stage(s): {0}'.format(', '.join(sorted(unknown)))
+        raise ValueError(msg)
+    return [s for s in STAGES if s in names]
+
+
+def vips_file(name):
+    """
+    Return the VIP catalog of zone `name`, a `<name>_vips.d` directory of
+    fragments when there is one, otherwise `<name>_vips.yml`.
+
+    :param name: A string containing the zone name.
+    :returns: string
+    """
+    directory = os.path.join(CONF_DIR, '{0}_vips.d'.format(name))
+    if os.path.isdir(directory):
+        return directory
+    return os.path.join(CONF_DIR, '{0}_vips.yml'.format(name))
+
+
+def zone_names():
+    """
+    Return the name of every zone with a VIP catalog in `CONF_DIR`.
+
+    :returns: list
+    """
+    names = set()
+    for suffix in ('_vips.yml', '_vips.d'):
+        files = glob.glob(os.path.join(CONF_DIR, '*' + suffix))
+        names.update(os.path.basename(f)[:-len(suffix)] for f in files)
+    return sorted(names)
+
+
+def load_vips(name, cache_dir=None):
+    """
+    Load and return the VIP catalog of zone `name`.
+
+    :param name: A string containing the zone name.
+    :param cache_dir: A string containing the catalog cache directory, or
+                      None to parse the catalog every time.
+    :returns: VipCatalog
+    """
+    return catalog.VipCatalog(catalog.load(vips_file(name), cache_dir))
+
+
+def apply_zone(bigip, vips, stages, batch_size=1, concurrency=1,
+               prune_members=False, drain=0, ledger=None, read_concurrency=1,
+               transaction_scope=None, bulk_load=False):
+    """
+    Configure a device from a VIP catalog.
+
+    :param bigip: An instance of the BigIP object.
+    :param vips: An instance of the VipCatalog object.
+    :param stages: A list of stage names, in apply order.
+    :param batch_size: An int of the most objects sent per iControl call.
+    :param concurrency: An int of the most independent stages run at once,
+                        each with its own iControl clients.
+    :param prune_members: A boolean toggling removal of pool members missing
+                          from the catalog.
+    :param drain: An int of seconds pruned members are disabled for before
+                  they are removed.
+    :param ledger: A Ledger object of the earlier runs on the device, to
+                   apply only what changed since, or None to apply
+                   everything.
+    :param read_concurrency: An int of the most calls in flight while
+                             reading the device's state.
+    :param transaction_scope: A string, 'stage' to commit the writes of
+                              each stage in its own transaction, 'run' to
+                              commit every stage's in one, or None to
+                              commit each write on its own.
+    :param bulk_load: A boolean toggling creation of the missing objects by
+                      loading one configuration file, rather than by the
+                      calls of each stage.
+    :returns: None
+    :raises: PrerequisiteError when the stages reference objects the
+             device lacks, and that only stages left out would create;
+             LoadError when the device lacks objects the file created
+    """
+    if ledger is not None:
+        options = {'prune_members': prune_members, 'drain': drain}
+        changed, stages = ledger.changes(bigip, vips, stages, options)
+        # A pool shared by several VIPs is planned from all of them, or
+        # it would lose the members of those that did not change.
+        pools = set(vip.pool for vip in changed)
+        vips = vips.subset([vip for vip in vips
+                            if vip in changed or vip.pool in pools])
+        if not stages:
+            utils.print_yellow('Nothing changed since the last run')
+    client = None
+    if read_concurrency > 1:
+        client = parallel.AsyncBIGIP(bigip, read_concurrency)
+
+    def new_plan():
+        return plan.Plan(state.DeviceState(bigip, client=client), vips,
+                         prune_members, drain)
+    p = new_plan()
+    missing = p.missing(plan_stages(stages))
+    if missing:
+        raise plan.PrerequisiteError(missing)
+
+    def run_stage(b, stage):
+        with metrics.stage(stage):
+            excluded = stage in transaction.EXCLUDED_STAGES
+            if transaction_scope == 'stage' and not excluded:
+                with transaction.Transaction(b):
+                    STAGES[stage](b, p, batch_size).create()
+            else:
+                STAGES[stage](b, p, batch_size).create()
+
+    def run_stages(names):
+        if concurrency > 1:
+            scheduler.Scheduler(names, concurrency).run(
+                lambda stage: run_stage(bigip.clone(), stage))
+        else:
+            for stage in names:
+                run_stage(bigip, stage)
+
+    try:
+        remaining = stages
+        if bulk_load and stages:
+            # SSL profiles name keys and certificates, which are imported
+            # before the file loads.
+            remaining = [s for s in stages if s != 'cert']
+            run_stages([s for s in stages if s == 'cert'])
+            with metrics.stage('bulk_load'):
+                applied = scf.load(bigip, p, plan_stages(remaining))
+                # The stages left over read the device as loaded.
+                p = new_plan()
+                scf.verify(p, applied)
+        if transaction_scope == 'run':
+            excluded = [s for s in remaining
+                        if s in transaction.EXCLUDED_STAGES]
+            included = [s for s in remaining if s not in excluded]
+            run_stages(excluded)
+            if included:
+                print 'Transaction'
+                with transaction.Transaction(bigip):
+                    run_stages(included)
+        else:
+            run_stages(remaining)
+    finally:
+        if client:
+            client.close()
+    if ledger is not None:
+        ledger.commit(bigip, stages)
+
+
+def cluster_bigip(bigip):
+    """
+    Return the device to apply to in place of `bigip`: the active device
+    of its sync-failover device group.
+
+    :param bigip: An instance of the BigIP object.
+    :returns: (BigIP, string) of the device and its device group, or
+              (`bigip`, None) when it is not in one
+    :raises: SyncError when no device of the group is active
+    """
+    c = cluster.discover(bigip)
+    if c is None:
+        return bigip, None
+    active = c.active
+    if active is None:
+        raise cluster.SyncError('no active device in {0}'.format(c.group))
+    if active.address == bigip.host:
+        return bigip, c.group
+    msg = 'Applying on {0}, the active device of {1}'.format(
+        active.address, c.group)
+    utils.print_yellow(msg)
+    return bigip.for_host(active.address), c.group
+
+
+def plan_stages(stages):
+    """
+    Return the Plan stages behind a list of apply stages.  System and
+    Monitor only report on the device, so they have no plan.
+
+    :param stages: A list of stage names, in apply order.
+    :returns: list
+    """
+    names = []
+    for stage in stages:
+        if stage == 'profile':
+            names.extend(['http_profile', 'ssl_profile', 'tcp_profile'])
+        elif stage in plan.Plan.STAGES:
+            names.append(stage)
+    return names
+
+
+def print_plan(actions, as_json=False):
+    """
+    Print the actions left to apply, grouped by stage.
+
+    :param actions: A list of Action objects.
+    :param as_json: A boolean to print a JSON list instead.
+    :returns: None
+    """
+    pending = [a for a in actions if not a.skip]
+    if as_json:
+        print json.dumps([a._asdict() for a in pending], indent=2,
+                         separators=(',', ': '), sort_keys=True)
+        return
+    stage = None
+    for action in pending:
+        if action.stage != stage:
+            stage = action.stage
+            print stage
+        utils.print_green('  - {0} {1}'.format(action.op, action.name))
+    msg = '{0} action(s), {1} already in place'.format(
+        len(pending), len(actions) - len(pending))
+    print msg
+
+
+def write_metrics(m, directory):
+    """
+    Write the metrics of one zone/device pair into `directory`, as
+    `<zone>-<host>.json` and `<zone>-<host>.prom`.
+
+    :param m: A Metrics object labelled with zone and host.
+    :param directory: A string containing the destination directory.
+    :returns: None
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    m.write(os.path.join(directory, '{zone}-{host}'.format(**m.labels)))
+
+
+def catalog_cache(args):
+    """
+    Return the catalog cache directory selected on the command line.
+
+    :param args: A dict of parsed docopt arguments.
+    :returns: string, or None when caching is off
+    """
+    if args['--no-catalog-cache']:
+        return None
+    return os.path.expanduser(args['--catalog-cache'])
+
+
+def parse_fast_path(value):
+    """
+    Return the fast path methods of a comma separated `value`.
+
+    :param value: A string such as 'LocalLB.Pool.get_list', 'all', or None
+                  for no fast path.
+    :returns: list
+    """
+    if not value:
+        return []
+    if value == 'all':
+        return sorted(fastpath.METHODS)
+    names = [m.strip() for m in value.split(',')]
+    unknown = set(names) - set(fastpath.METHODS)
+    if unknown:
+        msg = 'no fast path for: {0}'.format(', '.join(sorted(unknown)))
+        raise ValueError(msg)
+    return names
+
+
+def load_ledger(directory, zone, host, full=False):
+    """
+    Load and return the ledger of zone `zone` on device `host`.
+
+    :param directory: A string containing the ledger directory, or None
+                      to apply everything without a ledger.
+    :param zone: A string containing the zone name.
+    :param host: A string containing the device host.
+    :param full: A boolean forgetting the earlier runs, so everything is
+                 applied again.
+    :returns: Ledger, or None without a directory
+    """
+    if not directory:
+        return None
+    result = ledger.Ledger.for_device(os.path.expanduser(directory), zone,
+                                      host)
+    if full:
+        result.reset()
+    return result
+
+
+def parse_transaction(value, drain=0):
+    """
+    Return the transaction scope selected on the command line.
+
+    :param value: A string, 'stage', 'run', or None.
+    :param drain: An int of seconds pruned members drain for.  Members
+                  disabled in a transaction only stop taking connections
+                  once it commits, so the two do not mix.
+    :returns: string, or None
+    :raises: ValueError on an unknown scope, or one combined with drain
+    """
+    if value is None:
+        return None
+    if value not in transaction.MODES:
+        msg = 'unknown transaction scope {0}, not one of {1}'.format(
+            value, ', '.join(transaction.MODES))
+        raise ValueError(msg)
+    if drain:
+        raise ValueError('--drain cannot be used with --transaction')
+    return value
+
+
+def bigip_options(args):
+    """
+    Return the BigIP keyword arguments selected on the command line.
+
+    :param args: A dict of parsed docopt arguments.
+    :returns: dict
+    """
+    cache_dir = os.path.expanduser(args['--wsdl-cache'])
+    return {'password': os.environ['PASS'],
+            'wsdl_cache': None if args['--no-wsdl-cache'] else cache_dir,
+            'refresh_wsdl': args['--refresh-wsdl'],
+            'keepalive': not args['--no-keepalive'],
+            'gzip': args['--gzip'],
+            'verify_ssl': not args['--no-verify-ssl'],
+            'proto': args['--proto'],
+            'fast_path': parse_fast_path(args['--fast-path']),
+            'max_inflight': int(args['--max-inflight'] or 0) or None}
 
 
 if __name__ == '__main__':
     version = 'Load Balancer {0}'.format(version.VersionInfo('bigpyp'))
     args = docopt(__doc__, version=version)
+    try:
+        stages = parse_stages(args['--stages'])
+        parse_fast_path(args['--fast-path'])
+        transaction_scope = parse_transaction(args['--transaction'],
+                                              int(args['--drain']))
+    except ValueError as e:
+        sys.exit(str(e))
+    batch_size = int(args['--batch-size'])
+    concurrency = int(args['--concurrency'])
+    read_concurrency = int(args['--read-concurrency'])
+    prune_members = args['--prune-members']
+    drain = int(args['--drain'])
+
+    if args['apply']:
+        names = zone_names() if args['--all'] else args['<name>']
+        options = {'bigip': bigip_options(args),
+                   'stages': stages,
+                   'batch_size': batch_size,
+                   'concurrency': concurrency,
+                   'read_concurrency': read_concurrency,
+                   'transaction': transaction_scope,
+                   'bulk_load': args['--bulk-load'],
+                   'prune_members': prune_members,
+                   'drain': drain,
+                   'catalog_cache': catalog_cache(args),
+                   'ledger_dir': args['--ledger-dir'],
+                   'full': args['--full'],
+                   'log_dir': args['--log-dir'],
+                   'metrics_dir': args['--metrics-dir']}
+        devices = fleet.load_devices(args['--devices'])
+        try:
+            jobs = fleet.zone_jobs(names, devices)
+        except KeyError as e:
+            sys.exit('no devices configured for zone {0}'.format(e))
+        if args['--cluster']:
+            jobs = fleet.cluster_jobs(jobs, options['bigip'])
+        results = fleet.apply(jobs, options, int(args['--workers']))
+        fleet.print_summary(results)
+        sys.exit(0 if all(r.ok for r in results) else 1)
+
+    if args['plan']:
+        p = plan.Plan(state.DeviceState.from_file(args['<file>']),
+                      load_vips(args['<name>'][0], catalog_cache(args)),
+                      prune_members, drain)
+        print_plan(p.actions(plan_stages(stages)), args['--json'])
+        sys.exit(0)
+
+    if args['report']:
+        b = BigIP(host=args['--host'], **bigip_options(args))
+        rows, missing = report.pool_report(
+            b, load_vips(args['<name>'][0], catalog_cache(args)))
+        report.print_report(rows, missing, args['--json'])
+        sys.exit(0)
+
+    if args['sample']:
+        b = BigIP(host=args['--host'], **bigip_options(args))
+        names, missing = sampler.virtual_servers(
+            b, load_vips(args['<name>'][0], catalog_cache(args)))
+        for name in missing:
+            utils.print_yellow('{0} is not on the device'.format(name))
+        if not names:
+            sys.exit('no virtual servers to sample')
+        s = sampler.Sampler(b, names, int(args['--keep']))
+        try:
+            s.run(args['<file>'], int(args['--interval']))
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    if args['snapshot']:
+        b = BigIP(host=args['--host'], **bigip_options(args))
+        client = None
+        if read_concurrency > 1:
+            client = parallel.AsyncBIGIP(b, read_concurrency)
+        try:
+            state.DeviceState(b, client=client).save(args['<file>'],
+                                                     host=args['--host'])
+        finally:
+            if client:
+                client.close()
+        sys.exit(0)
+
+    name = args['<name>'][0]
+    m = None
+    if args['--metrics-dir']:
+        m = metrics.Metrics({'zone': name, 'host': args['--host']})
+    b = BigIP(host=args['--host'], metrics=m, **bigip_options(args))
+    group = None
+    if args['--cluster']:
+        try:
+            b, group = cluster_bigip(b)
+        except cluster.SyncError as e:
+            sys.exit(str(e))
+        if m:
+            m.labels['host'] = b.host
+    ledger_dir = args['--ledger-dir']
+    if args['watch'] and not ledger_dir:
+        # watch applies catalog changes through the ledger.
+        ledger_dir = ledger.Ledger.DEFAULT_DIRECTORY
+    zone_ledger = load_ledger(ledger_dir, name, b.host, args['--full'])
+
+    def load():
+        return load_vips(name, catalog_cache(args))
+
+    def apply(vips, names, zone_ledger):
+        apply_zone(b, vips, names, batch_size, concurrency, prune_members,
+                   drain, zone_ledger, read_concurrency, transaction_scope,
+                   args['--bulk-load'])
+        if group:
+            cluster.sync(b, group)
 
-    f = '../conf/{0}_vips.yml'.format(args['<name>'])
-    with open(f, 'r') as file:
-        vips_dict = yaml.load(file)
-        b = BigIP(host='192.168.112.62', password=os.environ['PASS'])
-
-        cert.Cert(b, vips_dict).create()
-        profile.Profile(b, vips_dict).create()
-        system.System(b).create()
-        rule.Rule(b).create()
-        monitor.Monitor(b).create()
-        pool.Pool(b, vips_dict).create()
-        virtual_server.VirtualServer(b, vips_dict).create()
+    try:
+        if args['watch']:
+            watcher = watch.Watcher(b, vips_file(name), stages, load, apply,
+                                    zone_ledger, int(args['--interval']))
+            try:
+                watcher.run()
+            except KeyboardInterrupt:
+                pass
+        else:
+            apply(load(), stages, zone_ledger)
+    except (scheduler.StageError, cluster.SyncError, scf.LoadError,
+            plan.PrerequisiteError) as e:
+        sys.exit(str(e))
+    except WebFault as e:
+        sys.exit(e.fault.faultstring)
+    finally:
+        if m:
+            write_metrics(m, args['--metrics-dir'])
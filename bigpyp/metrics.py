@@ -0,0 +1,311 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import bisect
+import collections
+import contextlib
+import json
+import threading
+import time
+
+from suds import plugin
+
+# Upper bounds, in seconds, of the call latency histogram buckets.
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+NO_STAGE = '-'
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Attribute the iControl calls made by this thread to stage `name`.
+
+    :param name: A string containing the stage name.
+    """
+    previous = getattr(_local, 'stage', NO_STAGE)
+    _local.stage = name
+    try:
+        yield
+    finally:
+        _local.stage = previous
+
+
+def current_stage():
+    return getattr(_local, 'stage', NO_STAGE)
+
+
+def add_payload(request_bytes=0, response_bytes=0):
+    """
+    Count payload bytes towards the call in progress on this thread.
+
+    :param request_bytes: An int of bytes sent.
+    :param response_bytes: An int of bytes received.
+    :returns: None
+    """
+    sizes = getattr(_local, 'sizes', None)
+    if sizes is not None:
+        sizes[0] += request_bytes
+        sizes[1] += response_bytes
+
+
+class Histogram(object):
+    """
+    A latency histogram over `BUCKETS`, with one more bucket for anything
+    slower.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        """
+        Return (upper bound, count of observations at or below it) pairs,
+        ending with '+Inf'.
+
+        :returns: list
+        """
+        result = []
+        total = 0
+        for le, count in zip(BUCKETS + ['+Inf'], self.counts):
+            total += count
+            result.append((le, total))
+        return result
+
+
+class Series(object):
+    """
+    What was recorded for one method in one stage.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.seconds = Histogram()
+
+
+class PayloadPlugin(plugin.MessagePlugin):
+    """
+    A suds plugin noting the size of the SOAP envelopes of the call in
+    progress on this thread.
+    """
+
+    def sending(self, context):
+        add_payload(request_bytes=len(context.envelope))
+
+    def received(self, context):
+        add_payload(response_bytes=len(context.reply))
+
+
+class Metrics(object):
+    """
+    Call counts, latency histograms and payload sizes of every iControl
+    method, per stage.  One Metrics is shared by the BigIP objects of a
+    run, and exported as JSON or Prometheus text at its end.
+    """
+
+    PREFIX = 'bigpyp_icontrol'
+    # The help text of each gauge in the Prometheus export.
+    GAUGES = {'concurrency_limit': 'iControl calls allowed in flight to the '
+                                   'device.'}
+
+    def __init__(self, labels=None):
+        """
+        Construct a Metrics with the supplied args.
+
+        :param labels: A dict of labels added to every exported sample,
+                       e.g. zone and host.
+        :returns: None
+        """
+        self.labels = dict(labels or {})
+        self.plugin = PayloadPlugin()
+        self._series = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, wsdl, name, method):
+        """
+        Return `method` recording each call under `<wsdl>.<name>`.
+
+        :param wsdl: A string containing the interface, e.g. 'LocalLB.Pool'.
+        :param name: A string containing the method name.
+        :param method: The callable to record.
+        :returns: callable
+        """
+        key = '{0}.{1}'.format(wsdl, name)
+
+        def call(*args, **kwargs):
+            sizes = _local.sizes = [0, 0]
+            start = time.time()
+            ok = False
+            try:
+                result = method(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                _local.sizes = None
+                self.record(key, time.time() - start, sizes[0], sizes[1], ok)
+        return call
+
+    def record(self, method, seconds, request_bytes=0, response_bytes=0,
+               ok=True, stage=None):
+        """
+        Record one call.
+
+        :param method: A string such as 'LocalLB.Pool.get_list'.
+        :param seconds: A float of seconds the call took.
+        :param request_bytes: An int of bytes sent.
+        :param response_bytes: An int of bytes received.
+        :param ok: A boolean, False when the call raised.
+        :param stage: A string containing the stage, defaults to the one
+                      of the calling thread.
+        :returns: None
+        """
+        key = (method, stage or current_stage())
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Series()
+            series.calls += 1
+            series.errors += 0 if ok else 1
+            series.request_bytes += request_bytes
+            series.response_bytes += response_bytes
+            series.seconds.observe(seconds)
+
+    def set_gauge(self, name, value, **labels):
+        """
+        Set a gauge, exported next to the call metrics.
+
+        :param name: A string containing the gauge name, e.g.
+                     'concurrency_limit'.
+        :param value: A number.
+        :param labels: Extra labels of the gauge.
+        :returns: None
+        """
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def to_dict(self):
+        """
+        Return every series as plain data, slowest method first.
+
+        :returns: dict
+        """
+        with self._lock:
+            items = sorted(self._series.items(),
+                           key=lambda i: (-i[1].seconds.sum, i[0]))
+            methods = [{'method': method,
+                        'stage': stage,
+                        'calls': s.calls,
+                        'errors': s.errors,
+                        'request_bytes': s.request_bytes,
+                        'response_bytes': s.response_bytes,
+                        'seconds': {
+                            'sum': s.seconds.sum,
+                            'buckets': [[str(le), n] for le, n
+                                        in s.seconds.cumulative()]}}
+                       for (method, stage), s in items]
+            gauges = [{'name': name, 'labels': dict(labels), 'value': value}
+                      for (name, labels), value
+                      in sorted(self._gauges.items())]
+        return {'labels': self.labels, 'methods': methods, 'gauges': gauges}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, separators=(',', ': '),
+                          sort_keys=True)
+
+    def to_prometheus(self):
+        """
+        Return every series in the Prometheus text exposition format.
+
+        :returns: string
+        """
+        data = self.to_dict()
+        p = self.PREFIX
+        lines = []
+        families = [
+            ('calls_total', 'counter', 'iControl calls made.', 'calls'),
+            ('errors_total', 'counter', 'iControl calls that raised.',
+             'errors'),
+            ('request_bytes_total', 'counter',
+             'SOAP request bytes sent.', 'request_bytes'),
+            ('response_bytes_total', 'counter',
+             'SOAP response bytes received.', 'response_bytes')]
+        for name, kind, doc, field in families:
+            lines.append('# HELP {0}_{1} {2}'.format(p, name, doc))
+            lines.append('# TYPE {0}_{1} {2}'.format(p, name, kind))
+            for m in data['methods']:
+                lines.append('{0}_{1}{2} {3}'.format(
+                    p, name, self._labels(m), m[field]))
+
+        name = '{0}_call_seconds'.format(p)
+        lines.append('# HELP {0} iControl call latency.'.format(name))
+        lines.append('# TYPE {0} histogram'.format(name))
+        for m in data['methods']:
+            for le, count in m['seconds']['buckets']:
+                lines.append('{0}_bucket{1} {2}'.format(
+                    name, self._labels(m, le=le), count))
+            lines.append('{0}_sum{1} {2!r}'.format(name, self._labels(m),
+                                                   m['seconds']['sum']))
+            lines.append('{0}_count{1} {2}'.format(name, self._labels(m),
+                                                   m['calls']))
+
+        # Each metric gets one HELP and TYPE line, before all of its
+        # samples.
+        gauges = collections.OrderedDict()
+        for g in data['gauges']:
+            gauges.setdefault(g['name'], []).append(g)
+        for gauge, samples in gauges.iteritems():
+            name = '{0}_{1}'.format(p, gauge)
+            doc = self.GAUGES.get(gauge, '{0} gauge.'.format(gauge))
+            lines.append('# HELP {0} {1}'.format(name, doc))
+            lines.append('# TYPE {0} gauge'.format(name))
+            for g in samples:
+                lines.append('{0}{1} {2}'.format(
+                    name, self._format_labels(g['labels']), g['value']))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, prefix):
+        """
+        Write `<prefix>.json` and `<prefix>.prom`.
+
+        :param prefix: A string containing the path without extension.
+        :returns: None
+        """
+        with open(prefix + '.json', 'w') as file:
+            file.write(self.to_json())
+        with open(prefix + '.prom', 'w') as file:
+            file.write(self.to_prometheus())
+
+    def _labels(self, m, **extra):
+        labels = {'method': m['method'], 'stage': m['stage']}
+        labels.update(extra)
+        return self._format_labels(labels)
+
+    def _format_labels(self, labels):
+        labels = dict(self.labels, **labels)
+        pairs = ['{0}="{1}"'.format(k, str(v).replace('\\', '\\\\')
+                                             .replace('"', '\\"'))
+                 for k, v in sorted(labels.items())]
+        return '{{{0}}}'.format(','.join(pairs))
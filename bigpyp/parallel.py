@@ -0,0 +1,197 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import itertools
+import threading
+
+from multiprocessing import pool as mp_pool
+
+import metrics
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_CHUNK_SIZE = 100
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def device_semaphore(host, limit):
+    """
+    Return the semaphore bounding the calls in flight to `host`, shared by
+    every client in this process asking for the same limit.
+
+    :param host: A string containing the device host.
+    :param limit: An int of the most calls in flight to the device.
+    :returns: threading.BoundedSemaphore
+    """
+    key = (host, limit)
+    with _semaphores_lock:
+        semaphore = _semaphores.get(key)
+        if semaphore is None:
+            semaphore = _semaphores[key] = threading.BoundedSemaphore(limit)
+        return semaphore
+
+
+def gather(futures):
+    """
+    Wait for every future, and return their results in order.
+
+    :param futures: A list of Future objects.
+    :returns: list
+    :raises: the first error, in order, of a failed call
+    """
+    return [f.result() for f in futures]
+
+
+class Future(object):
+    """
+    The pending result of an iControl call.
+    """
+
+    def __init__(self, async_result):
+        self._async_result = async_result
+
+    def done(self):
+        return self._async_result.ready()
+
+    def result(self, timeout=None):
+        """
+        Wait for the call, and return its result.
+
+        :param timeout: A float of seconds to wait, forever when None.
+        :returns: the call's return value
+        :raises: the call's error, or multiprocessing.TimeoutError
+        """
+        return self._async_result.get(timeout)
+
+
+class AsyncBIGIP(object):
+    """
+    The interfaces of a BigIP, whose methods return Futures instead of
+    waiting on the device, e.g. `client.LocalLB.Pool.get_list().result()`.
+    Calls run on a thread pool, each thread with its own clone of the
+    BigIP, as suds clients are not shared between threads.
+    """
+
+    def __init__(self, bigip, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Construct an AsyncBIGIP with the supplied args.
+
+        :param bigip: An instance of the BigIP object.
+        :param concurrency: An int of the most calls in flight to the
+                            device, across every AsyncBIGIP talking to it.
+        :returns: None
+        """
+        self.host = bigip.host
+        self._bigip = bigip
+        self._semaphore = device_semaphore(bigip.host, concurrency)
+        self._pool = mp_pool.ThreadPool(concurrency)
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return AsyncModule(self, name)
+
+    def submit(self, wsdl, method, *args, **kwargs):
+        """
+        Start an iControl call, attributed to the caller's metrics stage.
+
+        :param wsdl: A string containing the interface, e.g. 'LocalLB.Pool'.
+        :param method: A string containing the method name.
+        :param args: The method's parameters, in order.
+        :param kwargs: The method's parameters, by name.
+        :returns: Future
+        """
+        call = (metrics.current_stage(), wsdl, method, args, kwargs)
+        return Future(self._pool.apply_async(self._call, call))
+
+    def map(self, wsdl, method, param, names,
+            chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+        """
+        Call a method taking a list of names once per chunk of `names`, all
+        chunks at once, and return the concatenated results.
+
+        :param wsdl: A string containing the interface, e.g. 'LocalLB.Pool'.
+        :param method: A string containing the method name.
+        :param param: A string containing the name of the list parameter,
+                      e.g. 'pool_names'.
+        :param names: A list of names to split across calls.
+        :param chunk_size: An int of the most names sent per call.
+        :param kwargs: The method's other parameters, by name.
+        :returns: list
+        """
+        futures = []
+        for i in xrange(0, len(names), chunk_size):
+            values = dict(kwargs)
+            values[param] = names[i:i + chunk_size]
+            futures.append(self.submit(wsdl, method, **values))
+        return list(itertools.chain.from_iterable(gather(futures)))
+
+    def close(self):
+        """
+        Wait for the calls in flight, and stop the thread pool.
+
+        :returns: None
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def _call(self, stage, wsdl, method, args, kwargs):
+        bigip = getattr(self._local, 'bigip', None)
+        if bigip is None:
+            bigip = self._local.bigip = self._bigip.clone()
+        module_name, interface_name = wsdl.split('.')
+        interface = getattr(getattr(bigip.pc, module_name), interface_name)
+        fn = getattr(interface, method)
+        with self._semaphore:
+            with metrics.stage(stage):
+                return fn(*args, **kwargs)
+
+
+class AsyncModule(object):
+    """
+    An iControl module (e.g. LocalLB) of an AsyncBIGIP.
+    """
+
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return AsyncInterface(self._client, '{0}.{1}'.format(self._name,
+                                                             name))
+
+
+class AsyncInterface(object):
+    """
+    An iControl interface (e.g. LocalLB.Pool) of an AsyncBIGIP, whose
+    methods return Futures.
+    """
+
+    def __init__(self, client, wsdl):
+        self._client = client
+        self.wsdl = wsdl
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self._client.submit(self.wsdl, name, *args, **kwargs)
+        return call
@@ -0,0 +1,311 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import collections
+import datetime
+import os
+import re
+
+import cert
+import profile
+import rule
+import utils
+import virtual_server
+
+
+class PrerequisiteError(Exception):
+    """
+    Raised when the stages to run reference objects the device lacks, and
+    that only stages left out would create.
+    """
+
+    def __init__(self, missing):
+        self.missing = missing
+        msg = ('missing on the device, and not created by the selected '
+               'stages: {0}').format(', '.join(missing))
+        super(PrerequisiteError, self).__init__(msg)
+
+
+class Action(collections.namedtuple('Action',
+                                    ['stage', 'op', 'name', 'args', 'skip'])):
+    """
+    A single step of a plan.  `op` names the method of the stage class
+    which applies it, and `skip` is set when the device already matches.
+    """
+    __slots__ = ()
+
+    def __new__(cls, stage, op, name, args=None, skip=False):
+        return super(Action, cls).__new__(cls, stage, op, name,
+                                          args or {}, skip)
+
+
+class Plan(object):
+    """
+    The difference between a device snapshot and the VIP catalog, expressed
+    as the create/modify actions each stage has to apply.
+    """
+
+    STAGES = ['cert',
+              'http_profile',
+              'ssl_profile',
+              'tcp_profile',
+              'rule',
+              'pool',
+              'virtual_server']
+
+    def __init__(self, state, vips, prune_members=False, drain=0):
+        """
+        Construct a Plan with the supplied args.
+
+        :param state: An instance of the DeviceState object.
+        :param vips: An instance of the VipCatalog object.
+        :param prune_members: A boolean toggling removal of pool members
+                              missing from the catalog.
+        :param drain: An int of seconds pruned members are disabled for
+                      before they are removed, or 0 to remove them at once.
+        :returns: None
+        """
+        self._state = state
+        self._vips = vips
+        self.prune_members = prune_members
+        self.drain = drain
+        self._year = datetime.datetime.now().year
+
+    def actions(self, stages=None):
+        """
+        Return the actions of the given stages, in apply order.
+
+        :param stages: A list of stage names, defaults to `STAGES`.
+        :returns: list
+        """
+        actions = []
+        for stage in stages or self.STAGES:
+            actions.extend(getattr(self, '{0}_actions'.format(stage))())
+        return actions
+
+    def missing(self, stages):
+        """
+        Return the objects the actions of `stages` would reference, that the
+        device lacks and that no stage of `stages` creates, e.g. the
+        profiles of a new virtual server when the profile stages are left
+        out.
+
+        :param stages: A list of stage names, out of `STAGES`.
+        :returns: list of object names, in apply order
+        """
+        missing = []
+
+        def check(name, stage, key):
+            if stage in stages or name in missing:
+                return
+            if name not in getattr(self._state, key):
+                missing.append(name)
+
+        if 'ssl_profile' in stages:
+            profiles = set(self._state.ssl_profiles)
+            for vip in self._vips.public:
+                if vip.ssl_profile in profiles:
+                    continue
+                name = '/Common/{0}-{1}'.format(self._year, vip.domain)
+                check(name, 'cert', 'keys')
+                check(name, 'cert', 'certificates')
+        if 'virtual_server' in stages:
+            # Profiles other than these are built into the device.
+            creators = {profile.HTTPProfile.PROFILE_NAME:
+                        ('http_profile', 'http_profiles'),
+                        profile.TCPProfile.PROFILE_NAME:
+                        ('tcp_profile', 'tcp_profiles')}
+            for a in self.virtual_server_actions():
+                if a.op != 'create_virtual_server' or a.skip:
+                    continue
+                args = a.args
+                if args['ssl_profile']:
+                    creators[args['ssl_profile']] = ('ssl_profile',
+                                                     'ssl_profiles')
+                for _, name in virtual_server.VirtualServer.profiles(
+                        args['monitor'], args['domain'], args['ssl_profile']):
+                    if name in creators:
+                        check(name, *creators[name])
+                check(args['pool'], 'pool', 'pools')
+        return missing
+
+    def cert_actions(self):
+        keys = set(self._state.keys)
+        certs = self._state.certificates
+        actions = []
+        year = self._year
+        seen = set()
+        for vip in self._vips.public:
+            name = '/Common/{0}-{1}'.format(year, vip.domain)
+            # VIPs of one domain share its key and certificate.
+            if not vip.zone or name in seen:
+                continue
+            seen.add(name)
+            key_file = os.path.join(cert.Cert.FILE_BASEDIR, vip.key_path)
+            cert_file = os.path.join(cert.Cert.FILE_BASEDIR, vip.cert_path)
+            cert_action = self._cert_action(name, cert_file, certs)
+            # A renewed certificate comes with its own key.
+            actions.append(Action('cert', 'import_key_from_file', name,
+                                  {'file': key_file,
+                                   'replace': name in keys},
+                                  skip=name in keys and cert_action.skip))
+            actions.append(cert_action)
+
+        cert_name = cert.Cert.INTERMEDIATE_BUNDLE
+        cert_basename = '%s.crt' % cert_name.split('/')[-1]
+        cert_file = os.path.join(cert.Cert.FILE_BASEDIR, cert_basename)
+        actions.append(self._cert_action(cert_name, cert_file, certs))
+        return actions
+
+    def http_profile_actions(self):
+        name = profile.HTTPProfile.PROFILE_NAME
+        mode = profile.HTTPProfile.INSERT_X_FORWARDED_FOR
+        default_profile = profile.HTTPProfile.DEFAULT_PROFILE
+        xff_modes = self._state.http_xff_modes
+        defaults = self._state.http_default_profiles
+        return [Action('http_profile', 'create_http_profile', name,
+                       skip=name in self._state.http_profiles),
+                Action('http_profile', 'set_http_profile_x_forward_for', name,
+                       {'mode': mode},
+                       skip=xff_modes.get(name) == mode),
+                Action('http_profile', 'set_http_profile_default_profile',
+                       name, {'default': default_profile},
+                       skip=defaults.get(name) == default_profile)]
+
+    def ssl_profile_actions(self):
+        profiles = set(self._state.ssl_profiles)
+        chain_files = self._state.chain_files
+        cert_basename = '%s.crt' % cert.Cert.INTERMEDIATE_BUNDLE.split('/')[-1]
+        re_cert = re.compile(r'%(cert_basename)s' % locals())
+        actions = []
+        year = self._year
+        seen = set()
+        for vip in self._vips.public:
+            name = vip.ssl_profile
+            if name in seen:
+                continue
+            seen.add(name)
+            key_profile = '{0}-{1}.key'.format(year, vip.domain)
+            cert_profile = '{0}-{1}.crt'.format(year, vip.domain)
+            chain = chain_files.get(name)
+
+            actions.append(Action('ssl_profile', 'create_ssl_profile', name,
+                                  {'key': key_profile, 'cert': cert_profile},
+                                  skip=name in profiles))
+            actions.append(Action('ssl_profile', 'set_chain_file', name,
+                                  {'chain': '%s.crt' %
+                                   cert.Cert.INTERMEDIATE_BUNDLE},
+                                  skip=bool(chain and re_cert.search(chain))))
+        return actions
+
+    def tcp_profile_actions(self):
+        name = profile.TCPProfile.PROFILE_NAME
+        interval = profile.TCPProfile.KEEP_ALIVE_INTERVAL
+        intervals = self._state.tcp_keep_alive_intervals
+        return [Action('tcp_profile', 'create_tcp_profile', name,
+                       skip=name in self._state.tcp_profiles),
+                Action('tcp_profile', 'set_tcp_custom_keepalive', name,
+                       {'interval': interval},
+                       skip=intervals.get(name) == interval)]
+
+    def rule_actions(self):
+        name = rule.Rule.RULE_NAME
+        return [Action('rule', 'create_rule_x_forwarded_protocol', name,
+                       {'definition': rule.Rule.IRULE},
+                       skip=name in self._state.rules)]
+
+    def pool_actions(self):
+        pools = set(self._state.pools)
+        pool_monitors = self._state.pool_monitors
+        pool_members = self._state.pool_members
+        actions = []
+        disables = []
+        removals = []
+        for pool, port, monitor, members in self._pools():
+            actions.append(Action('pool', 'create_pool', pool,
+                                  {'members': members, 'port': port},
+                                  skip=pool in pools))
+            actions.append(Action('pool', 'set_monitor', pool,
+                                  {'monitor': monitor},
+                                  skip=monitor in pool_monitors.get(pool, [])))
+            # Reconcile members if necessary.  A pool created above already
+            # carries every member.
+            if pool not in pools:
+                continue
+            wanted = set((member, port) for member in members)
+            current = set(tuple(m) for m in pool_members.get(pool, []))
+            for member in members:
+                if (member, port) not in current:
+                    actions.append(Action('pool', 'add_member', pool,
+                                          {'member': member, 'port': port}))
+            if not self.prune_members:
+                continue
+            for member, member_port in sorted(current - wanted):
+                args_dict = {'member': member, 'port': member_port}
+                if self.drain:
+                    disables.append(Action('pool', 'disable_member', pool,
+                                           args_dict))
+                removals.append(Action('pool', 'remove_member', pool,
+                                       args_dict))
+        # Every member is disabled before the first one is removed.
+        return actions + disables + removals
+
+    def _pools(self):
+        # VIPs with the same domain and back port, e.g. one per front port,
+        # share a pool, which gets the members of all of them.  The first
+        # VIP of a pool sets its monitor.
+        pools = collections.OrderedDict()
+        for vip in self._vips.configured:
+            if vip.pool not in pools:
+                pools[vip.pool] = (vip.back_port,
+                                   '/Common/{0}'.format(vip.monitor), [])
+            members = pools[vip.pool][2]
+            for member in vip.members:
+                if member not in members:
+                    members.append(member)
+        return [(pool,) + settings for pool, settings in pools.iteritems()]
+
+    def virtual_server_actions(self):
+        virtual_servers = set(self._state.virtual_servers)
+        snat_pools = self._state.snat_pools
+        snat_pool = virtual_server.VirtualServer.SNAT_POOL
+        actions = []
+        for vip in self._vips.configured:
+            name = vip.virtual_server
+            args_dict = {'domain': vip.domain,
+                         'address': vip.ip,
+                         'port': vip.front_port,
+                         'pool': vip.pool,
+                         'monitor': vip.monitor,
+                         'ssl_profile': vip.ssl_profile if vip.public
+                         else None}
+            actions.append(Action('virtual_server', 'create_virtual_server',
+                                  name, args_dict,
+                                  skip=name in virtual_servers))
+            actions.append(Action('virtual_server', 'set_snat_pool', name,
+                                  {'snat_pool': snat_pool},
+                                  skip=snat_pools.get(name) == snat_pool))
+        return actions
+
+    def _cert_action(self, name, cert_file, certs):
+        # Only a local file that differs from the device's copy replaces
+        # it; without a local file there is nothing to compare.
+        fingerprint = utils.pem_file_fingerprint(cert_file)
+        current = certs.get(name)
+        skip = current is not None and fingerprint in (None, current)
+        return Action('cert', 'import_certificate_from_file', name,
+                      {'file': cert_file, 'replace': current is not None},
+                      skip=skip)
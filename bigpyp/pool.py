@@ -14,6 +14,10 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 
+import collections
+import time
+
+import structs
 import utils
 
 
@@ -25,101 +29,136 @@ class Pool(object):
     LB_METHOD = 'LB_METHOD_ROUND_ROBIN'
     MONITOR_RULE_TYPE = 'MONITOR_RULE_TYPE_SINGLE'
     MONITOR_RULE_QUORUM = 0
+    SESSION_STATE_DISABLED = 'STATE_DISABLED'
 
-    def __init__(self, bigip, vips_dict):
+    def __init__(self, bigip, plan, batch_size=1):
         """
         Construct a Pool with the supplied args.
 
         :param bigip: An instance of the BigIP object.
-        :param vips_dict: A dict containing VIP configuration.
+        :param plan: An instance of the Plan object.
+        :param batch_size: An int of the most pools sent per iControl call.
         :returns: None
         """
         self._pool = bigip.pc.LocalLB.Pool
-        self._vips_dict = vips_dict
+        self._structs = structs.StructFactory(self._pool)
+        self._plan = plan
+        self._batch_size = batch_size
 
     def create(self):
         print 'Pool'
-        self._create_pools()
-
-    def _create_pools(self):
-        for vipname, vip_dict in self._vips_dict['load_balancing'].iteritems():
-            domain = vip_dict['dns']
-            port = vip_dict['back_port']
-            pool = utils.pool_name(domain, port)
-            monitor = vip_dict['monitor']
-            members = vip_dict['members']
-            monitor = '/Common/%(monitor)s' % vip_dict
-            if members:  # skip unconfigured members
-                self._create_pool(pool, members, port)
-                self._set_monitor(pool, monitor)
-                # Add new members if necesssary.  Probably will want to handle
-                # the removal of old members at some point.
-                self._add_missing_members(pool, members, port)
-
-    def _create_pool(self, pool, hosts, port):
-        pools = self._pool.get_list()
-        if pool in pools:
-            msg = '  - {0} already exists'.format(pool)
+        actions = self._plan.pool_actions()
+        removals = [a for a in actions if a.op == 'remove_member']
+        others = [a for a in actions if a.op != 'remove_member']
+        utils.apply_actions(self, others, self._batch_size)
+        drained = [a for a in actions if a.op == 'disable_member']
+        if drained and self._plan.drain:
+            msg = '  - waiting {0}s for {1} member(s) to drain'.format(
+                self._plan.drain, len(drained))
             utils.print_yellow(msg)
-        else:
+            time.sleep(self._plan.drain)
+        utils.apply_actions(self, removals, self._batch_size)
+
+    def _create_pool(self, actions):
+        pending = utils.report_skipped(actions, '  - {name} already exists')
+        if not pending:
+            return
+        member_sequences = []
+        for action in pending:
             # Odd, must create a sequence, even when the docs state othewise.
             # https://devcentral.f5.com/wiki/iControl.LocalLB__Pool__create_v2.ashx  # NOQA
             member_sequence = self._get_common_ip_port_definition_sequence()
             members = []
-            for host in hosts:
-                member = self._get_common_address_port(host, port)
+            for host in action.args['members']:
+                member = self._get_common_address_port(host,
+                                                       action.args['port'])
                 members.append(member)
             member_sequence.items = members
-            self._pool.create_v2(pool_names=[pool],
-                                 lb_methods=[self.LB_METHOD],
-                                 members=[member_sequence])
-            msg = '  - {0} created'.format(pool)
+            member_sequences.append(member_sequence)
+        self._pool.create_v2(pool_names=[a.name for a in pending],
+                             lb_methods=[self.LB_METHOD] * len(pending),
+                             members=member_sequences)
+        for action in pending:
+            msg = '  - {0} created'.format(action.name)
             utils.print_green(msg)
 
-    def _set_monitor(self, pool, monitor):
-        result = self._pool.get_monitor_association([pool])
-        templates = result[0].monitor_rule.monitor_templates
-        if monitor in templates:
-            msg = '  - monitor {0} already exists for {1}'.format(monitor,
-                                                                  pool)
-            utils.print_yellow(msg)
-        else:
-            struct = 'LocalLB.MonitorRule'
-            monitor_rule = self._pool.typefactory.create(struct)
-            monitor_rule.type = self.MONITOR_RULE_TYPE
-            monitor_rule.quorum = self.MONITOR_RULE_QUORUM
-            monitor_rule.monitor_templates = [monitor]
-
-            struct = 'LocalLB.Pool.MonitorAssociation'
-            monitor_assoc = self._pool.typefactory.create(struct)
-            monitor_assoc.pool_name = pool
-            monitor_assoc.monitor_rule = monitor_rule
-
-            args_dict = {'monitor_associations': [monitor_assoc]}
-            self._pool.set_monitor_association(**args_dict)
-            msg = '  - monitor {0} created for {1}'.format(monitor, pool)
+    def _set_monitor(self, actions):
+        msg = '  - monitor {monitor} already exists for {name}'
+        pending = utils.report_skipped(actions, msg)
+        if not pending:
+            return
+        monitor_assocs = []
+        for action in pending:
+            monitor_rule = self._structs.create(
+                'LocalLB.MonitorRule',
+                type=self.MONITOR_RULE_TYPE,
+                quorum=self.MONITOR_RULE_QUORUM,
+                monitor_templates=[action.args['monitor']])
+            monitor_assoc = self._structs.create(
+                'LocalLB.Pool.MonitorAssociation',
+                pool_name=action.name,
+                monitor_rule=monitor_rule)
+            monitor_assocs.append(monitor_assoc)
+
+        args_dict = {'monitor_associations': monitor_assocs}
+        self._pool.set_monitor_association(**args_dict)
+        for action in pending:
+            msg = '  - monitor {0} created for {1}'.format(
+                action.args['monitor'], action.name)
+            utils.print_green(msg)
+
+    def _add_member(self, actions):
+        pool_names, member_sequences = self._member_sequences(actions)
+        self._pool.add_member_v2(pool_names=pool_names,
+                                 members=member_sequences)
+        for action in actions:
+            msg = '  - member {0} added to {1}'.format(action.args['member'],
+                                                       action.name)
+            utils.print_green(msg)
+
+    def _disable_member(self, actions):
+        pool_names, member_sequences = self._member_sequences(actions)
+        state_sequences = []
+        for ms in member_sequences:
+            ss = self._structs.create(
+                'Common.EnabledStateSequence',
+                items=[self.SESSION_STATE_DISABLED] * len(ms.items))
+            state_sequences.append(ss)
+        self._pool.set_member_session_enabled_state(
+            pool_names=pool_names,
+            members=member_sequences,
+            session_states=state_sequences)
+        for action in actions:
+            msg = '  - member {0} disabled in {1}'.format(
+                action.args['member'], action.name)
+            utils.print_green(msg)
+
+    def _remove_member(self, actions):
+        pool_names, member_sequences = self._member_sequences(actions)
+        self._pool.remove_member_v2(pool_names=pool_names,
+                                    members=member_sequences)
+        for action in actions:
+            msg = '  - member {0} removed from {1}'.format(
+                action.args['member'], action.name)
             utils.print_green(msg)
 
-    def _add_missing_members(self, pool, members, port):
-        current_members = self._pool.get_member_v2(pool_names=[pool])
-        members_list = [m.address.replace('/Common/', '')
-                        for m in current_members[0]]
-        for member in members:
-            if member not in members_list:
-                m = self._get_common_address_port(member, port)
-                ms = self._get_common_ip_port_definition_sequence()
-                ms.items = m
-                self._pool.add_member_v2(pool_names=[pool],
-                                         members=[ms])
-                msg = '  - member {0} added to {1}'.format(member, pool)
-                utils.print_green(msg)
+    def _member_sequences(self, actions):
+        # One sequence per pool, however many of its members change.
+        pools = collections.OrderedDict()
+        for action in actions:
+            m = self._get_common_address_port(action.args['member'],
+                                              action.args['port'])
+            pools.setdefault(action.name, []).append(m)
+        member_sequences = []
+        for members in pools.itervalues():
+            ms = self._get_common_ip_port_definition_sequence()
+            ms.items = members
+            member_sequences.append(ms)
+        return pools.keys(), member_sequences
 
     def _get_common_address_port(self, host, port):
-        member = self._pool.typefactory.create('Common.AddressPort')
-        member.address = host
-        member.port = port
-        return member
+        return self._structs.create('Common.AddressPort', address=host,
+                                    port=port)
 
     def _get_common_ip_port_definition_sequence(self):
-        struct = 'Common.IPPortDefinitionSequence'
-        return self._pool.typefactory.create(struct)
+        return self._structs.create('Common.IPPortDefinitionSequence')
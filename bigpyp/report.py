@@ -0,0 +1,206 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import collections
+import json
+
+import numpy
+
+import structs
+import utils
+
+# The member statistics summed per pool, as columns of the statistics
+# array.
+STATISTICS = ('STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS',
+              'STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS',
+              'STATISTIC_SERVER_SIDE_BYTES_IN',
+              'STATISTIC_SERVER_SIDE_BYTES_OUT')
+CURRENT_CONNECTIONS, TOTAL_CONNECTIONS, BYTES_IN, BYTES_OUT = range(4)
+AVAILABLE = 'AVAILABILITY_STATUS_GREEN'
+ENABLED = 'ENABLED_STATUS_ENABLED'
+COLUMNS = ['pool', 'members', 'up', 'down', 'disabled',
+           'current_connections', 'total_connections', 'bytes_in',
+           'bytes_out', 'imbalance']
+
+# One entry per member of every pool read: the index of its pool, whether
+# it is available and enabled, and its STATISTICS.
+Members = collections.namedtuple('Members', ['pool', 'available', 'enabled',
+                                             'statistics'])
+
+
+def statistic_values(entries, types):
+    """
+    Return the statistics of each entry as one array, with a row per entry
+    and a column per type.
+
+    :param entries: A list of iControl statistic entries, each with a
+                    `statistics` list of Common.Statistic.
+    :param types: A list of statistic type names.
+    :returns: numpy.ndarray of uint64; types an entry lacks are 0
+    """
+    columns = dict((t, i) for i, t in enumerate(types))
+    rows = []
+    for entry in entries:
+        row = [(0, 0)] * len(types)
+        for s in getattr(entry, 'statistics', None) or []:
+            column = columns.get(s.type)
+            if column is not None:
+                row[column] = (s.value.high, s.value.low)
+        rows.append(row)
+    words = numpy.array(rows, numpy.uint64).reshape(len(rows), len(types), 2)
+    return (words[:, :, 0] << numpy.uint64(32)) | words[:, :, 1]
+
+
+def read_members(bigip, pools):
+    """
+    Read the status and statistics of every member of `pools`, with one
+    bulk call each.
+
+    :param bigip: An instance of the BigIP object.
+    :param pools: A list of pool names, all on the device.
+    :returns: Members
+    """
+    pool = bigip.pc.LocalLB.Pool
+    index = []
+    entries = []
+    by_pool = []
+    if pools:
+        by_pool = pool.get_all_member_statistics(pool_names=pools)
+    for i, pool_statistics in enumerate(by_pool):
+        for entry in getattr(pool_statistics, 'statistics', None) or []:
+            index.append(i)
+            entries.append(entry)
+    statistics = statistic_values(entries, STATISTICS)
+    addresses = [entry.member for entry in entries]
+
+    # Pools without members are left out, as suds drops their empty
+    # member lists from the request.
+    factory = structs.StructFactory(pool)
+    names = []
+    members = []
+    for i, address in zip(index, addresses):
+        if not names or names[-1] != pools[i]:
+            names.append(pools[i])
+            members.append(
+                factory.create('Common.IPPortDefinitionSequence'))
+            members[-1].items = []
+        members[-1].items.append(factory.create('Common.AddressPort',
+                                                address=address.address,
+                                                port=address.port))
+    available = []
+    enabled = []
+    if names:
+        for statuses in pool.get_member_object_status(pool_names=names,
+                                                      members=members):
+            for status in statuses:
+                available.append(status.availability_status == AVAILABLE)
+                enabled.append(status.enabled_status == ENABLED)
+    return Members(numpy.array(index, numpy.intp),
+                   numpy.array(available, bool),
+                   numpy.array(enabled, bool),
+                   statistics)
+
+
+def aggregate(pools, members):
+    """
+    Sum the members of each pool.  A member is up when it is available and
+    enabled, disabled when it is not enabled, and down otherwise.  The
+    imbalance is the busiest member's share of the pool's total
+    connections over an even share: 1.0 is perfectly balanced, and it is
+    None for a pool without connections.
+
+    :param pools: A list of pool names.
+    :param members: The Members of `pools`.
+    :returns: list of dicts with the keys in COLUMNS, in `pools` order
+    """
+    n = len(pools)
+    count = numpy.bincount(members.pool, minlength=n)
+    up = numpy.bincount(members.pool, minlength=n,
+                        weights=members.available & members.enabled)
+    disabled = numpy.bincount(members.pool, minlength=n,
+                              weights=~members.enabled)
+    totals = numpy.zeros((n, len(STATISTICS)), numpy.uint64)
+    numpy.add.at(totals, members.pool, members.statistics)
+    busiest = numpy.zeros(n, numpy.uint64)
+    numpy.maximum.at(busiest, members.pool,
+                     members.statistics[:, TOTAL_CONNECTIONS])
+    mean = totals[:, TOTAL_CONNECTIONS] / numpy.maximum(count, 1).astype(float)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        imbalance = numpy.where(mean > 0, busiest / mean, numpy.nan)
+
+    rows = []
+    for i, name in enumerate(pools):
+        rows.append({
+            'pool': name,
+            'members': int(count[i]),
+            'up': int(up[i]),
+            'down': int(count[i] - up[i] - disabled[i]),
+            'disabled': int(disabled[i]),
+            'current_connections': int(totals[i, CURRENT_CONNECTIONS]),
+            'total_connections': int(totals[i, TOTAL_CONNECTIONS]),
+            'bytes_in': int(totals[i, BYTES_IN]),
+            'bytes_out': int(totals[i, BYTES_OUT]),
+            'imbalance': (None if numpy.isnan(imbalance[i])
+                          else round(float(imbalance[i]), 2))})
+    return rows
+
+
+def pool_report(bigip, vips):
+    """
+    Report on the members of every pool of a VIP catalog.
+
+    :param bigip: An instance of the BigIP object.
+    :param vips: An instance of the VipCatalog object.
+    :returns: (list of rows, list of the catalog's pools missing from the
+              device)
+    """
+    wanted = sorted(set(vip.pool for vip in vips))
+    present = set(bigip.pc.LocalLB.Pool.get_list())
+    pools = [p for p in wanted if p in present]
+    missing = [p for p in wanted if p not in present]
+    return aggregate(pools, read_members(bigip, pools)), missing
+
+
+def print_report(rows, missing, as_json=False):
+    """
+    Print a pool report as a table.
+
+    :param rows: A list of rows, as returned by `aggregate`.
+    :param missing: A list of pool names missing from the device.
+    :param as_json: A boolean to print a JSON document instead.
+    :returns: None
+    """
+    if as_json:
+        print json.dumps({'pools': rows, 'missing': missing}, indent=2,
+                         separators=(',', ': '), sort_keys=True)
+        return
+    width = max([len(r['pool']) for r in rows] + [len('pool')])
+    line = '{0:<{width}} {1:>7} {2:>4} {3:>4} {4:>8} {5:>8} {6:>10} ' \
+           '{7:>14} {8:>14} {9:>9}'
+    print line.format('pool', 'members', 'up', 'down', 'disabled', 'current',
+                      'total', 'bytes_in', 'bytes_out', 'imbalance',
+                      width=width)
+    for r in rows:
+        text = line.format(*[r[c] if r[c] is not None else '-'
+                             for c in COLUMNS], width=width)
+        if r['down']:
+            utils.print_red(text)
+        elif r['disabled']:
+            utils.print_yellow(text)
+        else:
+            utils.print_green(text)
+    for name in missing:
+        utils.print_yellow('{0} is not on the device'.format(name))
@@ -14,6 +14,7 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 
+import structs
 import utils
 
 
@@ -28,29 +29,33 @@ class Rule(object):
              '  HTTP::header insert "X-Forwarded-Protocol" "https";\n'
              '}')
 
-    def __init__(self, bigip):
+    def __init__(self, bigip, plan):
         """
         Construct a Rule with the supplied args.
 
         :param bigip: An instance of the BigIP object.
+        :param plan: An instance of the Plan object.
         :returns: None
         """
         self._rule = bigip.pc.LocalLB.Rule
+        self._structs = structs.StructFactory(self._rule)
+        self._plan = plan
 
     def create(self):
         print 'Rule'
-        self._create_rule_x_forwarded_protocol()
-
-    def _create_rule_x_forwarded_protocol(self):
-        rules = self._rule.get_list()
-        if self.RULE_NAME in rules:
-            msg = '  - already has x-forwarded-protocol rule'
-            utils.print_yellow(msg)
-        else:
-            struct = 'LocalLB.Rule.RuleDefinition'
-            ctx = self._rule.typefactory.create(struct)
-            ctx.rule_name = self.RULE_NAME
-            ctx.rule_definition = self.IRULE
-            self._rule.create([ctx])
-            msg = '  - created x-forwarded-protocol rule'
-            utils.print_green(msg)
+        utils.apply_actions(self, self._plan.rule_actions())
+
+    def _create_rule_x_forwarded_protocol(self, actions):
+        msg = '  - already has x-forwarded-protocol rule'
+        pending = utils.report_skipped(actions, msg)
+        if not pending:
+            return
+        rules = []
+        for action in pending:
+            ctx = self._structs.create(
+                'LocalLB.Rule.RuleDefinition', rule_name=action.name,
+                rule_definition=action.args['definition'])
+            rules.append(ctx)
+        self._rule.create(rules)
+        msg = '  - created x-forwarded-protocol rule'
+        utils.print_green(msg)
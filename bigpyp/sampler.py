@@ -0,0 +1,269 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import calendar
+import collections
+import csv
+import logging
+import os
+import tempfile
+import time
+
+import numpy
+
+import report
+import utils
+
+LOG = logging.getLogger(__name__)
+
+# The virtual server statistics sampled, by the name they are exported as.
+METRICS = collections.OrderedDict([
+    ('requests', 'STATISTIC_TOTAL_REQUESTS'),
+    ('connections', 'STATISTIC_CLIENT_SIDE_TOTAL_CONNECTIONS'),
+    ('bytes_in', 'STATISTIC_CLIENT_SIDE_BYTES_IN'),
+    ('bytes_out', 'STATISTIC_CLIENT_SIDE_BYTES_OUT'),
+    ('current_connections', 'STATISTIC_CLIENT_SIDE_CURRENT_CONNECTIONS')])
+# Metrics exported as sampled; the others are counters, exported as
+# per-second rates.
+GAUGES = ('current_connections',)
+
+
+def virtual_servers(bigip, vips):
+    """
+    Return the virtual servers of a VIP catalog which are on the device,
+    and those which are not.
+
+    :param bigip: An instance of the BigIP object.
+    :param vips: An instance of the VipCatalog object.
+    :returns: (list, list)
+    """
+    wanted = sorted(set(vip.virtual_server for vip in vips))
+    present = set(bigip.pc.LocalLB.VirtualServer.get_list())
+    return ([v for v in wanted if v in present],
+            [v for v in wanted if v not in present])
+
+
+class RingBuffer(object):
+    """
+    The last `capacity` samples of some metrics of some objects, in arrays
+    allocated up front: one of sample times, and one per metric with a row
+    per sample and a column per object.  Once full, each sample overwrites
+    the oldest, so memory stays flat however long sampling runs.
+    """
+
+    def __init__(self, names, metrics, capacity):
+        """
+        Construct a RingBuffer with the supplied args.
+
+        :param names: A list of the object names, one column each.
+        :param metrics: A list of the metric names, one array each.
+        :param capacity: An int of the samples kept.
+        :returns: None
+        """
+        self.names = list(names)
+        self.metrics = list(metrics)
+        self.capacity = capacity
+        self.count = 0
+        self.times = numpy.zeros(capacity, numpy.float64)
+        self.columns = dict(
+            (metric, numpy.zeros((capacity, len(self.names)), numpy.uint64))
+            for metric in self.metrics)
+        self._next = 0
+
+    def append(self, timestamp, values):
+        """
+        Add a sample, overwriting the oldest once full.
+
+        :param timestamp: A float of the sample's time in seconds.
+        :param values: A numpy.ndarray with a row per object and a column
+                       per metric.
+        :returns: None
+        """
+        i = self._next
+        self.times[i] = timestamp
+        for j, metric in enumerate(self.metrics):
+            self.columns[metric][i] = values[:, j]
+        self._next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def series(self, metric):
+        """
+        Return the samples of a metric, oldest first.
+
+        :param metric: A string containing the metric name.
+        :returns: (times, values) numpy.ndarrays
+        """
+        order = (self._next - self.count + numpy.arange(self.count)) \
+            % self.capacity
+        return self.times[order], self.columns[metric][order]
+
+    def rates(self, metric):
+        """
+        Return the per-second rate of a counter between consecutive
+        samples.  An interval over which the counter went backwards, e.g.
+        as its statistics were reset, has no rate: NaN.
+
+        :param metric: A string containing the metric name.
+        :returns: (times, rates) numpy.ndarrays, with a row per sample
+                  after the first, timed at its end
+        """
+        times, values = self.series(metric)
+        # Differences wrap around rather than go negative in uint64; those
+        # are masked below.
+        deltas = (values[1:] - values[:-1]).astype(numpy.float64)
+        elapsed = numpy.diff(times)[:, numpy.newaxis]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rates = deltas / elapsed
+        rates[(values[1:] < values[:-1]) | (elapsed <= 0)] = numpy.nan
+        return times[1:], rates
+
+    def save(self, path):
+        """
+        Write the samples to `path`: as CSV, with a row per sample and
+        object, when it ends in `.csv`, otherwise as a compressed NumPy
+        archive of the raw arrays.  Counters are exported as rates in CSV.
+
+        :param path: A string containing the file to write.
+        :returns: None
+        """
+        directory = os.path.dirname(path) or '.'
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        with os.fdopen(fd, 'wb') as file:
+            if path.endswith('.csv'):
+                self._write_csv(file)
+            else:
+                arrays = {}
+                for metric in self.metrics:
+                    times, arrays[metric] = self.series(metric)
+                numpy.savez_compressed(file, times=times,
+                                       names=numpy.array(self.names),
+                                       **arrays)
+        os.rename(tmp, path)
+
+    def _write_csv(self, file):
+        # A row per interval between samples, as rates need two samples.
+        columns = []
+        for metric in self.metrics:
+            if metric in GAUGES:
+                times, values = self.series(metric)
+                columns.append((metric, values[1:]))
+            else:
+                times, values = self.rates(metric)
+                columns.append(('{0}_per_second'.format(metric), values))
+        times = self.series(self.metrics[0])[0][1:]
+        writer = csv.writer(file)
+        writer.writerow(['time', 'name'] + [name for name, v in columns])
+        for i, timestamp in enumerate(times):
+            for j, name in enumerate(self.names):
+                row = ['{0:.3f}'.format(timestamp), name]
+                row.extend(_format(v[i, j]) for n, v in columns)
+                writer.writerow(row)
+
+
+class Sampler(object):
+    """
+    Samples the statistics of virtual servers into a RingBuffer, with one
+    batched `LocalLB.VirtualServer.get_statistics` call for all of them.
+    """
+
+    DEFAULT_INTERVAL = 10  # seconds
+    DEFAULT_CAPACITY = 1440  # samples
+    DEFAULT_SAVE_EVERY = 6  # samples
+
+    def __init__(self, bigip, virtual_servers, capacity=DEFAULT_CAPACITY,
+                 clock=time.time, sleep=time.sleep):
+        """
+        Construct a Sampler with the supplied args.
+
+        :param bigip: An instance of the BigIP object.
+        :param virtual_servers: A list of virtual server names.
+        :param capacity: An int of the samples kept.
+        :param clock: A callable returning the time in seconds, timing
+                      samples the device does not time.
+        :param sleep: A callable taking seconds to wait.
+        :returns: None
+        """
+        self.buffer = RingBuffer(virtual_servers, METRICS.keys(), capacity)
+        self._bigip = bigip
+        self._clock = clock
+        self._sleep = sleep
+
+    def sample(self):
+        """
+        Read the statistics of every virtual server, and add them to the
+        buffer.
+
+        :returns: None
+        """
+        virtual_server = self._bigip.pc.LocalLB.VirtualServer
+        result = virtual_server.get_statistics(
+            virtual_servers=self.buffer.names)
+        entries = getattr(result, 'statistics', None) or []
+        if len(entries) != len(self.buffer.names):
+            msg = 'asked for {0} virtual servers, got {1}'.format(
+                len(self.buffer.names), len(entries))
+            raise ValueError(msg)
+        # Timed by the device, as it read the counters.  Our clock before
+        # or after the call is off by however long the request or the
+        # response took.
+        timestamp = _seconds(getattr(result, 'time_stamp', None))
+        if timestamp is None:
+            timestamp = self._clock()
+        self.buffer.append(timestamp,
+                           report.statistic_values(entries, METRICS.values()))
+
+    def run(self, path, interval=DEFAULT_INTERVAL, samples=None,
+            save_every=DEFAULT_SAVE_EVERY):
+        """
+        Sample every interval, and save the buffer to `path` every few
+        samples and when stopped.  A failed sample is reported and skipped.
+
+        :param path: A string containing the file to save to.
+        :param interval: An int of seconds between samples.
+        :param samples: An int of samples to take, or None to run forever.
+        :param save_every: An int of samples between saves.
+        :returns: None
+        """
+        count = 0
+        try:
+            while samples is None or count < samples:
+                try:
+                    self.sample()
+                except Exception as e:
+                    LOG.exception('sample failed')
+                    utils.print_red('Sample failed: {0}'.format(e))
+                count += 1
+                if count % save_every == 0:
+                    self.buffer.save(path)
+                if samples is None or count < samples:
+                    self._sleep(interval)
+        finally:
+            self.buffer.save(path)
+
+
+def _seconds(time_stamp):
+    # A Common.TimeStamp, to the second, as seconds since the epoch.
+    if not time_stamp:
+        return None
+    fields = ('year', 'month', 'day', 'hour', 'minute', 'second')
+    return float(calendar.timegm(
+        [int(getattr(time_stamp, f)) for f in fields]))
+
+
+def _format(value):
+    if value.dtype.kind != 'f':
+        return str(value)
+    return '' if numpy.isnan(value) else '{0:.3f}'.format(value)
@@ -0,0 +1,265 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import base64
+import collections
+import hashlib
+
+import pool
+import structs
+import utils
+import virtual_server
+
+# The plan stages a configuration file creates objects for.  Keys and
+# certificates are files of their own, so the cert stage stays on
+# Management.KeyCertificate.
+STAGES = ('http_profile', 'ssl_profile', 'tcp_profile', 'rule', 'pool',
+          'virtual_server')
+CREATES = {'http_profile': 'create_http_profile',
+           'ssl_profile': 'create_ssl_profile',
+           'tcp_profile': 'create_tcp_profile',
+           'rule': 'create_rule_x_forwarded_protocol',
+           'pool': 'create_pool',
+           'virtual_server': 'create_virtual_server'}
+
+FILE_DIR = '/var/local/scf'
+CHUNK_SIZE = 64 * 1024  # bytes
+LOAD_FLAG = 'LOAD_HIGH_LEVEL_CONFIG'
+
+CONTEXTS = {'PROFILE_CONTEXT_TYPE_ALL': 'all',
+            'PROFILE_CONTEXT_TYPE_CLIENT': 'clientside',
+            'PROFILE_CONTEXT_TYPE_SERVER': 'serverside'}
+LB_METHODS = {'LB_METHOD_ROUND_ROBIN': 'round-robin',
+              'LB_METHOD_LEAST_CONNECTION_MEMBER': 'least-connections-member'}
+PROFILE_MODES = {'PROFILE_MODE_ENABLED': 'enabled',
+                 'PROFILE_MODE_DISABLED': 'disabled'}
+
+
+class LoadError(Exception):
+    """
+    Raised when the device lacks objects a loaded file created.
+    """
+
+
+def covered(actions):
+    """
+    Return the actions a configuration file applies: those of the objects
+    the plan creates.  The actions of objects already on the device stay
+    with their stages, since a merge replaces settings such as a pool's
+    members wholesale.
+
+    :param actions: A list of Action objects.
+    :returns: collections.OrderedDict of (stage, name) to the list of its
+              pending actions, in apply order
+    """
+    created = set((a.stage, a.name) for a in actions
+                  if not a.skip and a.op == CREATES.get(a.stage))
+    objects = collections.OrderedDict()
+    for action in actions:
+        key = (action.stage, action.name)
+        if key in created and not action.skip:
+            objects.setdefault(key, []).append(action)
+    return objects
+
+
+def render(objects):
+    """
+    Render objects as tmsh configuration, in the syntax of
+    `tmsh load sys config merge file`.
+
+    :param objects: A dict of (stage, name) to the list of its actions, as
+                    `covered` returns.
+    :returns: string
+    """
+    stanzas = []
+    for (stage, name), actions in objects.iteritems():
+        args = {}
+        for action in actions:
+            args.update(action.args)
+        lines = RENDERERS[stage](name, args)
+        stanzas.append('\n'.join(lines) + '\n')
+    return '\n'.join(stanzas)
+
+
+def _http_profile(name, args):
+    lines = ['ltm profile http {0} {{'.format(name)]
+    if 'default' in args:
+        lines.append('    defaults-from {0}'.format(args['default']))
+    if 'mode' in args:
+        lines.append('    insert-xforwarded-for {0}'.format(
+            PROFILE_MODES[args['mode']]))
+    return lines + ['}']
+
+
+def _ssl_profile(name, args):
+    lines = ['ltm profile client-ssl {0} {{'.format(name),
+             '    cert {0}'.format(args['cert']),
+             '    key {0}'.format(args['key'])]
+    if 'chain' in args:
+        lines.append('    chain {0}'.format(args['chain']))
+    return lines + ['}']
+
+
+def _tcp_profile(name, args):
+    lines = ['ltm profile tcp {0} {{'.format(name)]
+    if 'interval' in args:
+        lines.append('    keep-alive-interval {0}'.format(args['interval']))
+    return lines + ['}']
+
+
+def _rule(name, args):
+    return ['ltm rule {0} {{'.format(name), args['definition'], '}']
+
+
+def _pool(name, args):
+    lines = ['ltm pool {0} {{'.format(name),
+             '    load-balancing-mode {0}'.format(
+                 LB_METHODS[pool.Pool.LB_METHOD]),
+             '    members {']
+    for member in args['members']:
+        member_name = _address_port(member, args['port'])
+        lines.extend(['        /Common/{0} {{'.format(member_name),
+                      '            address {0}'.format(member),
+                      '        }'])
+    lines.append('    }')
+    if 'monitor' in args:
+        lines.append('    monitor {0}'.format(args['monitor']))
+    return lines + ['}']
+
+
+def _virtual_server(name, args):
+    vs = virtual_server.VirtualServer
+    lines = ['ltm virtual {0} {{'.format(name),
+             '    destination /Common/{0}'.format(
+                 _address_port(args['address'], args['port'])),
+             '    ip-protocol tcp',
+             '    mask {0}'.format(vs.WILDMASKS),
+             '    pool {0}'.format(args['pool']),
+             '    profiles {']
+    for context, profile_name in vs.profiles(args['monitor'], args['domain'],
+                                             args['ssl_profile']):
+        lines.extend(['        {0} {{'.format(profile_name),
+                      '            context {0}'.format(CONTEXTS[context]),
+                      '        }'])
+    lines.append('    }')
+    if 'snat_pool' in args:
+        lines.extend(['    source-address-translation {',
+                      '        pool {0}'.format(args['snat_pool']),
+                      '        type snat',
+                      '    }'])
+    return lines + ['}']
+
+
+def _address_port(address, port):
+    # tmsh separates an IPv6 address from its port with a dot.
+    separator = '.' if ':' in address else ':'
+    return '{0}{1}{2}'.format(address, separator, port)
+
+
+RENDERERS = {'http_profile': _http_profile,
+             'ssl_profile': _ssl_profile,
+             'tcp_profile': _tcp_profile,
+             'rule': _rule,
+             'pool': _pool,
+             'virtual_server': _virtual_server}
+
+
+def upload(bigip, file_name, data, chunk_size=CHUNK_SIZE):
+    """
+    Upload a file to the device, in chunks.
+
+    :param bigip: An instance of the BigIP object.
+    :param file_name: A string containing the path on the device.
+    :param data: A string of the file's contents.
+    :param chunk_size: An int of the most bytes sent per iControl call.
+    :returns: None
+    """
+    config_sync = bigip.pc.System.ConfigSync
+    factory = structs.StructFactory(config_sync)
+    chunks = [data[i:i + chunk_size]
+              for i in range(0, len(data), chunk_size)] or ['']
+    for i, chunk in enumerate(chunks):
+        if len(chunks) == 1:
+            chain_type = 'FILE_FIRST_AND_LAST'
+        elif i == 0:
+            chain_type = 'FILE_FIRST'
+        elif i == len(chunks) - 1:
+            chain_type = 'FILE_LAST'
+        else:
+            chain_type = 'FILE_MIDDLE'
+        context = factory.create('System.ConfigSync.FileTransferContext',
+                                 file_data=base64.b64encode(chunk),
+                                 chain_type=chain_type)
+        config_sync.upload_file(file_name=file_name, file_context=context)
+
+
+def load(bigip, p, stages, chunk_size=CHUNK_SIZE):
+    """
+    Create the objects a plan creates in `stages` by uploading one
+    configuration file and merging it into the device's configuration.
+
+    :param bigip: An instance of the BigIP object.
+    :param p: An instance of the Plan object.
+    :param stages: A list of plan stage names.
+    :param chunk_size: An int of the most bytes uploaded per iControl call.
+    :returns: list of the Action objects the file applied
+    """
+    print 'BulkLoad'
+    objects = covered(p.actions([s for s in stages if s in STAGES]))
+    if not objects:
+        utils.print_green('  - nothing to create')
+        return []
+    data = render(objects)
+    # Named after its contents, so runs against one device never share a
+    # file that differs.
+    file_name = '{0}/bigpyp-{1}.scf'.format(
+        FILE_DIR, hashlib.sha1(data).hexdigest()[:12])
+    config_sync = bigip.pc.System.ConfigSync
+    upload(bigip, file_name, data, chunk_size)
+    try:
+        config_sync.install_single_configuration_file(
+            filename=file_name, load_flag=LOAD_FLAG, passphrase='',
+            tarfile='', merge=True)
+    finally:
+        # The merged configuration does not need the file; leaving it
+        # would pile one up per load in the device's SCF directory.
+        config_sync.delete_file(file_name=file_name)
+    msg = '  - loaded {0} objects from {1}'.format(len(objects), file_name)
+    utils.print_green(msg)
+    return [a for actions in objects.itervalues() for a in actions]
+
+
+def verify(p, applied):
+    """
+    Check a plan of the device, read after a load, for actions the load
+    should have applied.
+
+    :param p: An instance of the Plan object, of the device after the load.
+    :param applied: A list of the Action objects the load applied.
+    :returns: None
+    :raises: LoadError when any of them is still pending
+    """
+    if not applied:
+        return
+    stages = sorted(set(a.stage for a in applied), key=STAGES.index)
+    pending = set((a.stage, a.op, a.name) for a in p.actions(stages)
+                  if not a.skip)
+    missing = [a for a in applied if (a.stage, a.op, a.name) in pending]
+    if missing:
+        msg = 'the loaded file did not apply: {0}'.format(', '.join(
+            '{0} {1}'.format(a.op, a.name) for a in missing))
+        raise LoadError(msg)
+    utils.print_green('  - verified {0} actions'.format(len(applied)))
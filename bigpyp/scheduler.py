@@ -0,0 +1,122 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import Queue
+import sys
+import traceback
+
+from multiprocessing import pool as mp_pool
+
+# The stages each stage has to wait for.  Certs must exist before the SSL
+# profiles that use them, and pools and profiles before the virtual servers
+# that reference them.
+DEPENDENCIES = {'cert': [],
+                'profile': ['cert'],
+                'system': [],
+                'rule': [],
+                'monitor': [],
+                'pool': [],
+                'virtual_server': ['pool', 'profile']}
+
+
+class StageError(Exception):
+    """
+    Raised when one or more stages failed.
+    """
+
+    def __init__(self, failures, skipped):
+        self.failures = failures
+        self.skipped = skipped
+        errors = ', '.join('{0} ({1})'.format(s, e)
+                           for s, e in sorted(failures.items()))
+        msg = 'stage(s) failed: {0}'.format(errors)
+        if skipped:
+            msg += '; not run: {0}'.format(', '.join(sorted(skipped)))
+        super(StageError, self).__init__(msg)
+
+
+class Scheduler(object):
+    """
+    Runs stages as a DAG, starting every stage whose dependencies are done
+    on a thread pool, so independent stages run at the same time.
+    """
+
+    def __init__(self, stages, workers, dependencies=DEPENDENCIES):
+        """
+        Construct a Scheduler with the supplied args.
+
+        :param stages: A list of stage names to run.  Dependencies on
+                       stages not in the list are ignored.
+        :param workers: An int of the most stages run at once.
+        :param dependencies: A dict mapping stage names to the list of
+                             stages they wait for.
+        :returns: None
+        """
+        self._stages = list(stages)
+        self._workers = workers
+        self._dependencies = dict(
+            (s, [d for d in dependencies.get(s, []) if d in stages])
+            for s in stages)
+
+    def run(self, fn):
+        """
+        Call `fn` with each stage name once its dependencies are done.  A
+        stage is not run when one of its dependencies failed.
+
+        :param fn: A callable taking a stage name.
+        :returns: None
+        :raises: StageError when a stage failed
+        """
+        pending = list(self._stages)
+        running = set()
+        done = set()
+        failures = {}
+        skipped = set()
+        results = Queue.Queue()
+        pool = mp_pool.ThreadPool(self._workers)
+        try:
+            while pending or running:
+                for stage in list(pending):
+                    deps = self._dependencies[stage]
+                    if any(d in failures or d in skipped for d in deps):
+                        pending.remove(stage)
+                        skipped.add(stage)
+                    elif all(d in done for d in deps):
+                        pending.remove(stage)
+                        running.add(stage)
+                        pool.apply_async(self._call, (fn, stage, results))
+                if not running:
+                    break
+                stage, error = results.get()
+                running.remove(stage)
+                if error is None:
+                    done.add(stage)
+                else:
+                    failures[stage] = error
+        finally:
+            pool.close()
+            pool.join()
+        skipped.update(pending)
+        if failures:
+            raise StageError(failures, skipped)
+
+    def _call(self, fn, stage, results):
+        try:
+            fn(stage)
+            results.put((stage, None))
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            results.put((stage, '{0}: {1}'.format(type(e).__name__, e)))
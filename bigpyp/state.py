@@ -0,0 +1,315 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import gzip
+import json
+import re
+import threading
+
+from multiprocessing import pool as mp_pool
+
+import cert
+import utils
+
+
+class DeviceState(object):
+    """
+    A snapshot of the device objects bigpyp manages.  Each object type is
+    read with one bulk call the first time it is needed, and answered from
+    memory afterwards.  Given an AsyncBIGIP, object types are read at the
+    same time, and the bulk getters of pools, virtual servers and
+    certificates are split into chunks sent at once.
+    """
+
+    MANAGEMENT_MODE_TYPE = 'MANAGEMENT_MODE_DEFAULT'
+    # The per-year domain certificates a plan imports, '/Common/<year>-<dns>'.
+    DOMAIN_CERT_RE = re.compile(r'^/Common/\d{4}-[^/]+$')
+    FORMAT_VERSION = 3
+    KEYS = ['certificates',
+            'keys',
+            'http_profiles',
+            'http_xff_modes',
+            'http_default_profiles',
+            'ssl_profiles',
+            'chain_files',
+            'tcp_profiles',
+            'tcp_keep_alive_intervals',
+            'rules',
+            'pools',
+            'pool_monitors',
+            'pool_members',
+            'virtual_servers',
+            'snat_pools']
+
+    def __init__(self, bigip=None, data=None, client=None):
+        """
+        Construct a DeviceState with the supplied args.
+
+        :param bigip: An instance of the BigIP object, or None when the
+                      state is built entirely from `data`.
+        :param data: A dict of already known object types, keyed by the
+                     names in `KEYS`.
+        :param client: An AsyncBIGIP of the same device to read through,
+                       or None to read one call at a time.
+        :returns: None
+        """
+        self._pc = bigip.pc if bigip else None
+        self._client = client
+        self._data = dict(data or {})
+        self._lock = threading.RLock()
+        self._locks = dict((key, threading.RLock()) for key in self.KEYS)
+
+    def load(self):
+        """
+        Read every object type from the device up front.
+
+        :returns: DeviceState
+        """
+        if self._client is None:
+            for key in self.KEYS:
+                getattr(self, key)
+            return self
+        # A type waits on the types it is read from under their own lock,
+        # while its calls queue on the client.
+        pool = mp_pool.ThreadPool(len(self.KEYS))
+        try:
+            pool.map(self._get, self.KEYS, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        return self
+
+    def save(self, path, **meta):
+        """
+        Read every object type, and write them to `path` as gzipped JSON.
+
+        :param path: A string containing the file to write.
+        :param meta: Extra values recorded with the snapshot, e.g. host.
+        :returns: None
+        """
+        self.load()
+        doc = {'format': self.FORMAT_VERSION,
+               'meta': meta,
+               'state': self._data}
+        with gzip.open(path, 'wb') as file:
+            json.dump(doc, file, sort_keys=True, separators=(',', ':'))
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Create and return a DeviceState from a file written by `save`.  It
+        never talks to a device.
+
+        :param path: A string containing the file to read.
+        :returns: DeviceState
+        """
+        with gzip.open(path, 'rb') as file:
+            doc = json.load(file)
+        if doc.get('format') != cls.FORMAT_VERSION:
+            msg = '{0} is not a version {1} snapshot'.format(
+                path, cls.FORMAT_VERSION)
+            raise ValueError(msg)
+        missing = set(cls.KEYS) - set(doc['state'])
+        if missing:
+            msg = '{0} lacks {1}'.format(path, ', '.join(sorted(missing)))
+            raise ValueError(msg)
+        return cls(data=doc['state'])
+
+    def _get(self, key):
+        # Without a client, every type shares one lock, so no two calls
+        # share the BigIP's suds clients at once.
+        lock = self._lock if self._client is None else self._locks[key]
+        with lock:
+            if key not in self._data:
+                loader = getattr(self, '_load_{0}'.format(key))
+                self._data[key] = loader()
+            return self._data[key]
+
+    def _call(self, wsdl, method, **kwargs):
+        module_name, interface_name = wsdl.split('.')
+        root = self._pc if self._client is None else self._client
+        interface = getattr(getattr(root, module_name), interface_name)
+        result = getattr(interface, method)(**kwargs)
+        if self._client is not None:
+            return result.result()
+        return result
+
+    def _call_chunked(self, wsdl, method, param, names, **kwargs):
+        if self._client is not None:
+            return self._client.map(wsdl, method, param, names, **kwargs)
+        kwargs[param] = names
+        return self._call(wsdl, method, **kwargs)
+
+    @property
+    def certificates(self):
+        return self._get('certificates')
+
+    @property
+    def keys(self):
+        return self._get('keys')
+
+    @property
+    def http_profiles(self):
+        return self._get('http_profiles')
+
+    @property
+    def http_xff_modes(self):
+        return self._get('http_xff_modes')
+
+    @property
+    def http_default_profiles(self):
+        return self._get('http_default_profiles')
+
+    @property
+    def ssl_profiles(self):
+        return self._get('ssl_profiles')
+
+    @property
+    def chain_files(self):
+        return self._get('chain_files')
+
+    @property
+    def tcp_profiles(self):
+        return self._get('tcp_profiles')
+
+    @property
+    def tcp_keep_alive_intervals(self):
+        return self._get('tcp_keep_alive_intervals')
+
+    @property
+    def rules(self):
+        return self._get('rules')
+
+    @property
+    def pools(self):
+        return self._get('pools')
+
+    @property
+    def pool_monitors(self):
+        return self._get('pool_monitors')
+
+    @property
+    def pool_members(self):
+        return self._get('pool_members')
+
+    @property
+    def virtual_servers(self):
+        return self._get('virtual_servers')
+
+    @property
+    def snat_pools(self):
+        return self._get('snat_pools')
+
+    def _load_certificates(self):
+        wsdl = 'Management.KeyCertificate'
+        mode = self.MANAGEMENT_MODE_TYPE
+        cert_list = self._call(wsdl, 'get_certificate_list', mode=mode)
+        cert_ids = [c.certificate.cert_info['id'] for c in cert_list]
+        # Only export the certificates a plan can reference; a device also
+        # holds CA bundles and certificates bigpyp does not manage.
+        bundle = cert.Cert.INTERMEDIATE_BUNDLE
+        cert_ids = [i for i in cert_ids
+                    if i == bundle or self.DOMAIN_CERT_RE.match(i)]
+        if not cert_ids:
+            return {}
+        result = self._call_chunked(wsdl, 'certificate_export_to_pem',
+                                    'cert_ids', cert_ids, mode=mode)
+        return dict(zip(cert_ids, [utils.pem_fingerprint(p)
+                                   for p in result]))
+
+    def _load_keys(self):
+        key_list = self._call('Management.KeyCertificate', 'get_key_list',
+                              mode=self.MANAGEMENT_MODE_TYPE)
+        return [k.key_info['id'] for k in key_list]
+
+    def _load_http_profiles(self):
+        return list(self._call('LocalLB.ProfileHttp', 'get_list'))
+
+    def _load_http_xff_modes(self):
+        profiles = self.http_profiles
+        if not profiles:
+            return {}
+        result = self._call('LocalLB.ProfileHttp',
+                            'get_insert_xforwarded_for_header_mode',
+                            profile_names=profiles)
+        return dict(zip(profiles, [r.value for r in result]))
+
+    def _load_http_default_profiles(self):
+        profiles = self.http_profiles
+        if not profiles:
+            return {}
+        result = self._call('LocalLB.ProfileHttp', 'get_default_profile',
+                            profile_names=profiles)
+        return dict(zip(profiles, result))
+
+    def _load_ssl_profiles(self):
+        return list(self._call('LocalLB.ProfileClientSSL', 'get_list'))
+
+    def _load_chain_files(self):
+        profiles = self.ssl_profiles
+        if not profiles:
+            return {}
+        result = self._call('LocalLB.ProfileClientSSL', 'get_chain_file',
+                            profile_names=profiles)
+        return dict(zip(profiles, [r.value for r in result]))
+
+    def _load_tcp_profiles(self):
+        return list(self._call('LocalLB.ProfileTCP', 'get_list'))
+
+    def _load_tcp_keep_alive_intervals(self):
+        profiles = self.tcp_profiles
+        if not profiles:
+            return {}
+        result = self._call('LocalLB.ProfileTCP', 'get_keep_alive_interval',
+                            profile_names=profiles)
+        return dict(zip(profiles, [r.value for r in result]))
+
+    def _load_rules(self):
+        return list(self._call('LocalLB.Rule', 'get_list'))
+
+    def _load_pools(self):
+        return list(self._call('LocalLB.Pool', 'get_list'))
+
+    def _load_pool_monitors(self):
+        pools = self.pools
+        if not pools:
+            return {}
+        result = self._call_chunked('LocalLB.Pool', 'get_monitor_association',
+                                    'pool_names', pools)
+        return dict((r.pool_name,
+                     list(r.monitor_rule.monitor_templates or []))
+                    for r in result)
+
+    def _load_pool_members(self):
+        pools = self.pools
+        if not pools:
+            return {}
+        result = self._call_chunked('LocalLB.Pool', 'get_member_v2',
+                                    'pool_names', pools)
+        return dict((pool, [[m.address.replace('/Common/', ''), m.port]
+                            for m in members])
+                    for pool, members in zip(pools, result))
+
+    def _load_virtual_servers(self):
+        return list(self._call('LocalLB.VirtualServer', 'get_list'))
+
+    def _load_snat_pools(self):
+        virtual_servers = self.virtual_servers
+        if not virtual_servers:
+            return {}
+        result = self._call_chunked('LocalLB.VirtualServer', 'get_snat_pool',
+                                    'virtual_servers', virtual_servers)
+        return dict(zip(virtual_servers, result))
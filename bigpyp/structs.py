@@ -0,0 +1,83 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import new
+
+from suds import sudsobject
+
+
+class StructFactory(object):
+    """
+    Builds the structs of one iControl interface.  suds resolves a type
+    against the schema on every `typefactory.create`; here each type is
+    created once, and every instance is a shallow copy of that prototype,
+    sharing its metadata.
+    """
+
+    def __init__(self, interface):
+        """
+        Construct a StructFactory with the supplied args.
+
+        :param interface: The iControl interface whose `typefactory` builds
+                          the prototypes, e.g. `bigip.pc.LocalLB.Pool`.
+        :returns: None
+        """
+        self._interface = interface
+        self._prototypes = {}
+
+    def create(self, type_name, **values):
+        """
+        Create and return a struct of type `type_name`.
+
+        :param type_name: A string containing the type, e.g.
+                          'Common.AddressPort'.
+        :param values: Values of the struct's fields.
+        :returns: suds Object
+        """
+        prototype = self._prototypes.get(type_name)
+        if prototype is None:
+            prototype = self._interface.typefactory.create(type_name)
+            if not isinstance(prototype, sudsobject.Object):
+                # Not something we know how to copy; build it every time.
+                result = prototype
+            else:
+                self._prototypes[type_name] = prototype
+                result = clone(prototype)
+        else:
+            result = clone(prototype)
+        for key, value in values.iteritems():
+            setattr(result, key, value)
+        return result
+
+
+def clone(sobject):
+    """
+    Return a copy of a suds object, without running the constructors of it
+    or of its children.
+
+    :param sobject: A suds Object.
+    :returns: suds Object
+    """
+    attrs = dict(sobject.__dict__)
+    attrs['__keylist__'] = list(sobject.__keylist__)
+    for key in sobject.__keylist__:
+        value = attrs.get(key)
+        if isinstance(value, sudsobject.Object):
+            attrs[key] = clone(value)
+        elif isinstance(value, list):
+            attrs[key] = [clone(v) if isinstance(v, sudsobject.Object) else v
+                          for v in value]
+    return new.instance(sobject.__class__, attrs)
@@ -0,0 +1,252 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import httplib
+import logging
+import random
+import re
+import socket
+import threading
+import time
+import weakref
+
+from suds import WebFault
+from suds import transport
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_RETRIES = 3
+READ_PREFIXES = ('get_', 'query', 'certificate_export_to_pem')
+
+# Faults mcpd answers with when it is too busy to take a call.
+RE_OVERLOAD = re.compile(r'timed out|timeout|busy|try again|unavailable|'
+                         r'too many', re.IGNORECASE)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def device_limiter(host, maximum, metrics=None):
+    """
+    Return the limiter of the calls in flight to `host`, shared by every
+    client in this process asking for the same maximum.
+
+    :param host: A string containing the device host.
+    :param maximum: An int of the most calls in flight to the device.
+    :param metrics: A Metrics object the limit is reported to, besides
+                    those of the limiter's other callers, or None.
+    :returns: Limiter
+    """
+    key = (host, maximum)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = Limiter(maximum)
+    if metrics is not None:
+        limiter.attach(metrics)
+    return limiter
+
+
+def is_read(name):
+    """
+    Determine if a method only reads, and is safe to send again.
+
+    :param name: A string containing the method name.
+    :returns: boolean
+    """
+    return name.startswith(READ_PREFIXES)
+
+
+def is_overload(error):
+    """
+    Determine if an error means the device is too busy, rather than that
+    the call itself is wrong.
+
+    :param error: The exception a call raised.
+    :returns: boolean
+    """
+    if isinstance(error, (socket.error, httplib.HTTPException)):
+        return True
+    if isinstance(error, transport.TransportError):
+        return error.httpcode >= 500
+    if isinstance(error, WebFault):
+        return bool(RE_OVERLOAD.search(str(error)))
+    return False
+
+
+class Limiter(object):
+    """
+    An additive-increase, multiplicative-decrease limit on the calls in
+    flight to a device.  Each call answered in time raises the limit by
+    1/limit, so by about one per round of calls.  An overload error, or a
+    call slower than `slow`, halves it, at most once per `slow` seconds so
+    one burst of failures halves it once.
+    """
+
+    DEFAULT_INITIAL = 4
+    DEFAULT_SLOW = 5.0  # seconds
+    DECREASE = 0.5
+
+    def __init__(self, maximum, minimum=1, initial=DEFAULT_INITIAL,
+                 slow=DEFAULT_SLOW, metrics=None, clock=time.time):
+        """
+        Construct a Limiter with the supplied args.
+
+        :param maximum: An int of the highest limit.
+        :param minimum: An int of the lowest limit.
+        :param initial: An int of the limit to start from.
+        :param slow: A float of seconds beyond which a call counts as a
+                     sign of overload.
+        :param metrics: A Metrics object the limit is reported to, as the
+                        `concurrency_limit` gauge, or None.  More can be
+                        attached later.
+        :param clock: A callable returning the time in seconds.
+        :returns: None
+        """
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.inflight = 0
+        self._slow = slow
+        # Held weakly, so the Metrics of finished runs sharing the limiter
+        # are not kept alive.
+        self._metrics = weakref.WeakSet()
+        self._clock = clock
+        self._decreased = None
+        self._cond = threading.Condition()
+        if metrics is not None:
+            self.attach(metrics)
+
+    def attach(self, metrics):
+        """
+        Report the limit to another Metrics object too, from now on.
+
+        :param metrics: A Metrics object.
+        :returns: None
+        """
+        with self._cond:
+            self._metrics.add(metrics)
+            metrics.set_gauge('concurrency_limit', int(self.limit))
+
+    def acquire(self):
+        """
+        Wait until a call fits under the limit, and count it in flight.
+
+        :returns: None
+        """
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, seconds, overloaded=False):
+        """
+        Count a call out of flight, and adjust the limit from it.
+
+        :param seconds: A float of seconds the call took.
+        :param overloaded: A boolean, True when it failed because the
+                           device is too busy.
+        :returns: None
+        """
+        with self._cond:
+            self.inflight -= 1
+            if overloaded or seconds > self._slow:
+                now = self._clock()
+                last = self._decreased
+                if last is None or now - last >= self._slow:
+                    self._decreased = now
+                    self.limit = max(self.minimum, self.limit * self.DECREASE)
+                    self._report()
+            elif self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self._report()
+            self._cond.notify_all()
+
+    def _report(self):
+        for metrics in list(self._metrics):
+            metrics.set_gauge('concurrency_limit', int(self.limit))
+
+
+class Throttle(object):
+    """
+    Sends every iControl call under a device's Limiter, and retries reads
+    the device was too busy to answer after a jittered, exponential
+    backoff.
+    """
+
+    DEFAULT_BACKOFF = 0.5  # seconds
+    MAX_BACKOFF = 30.0  # seconds
+
+    def __init__(self, limiter, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, sleep=time.sleep):
+        """
+        Construct a Throttle with the supplied args.
+
+        :param limiter: The Limiter of the device.
+        :param retries: An int of the most times a read is sent again.
+        :param backoff: A float of seconds the first retry waits at most.
+        :param sleep: A callable taking seconds to wait.
+        :returns: None
+        """
+        self.limiter = limiter
+        self._retries = retries
+        self._backoff = backoff
+        self._sleep = sleep
+
+    def wrap(self, wsdl, name, method):
+        """
+        Return `method` sent under the limiter, and retried when it is a
+        read.
+
+        :param wsdl: A string containing the interface, e.g. 'LocalLB.Pool'.
+        :param name: A string containing the method name.
+        :param method: The callable to throttle.
+        :returns: callable
+        """
+        retries = self._retries if is_read(name) else 0
+
+        def call(*args, **kwargs):
+            attempt = 0
+            while True:
+                try:
+                    return self._send(method, args, kwargs)
+                except Exception as e:
+                    if attempt >= retries or not is_overload(e):
+                        raise
+                    delay = self._delay(attempt)
+                    LOG.warning('%s.%s failed (%s), retrying in %.2fs',
+                                wsdl, name, e, delay)
+                    self._sleep(delay)
+                    attempt += 1
+        return call
+
+    def _send(self, method, args, kwargs):
+        self.limiter.acquire()
+        start = time.time()
+        overloaded = False
+        try:
+            return method(*args, **kwargs)
+        except Exception as e:
+            overloaded = is_overload(e)
+            raise
+        finally:
+            self.limiter.release(time.time() - start, overloaded)
+
+    def _delay(self, attempt):
+        # Full jitter: clients backing off together spread out over the
+        # whole window instead of retrying in step.
+        return random.uniform(0, min(self.MAX_BACKOFF,
+                                     self._backoff * 2 ** attempt))
@@ -0,0 +1,80 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+
+import utils
+
+LOG = logging.getLogger(__name__)
+
+MODES = ('stage', 'run')
+# Key and certificate imports are file operations, which the device does
+# not queue in a transaction.
+EXCLUDED_STAGES = ('cert',)
+
+
+class Transaction(object):
+    """
+    A context manager sending the writes of a BigIP in one iControl
+    transaction.  The device queues them until the block exits, then
+    commits them as one unit; when the block raises, they are rolled back.
+    Reads are answered at once, from the configuration before the
+    transaction.
+    """
+
+    DEFAULT_TIMEOUT = 600  # seconds
+
+    def __init__(self, bigip, timeout=DEFAULT_TIMEOUT):
+        """
+        Construct a Transaction with the supplied args.
+
+        :param bigip: An instance of the BigIP object.  Its clones made
+                      inside the block send in the same transaction.
+        :param timeout: An int of seconds the device keeps the transaction
+                        open.
+        :returns: None
+        """
+        self._bigip = bigip
+        self._timeout = timeout
+
+    def __enter__(self):
+        session = self._bigip.pc.System.Session
+        self._bigip.set_session(session.get_session_identifier())
+        try:
+            session.set_transaction_timeout(timeout=self._timeout)
+            session.start_transaction()
+        except Exception:
+            self._bigip.set_session(None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        session = self._bigip.pc.System.Session
+        try:
+            if exc_type is None:
+                session.submit_transaction()
+                utils.print_green('  - transaction committed')
+            else:
+                try:
+                    session.rollback_transaction()
+                except Exception as e:
+                    # The device drops an expired transaction on its own;
+                    # the original error is the one worth raising.
+                    LOG.warning('rollback failed: %s', e)
+                utils.print_red('  - transaction rolled back')
+        finally:
+            self._bigip.set_session(None)
+        return False
@@ -0,0 +1,275 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import base64
+import copy
+import errno
+import gzip
+import httplib
+import itertools
+import logging
+import socket
+import StringIO
+import threading
+import urllib2
+import urlparse
+
+from suds import transport
+
+LOG = logging.getLogger(__name__)
+
+# Errors sending over a connection the device closed while it was idle.
+# The device never read the request, so it is safe to send again.
+STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE)
+
+
+class StaleConnection(Exception):
+    """
+    Raised by an exchange over a connection the device had already closed,
+    before any of the request reached it.  `error` is the original error.
+    """
+
+    def __init__(self, error):
+        Exception.__init__(self, str(error))
+        self.error = error
+
+
+class PooledConnection(object):
+    """
+    A persistent HTTP(S) connection, counting the requests sent over it.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, connection):
+        self.id = next(self._ids)
+        self.connection = connection
+        self.requests = 0
+
+
+class ConnectionPool(object):
+    """
+    The idle connections of every host, shared by the transports of all
+    suds clients talking to a device.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+
+class KeepAliveTransport(transport.Transport):
+    """
+    A suds transport which sends every iControl call over a pool of
+    persistent connections to the device, instead of a new connection (and
+    TLS handshake) per call.  Credentials are sent up front with every
+    request, so no call waits on a 401 challenge.
+    """
+
+    DEFAULT_POOL_SIZE = 4
+    DEFAULT_TIMEOUT = 90
+
+    def __init__(self, username, password, pool_size=DEFAULT_POOL_SIZE,
+                 compress=False, timeout=DEFAULT_TIMEOUT, context=None,
+                 pool=None):
+        """
+        Construct a KeepAliveTransport with the supplied args.
+
+        :param username: A string containing the username to use.
+        :param password: A string containing the password to use.
+        :param pool_size: An int of the most idle connections kept open per
+                          host.
+        :param compress: A boolean toggling gzip of request and response
+                         bodies.
+        :param timeout: An int of seconds to wait on the device.
+        :param context: An ssl.SSLContext for HTTPS connections.
+        :param pool: A ConnectionPool to share, a new one when None.
+        :returns: None
+        """
+        transport.Transport.__init__(self)
+        credentials = '{0}:{1}'.format(username, password)
+        self._authorization = 'Basic {0}'.format(
+            base64.b64encode(credentials))
+        self._pool = pool or ConnectionPool(pool_size)
+        self._use_gzip = compress
+        self._timeout = timeout
+        self._context = context
+
+    @property
+    def opened(self):
+        return self._pool.opened
+
+    @property
+    def reused(self):
+        return self._pool.reused
+
+    def share(self):
+        """
+        Return a transport for another suds client, sending over the same
+        connections.  suds ties a transport to the one client using it.
+
+        :returns: KeepAliveTransport
+        """
+        t = copy.copy(self)
+        transport.Transport.__init__(t)
+        return t
+
+    def open(self, request):
+        if not request.url.startswith('http'):
+            return urllib2.urlopen(request.url)
+        code, headers, body = self._request('GET', request.url, None,
+                                            request.headers)
+        if code >= 300:
+            raise transport.TransportError(body, code,
+                                           StringIO.StringIO(body))
+        return StringIO.StringIO(body)
+
+    def send(self, request):
+        code, headers, body = self._request('POST', request.url,
+                                            request.message,
+                                            request.headers)
+        if code in (202, 204):
+            return None
+        if code >= 300:
+            raise transport.TransportError(body, code,
+                                           StringIO.StringIO(body))
+        return transport.Reply(code, headers, body)
+
+    def stats(self):
+        """
+        Return the reuse counter of every idle connection.
+
+        :returns: list of dicts with `id`, `host` and `requests`
+        """
+        with self._pool.lock:
+            return [{'id': c.id, 'host': key[1], 'requests': c.requests}
+                    for key, conns in self._pool.idle.items() for c in conns]
+
+    def close(self):
+        """
+        Close every idle connection.
+
+        :returns: None
+        """
+        with self._pool.lock:
+            idle, self._pool.idle = self._pool.idle, {}
+        for conns in idle.values():
+            for c in conns:
+                self._discard(c)
+
+    def _request(self, method, url, body, headers):
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        headers = dict(headers or {})
+        headers['Authorization'] = self._authorization
+        headers['Connection'] = 'keep-alive'
+        if self._use_gzip:
+            headers['Accept-Encoding'] = 'gzip'
+            if body:
+                body = self._compress(body)
+                headers['Content-Encoding'] = 'gzip'
+
+        c, reused = self._acquire(key)
+        try:
+            response = self._exchange(c, method, path, body, headers)
+        except StaleConnection as e:
+            self._discard(c)
+            if not reused:
+                raise e.error
+            # The device may close an idle connection at any time; retry
+            # once on a fresh one.  Any other error may come after the
+            # device acted on the request, which must not run twice.
+            c, reused = self._acquire(key, fresh=True)
+            try:
+                response = self._exchange(c, method, path, body, headers)
+            except StaleConnection as e:
+                self._discard(c)
+                raise e.error
+            except Exception:
+                self._discard(c)
+                raise
+        except Exception:
+            self._discard(c)
+            raise
+
+        data = response.read()
+        if response.getheader('content-encoding', '') == 'gzip':
+            data = gzip.GzipFile(fileobj=StringIO.StringIO(data)).read()
+        if response.will_close:
+            self._discard(c)
+        else:
+            self._release(key, c)
+        return response.status, dict(response.getheaders()), data
+
+    def _exchange(self, c, method, path, body, headers):
+        try:
+            c.connection.request(method, path, body, headers)
+        except socket.timeout:
+            raise
+        except socket.error as e:
+            if e.errno in STALE_ERRNOS:
+                raise StaleConnection(e)
+            raise
+        c.requests += 1
+        try:
+            return c.connection.getresponse()
+        except httplib.BadStatusLine as e:
+            # The connection closed without a byte of response, as an idle
+            # connection does when the device drops it.
+            if not e.line or e.line == "''" or \
+                    e.line.startswith('No status line'):
+                raise StaleConnection(e)
+            raise
+
+    def _acquire(self, key, fresh=False):
+        pool = self._pool
+        with pool.lock:
+            idle = pool.idle.get(key)
+            if idle and not fresh:
+                pool.reused += 1
+                return idle.pop(), True
+            pool.opened += 1
+        scheme, netloc = key
+        if scheme == 'https':
+            conn = httplib.HTTPSConnection(netloc, timeout=self._timeout,
+                                           context=self._context)
+        else:
+            conn = httplib.HTTPConnection(netloc, timeout=self._timeout)
+        return PooledConnection(conn), False
+
+    def _release(self, key, c):
+        pool = self._pool
+        with pool.lock:
+            idle = pool.idle.setdefault(key, [])
+            if len(idle) < pool.size:
+                idle.append(c)
+                return
+        self._discard(c)
+
+    def _discard(self, c):
+        LOG.debug('closing connection %d after %d request(s)',
+                  c.id, c.requests)
+        c.connection.close()
+
+    def _compress(self, data):
+        buf = StringIO.StringIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as file:
+            file.write(data)
+        return buf.getvalue()
@@ -14,11 +14,17 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 
+import base64
+import collections
+import hashlib
+import os
 import re
 
 from termcolor import colored
 
 RE_INTERNAL_DOMAIN = re.compile(r'\.int\..*\.com')
+RE_PEM_CERTIFICATE = re.compile(r'-----BEGIN CERTIFICATE-----(.*?)'
+                                r'-----END CERTIFICATE-----', re.DOTALL)
 
 
 def print_green(msg):
@@ -53,3 +59,71 @@ def pool_name(domain, port):
 # TODO(retr0h): This needs to be handled bit cleaner.
 def ssl_profile_name(domain):
     return '/Common/%(domain)s_pr' % locals()
+
+
+def pem_fingerprint(data):
+    """
+    Return the SHA-256 hex digest of the DER certificates in a PEM string,
+    so the same certificates fingerprint the same regardless of line
+    endings or the text around them.  A bundle hashes all of its
+    certificates, in order.
+    """
+    blocks = RE_PEM_CERTIFICATE.findall(data)
+    if not blocks:
+        return hashlib.sha256(data.strip()).hexdigest()
+    digest = hashlib.sha256()
+    for block in blocks:
+        digest.update(base64.b64decode(''.join(block.split())))
+    return digest.hexdigest()
+
+
+def pem_file_fingerprint(path):
+    """
+    Return the `pem_fingerprint` of a local PEM file, or None when the file
+    does not exist.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as file:
+        return pem_fingerprint(file.read())
+
+
+def chunks(seq, size):
+    """
+    Yield successive slices of `seq` holding at most `size` elements.
+    """
+    for i in xrange(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def apply_actions(stage, actions, batch_size=1):
+    """
+    Apply plan actions through the `_<op>` methods of `stage`.  Actions are
+    grouped by op, in the order each op first appears, and the ones still
+    to be applied are handed over `batch_size` at a time.
+    """
+    ops = collections.OrderedDict()
+    for action in actions:
+        ops.setdefault(action.op, []).append(action)
+    for op, op_actions in ops.iteritems():
+        handler = getattr(stage, '_{0}'.format(op))
+        skipped = [a for a in op_actions if a.skip]
+        if skipped:
+            handler(skipped)
+        pending = [a for a in op_actions if not a.skip]
+        for chunk in chunks(pending, batch_size):
+            handler(chunk)
+
+
+def report_skipped(actions, msg):
+    """
+    Print `msg` for each action the device already matches, and return the
+    actions left to apply.
+    """
+    pending = []
+    for action in actions:
+        if action.skip:
+            print_yellow(msg.format(name=action.name, **action.args))
+        else:
+            pending.append(action)
+    return pending
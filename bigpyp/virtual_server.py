@@ -14,6 +14,7 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 
+import structs
 import utils
 
 import profile
@@ -29,112 +30,117 @@ class VirtualServer(object):
     WILDMASKS = '255.255.255.255'
     SNAT_POOL = '/Common/fake-backend-snat'
 
-    def __init__(self, bigip, vips_dict):
+    def __init__(self, bigip, plan, batch_size=1):
         """
         Construct a VirtualServer with the supplied args.
 
         :param bigip: An instance of the BigIP object.
-        :param vips_dict: A dict containing VIP configuration.
+        :param plan: An instance of the Plan object.
+        :param batch_size: An int of the most virtual servers sent per
+                           iControl call.
         :returns: None
         """
         self._virtual_server = bigip.pc.LocalLB.VirtualServer
-        self._vips_dict = vips_dict
+        self._structs = structs.StructFactory(self._virtual_server)
+        self._plan = plan
+        self._batch_size = batch_size
 
     def create(self):
         print 'VirtualServer'
-        self._create_virtual_servers()
-
-    def _create_virtual_servers(self):
-        for vipname, vip_dict in self._vips_dict['load_balancing'].iteritems():
-            name = '/Common/%(dns)s_%(front_port)s' % vip_dict
-            if vip_dict['members']:  # skip unconfigured members
-                self._create_virtual_server(name, vip_dict)
-                self._set_snat_pool(name)
-
-    def _create_virtual_server(self, name, vip_dict):
-        virtual_servers = self._virtual_server.get_list()
-        domain = vip_dict['dns']
-        if name in virtual_servers:
-            msg = '  - {0} already exists'.format(name)
-            utils.print_yellow(msg)
-        else:
-            vss = self._get_virtual_server_definition(name,
-                                                      vip_dict['ip'],
-                                                      vip_dict['front_port'],
-                                                      self.PROTOCOL_TYPE)
-            pool = utils.pool_name(domain, vip_dict['back_port'])
-            vsrs = self._get_virtual_server_resource(pool)
-            vsps = self._get_virtual_server_profile(vip_dict['monitor'],
-                                                    domain)
-
-            self._virtual_server.create(definitions=vss,
-                                        wildmasks=[self.WILDMASKS],
-                                        resources=vsrs,
-                                        profiles=[vsps])
-            msg = '  - {0} created'.format(name)
+        utils.apply_actions(self,
+                            self._plan.virtual_server_actions(),
+                            self._batch_size)
+
+    def _create_virtual_server(self, actions):
+        pending = utils.report_skipped(actions, '  - {name} already exists')
+        if not pending:
+            return
+        vsds = []
+        vsrs = []
+        vsps = []
+        for action in pending:
+            vip = action.args
+            vsds.append(self._get_virtual_server_definition(
+                action.name, vip['address'], vip['port'],
+                self.PROTOCOL_TYPE))
+            vsrs.append(self._get_virtual_server_resource(vip['pool']))
+            vsps.append(self._get_virtual_server_profile(vip['monitor'],
+                                                         vip['domain'],
+                                                         vip['ssl_profile']))
+
+        vss = self._structs.create('Common.VirtualServerSequence',
+                                   item=vsds)
+        vsrss = self._structs.create(
+            'LocalLB.VirtualServer.VirtualServerResourceSequence',
+            item=vsrs)
+
+        self._virtual_server.create(definitions=vss,
+                                    wildmasks=[self.WILDMASKS] * len(pending),
+                                    resources=vsrss,
+                                    profiles=vsps)
+        for action in pending:
+            msg = '  - {0} created'.format(action.name)
             utils.print_green(msg)
 
-    def _set_snat_pool(self, name):
-        result = self._virtual_server.get_snat_pool(virtual_servers=[name])
-        if result[0] == self.SNAT_POOL:
-            msg = '  - snat pool already exists for {0}'.format(name)
-            utils.print_yellow(msg)
-        else:
-            self._virtual_server.set_snat_pool(virtual_servers=[name],
-                                               snatpools=[self.SNAT_POOL])
-            msg = '  - added snat pool for {0}'.format(name)
+    def _set_snat_pool(self, actions):
+        msg = '  - snat pool already exists for {name}'
+        pending = utils.report_skipped(actions, msg)
+        if not pending:
+            return
+        self._virtual_server.set_snat_pool(
+            virtual_servers=[a.name for a in pending],
+            snatpools=[a.args['snat_pool'] for a in pending])
+        for action in pending:
+            msg = '  - added snat pool for {0}'.format(action.name)
             utils.print_green(msg)
 
     def _get_virtual_server_definition(self, name, address, port, protocol):
-        struct = 'Common.VirtualServerDefinition'
-        vsd = self._virtual_server.typefactory.create(struct)
-        vsd.name = name
-        vsd.address = address
-        vsd.port = port
-        vsd.protocol = protocol
+        return self._structs.create('Common.VirtualServerDefinition',
+                                    name=name,
+                                    address=address,
+                                    port=port,
+                                    protocol=protocol)
 
-        struct = 'Common.VirtualServerSequence'
-        vss = self._virtual_server.typefactory.create(struct)
-        vss.item = [vsd]
+    def _get_virtual_server_resource(self, pool):
+        return self._structs.create(
+            'LocalLB.VirtualServer.VirtualServerResource',
+            type=self.RESOURCE_TYPE,
+            default_pool_name=pool)
 
-        return vss
+    @classmethod
+    def profiles(cls, monitor, domain, ssl_profile):
+        """
+        Return the profiles a virtual server uses.
 
-    def _get_virtual_server_resource(self, pool):
-        struct = 'LocalLB.VirtualServer.VirtualServerResource'
-        vsr = self._virtual_server.typefactory.create(struct)
-        vsr.type = self.RESOURCE_TYPE
-        vsr.default_pool_name = pool
-
-        struct = 'LocalLB.VirtualServer.VirtualServerResourceSequence'
-        vsrs = self._virtual_server.typefactory.create(struct)
-        vsrs.item = [vsr]
-        return vsrs
-
-    def _get_virtual_server_profile(self, monitor, domain):
-        struct = 'LocalLB.VirtualServer.VirtualServerProfile'
+        :param monitor: A string containing the pool's monitor.
+        :param domain: A string containing the VIP's domain.
+        :param ssl_profile: A string containing the client SSL profile, or
+                            None.
+        :returns: list of (context, profile name) tuples
+        """
         profiles = []
         if monitor == 'tcp_half_open':
             if 'messaging' in domain:
-                vsp_tcp_ka = self._virtual_server.typefactory.create(struct)
-                vsp_tcp_ka.profile_context = 'PROFILE_CONTEXT_TYPE_ALL'
-                vsp_tcp_ka.profile_name = profile.TCPProfile.PROFILE_NAME
-                profiles.append(vsp_tcp_ka)
+                profiles.append(('PROFILE_CONTEXT_TYPE_ALL',
+                                 profile.TCPProfile.PROFILE_NAME))
         else:
-            vsp_tcp = self._virtual_server.typefactory.create(struct)
-            vsp_tcp.profile_context = 'PROFILE_CONTEXT_TYPE_ALL'
-            vsp_tcp.profile_name = '/Common/tcp'
-            profiles.append(vsp_tcp)
+            profiles.append(('PROFILE_CONTEXT_TYPE_ALL', '/Common/tcp'))
         if monitor == 'http':
-            vsp_xff = self._virtual_server.typefactory.create(struct)
-            vsp_xff.profile_context = 'PROFILE_CONTEXT_TYPE_ALL'
-            vsp_xff.profile_name = profile.HTTPProfile.PROFILE_NAME
-            profiles.append(vsp_xff)
-            if utils.public_domain(domain):
-                vsp_ssl = self._virtual_server.typefactory.create(struct)
-                vsp_ssl.profile_context = 'PROFILE_CONTEXT_TYPE_CLIENT'
-                vsp_ssl.profile_name = utils.ssl_profile_name(domain)
-                profiles.append(vsp_ssl)
-        struct = 'LocalLB.VirtualServer.VirtualServerProfileSequence'
-        vsps = self._virtual_server.typefactory.create(struct)
-        vsps.item = profiles
-        return vsps
+            profiles.append(('PROFILE_CONTEXT_TYPE_ALL',
+                             profile.HTTPProfile.PROFILE_NAME))
+            if ssl_profile:
+                profiles.append(('PROFILE_CONTEXT_TYPE_CLIENT', ssl_profile))
+        return profiles
+
+    def _get_virtual_server_profile(self, monitor, domain, ssl_profile):
+        profiles = [self._profile(context, name) for context, name in
+                    self.profiles(monitor, domain, ssl_profile)]
+        return self._structs.create(
+            'LocalLB.VirtualServer.VirtualServerProfileSequence',
+            item=profiles)
+
+    def _profile(self, context, name):
+        return self._structs.create(
+            'LocalLB.VirtualServer.VirtualServerProfile',
+            profile_context=context,
+            profile_name=name)
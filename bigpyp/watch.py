@@ -0,0 +1,153 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import hashlib
+import json
+import logging
+import time
+
+import catalog
+import ledger
+import state
+import utils
+
+LOG = logging.getLogger(__name__)
+
+# The device objects listed to tell which stages a device change touched.
+# Stages without any are reconciled when no listed stage changed.
+STAGE_KEYS = {'cert': ['keys'],
+              'profile': ['http_profiles', 'ssl_profiles', 'tcp_profiles'],
+              'system': [],
+              'rule': ['rules'],
+              'monitor': [],
+              'pool': ['pools'],
+              'virtual_server': ['virtual_servers']}
+
+
+class Watcher(object):
+    """
+    Keeps a device in line with a VIP catalog.  Every check costs one read
+    of the device's configuration generation, and a stat of the catalog's
+    files; only when one of them moved is anything applied.
+
+    A changed catalog is applied through the ledger, so only the VIPs that
+    changed are.  A device changed by someone else is compared with the
+    object lists of the last check, and only the stages whose lists
+    changed are reconciled; when none did, an object was edited in place,
+    and every stage is.
+    """
+
+    DEFAULT_INTERVAL = 10  # seconds
+
+    def __init__(self, bigip, path, stages, load, apply, zone_ledger,
+                 interval=DEFAULT_INTERVAL, sleep=time.sleep):
+        """
+        Construct a Watcher with the supplied args.
+
+        :param bigip: An instance of the BigIP object, kept connected.
+        :param path: A string containing the zone's catalog file or
+                     directory.
+        :param stages: A list of stage names, in apply order.
+        :param load: A callable returning the zone's VipCatalog.
+        :param apply: A callable taking a VipCatalog, a list of stage names,
+                      and a Ledger or None, which applies them.
+        :param zone_ledger: The Ledger of the zone on the device.
+        :param interval: An int of seconds between checks.
+        :param sleep: A callable taking seconds to wait.
+        :returns: None
+        """
+        self._bigip = bigip
+        self._path = path
+        self._stages = stages
+        self._load = load
+        self._apply = apply
+        self._ledger = zone_ledger
+        self._interval = interval
+        self._sleep = sleep
+        self._vips = None
+        self._files = None
+        self._generation = None
+        self._signatures = None
+
+    def run(self, checks=None):
+        """
+        Check the device and catalog every interval.  A failed check is
+        reported, and the next one applies everything again.
+
+        :param checks: An int of checks to run, or None to run forever.
+        :returns: None
+        """
+        count = 0
+        while checks is None or count < checks:
+            try:
+                self.check()
+            except Exception as e:
+                LOG.exception('check failed')
+                utils.print_red('Check failed: {0}'.format(e))
+                self._generation = None
+            count += 1
+            if checks is None or count < checks:
+                self._sleep(self._interval)
+
+    def check(self):
+        """
+        Apply what changed in the catalog or on the device since the last
+        check.
+
+        :returns: list of the stage names reconciled
+        """
+        files = catalog.file_stats(self._path)
+        generation = ledger.device_generation(self._bigip)
+        catalog_changed = files != self._files
+        # A device without a generation is reconciled on every check.
+        device_changed = generation is None or generation != self._generation
+        if not (catalog_changed or device_changed):
+            return []
+        vips = self._load() if catalog_changed else self._vips
+        if catalog_changed or self._generation is None or generation is None:
+            if catalog_changed and self._files is not None:
+                print 'Catalog changed'
+            stages = self._stages
+            self._apply(vips, stages, self._ledger)
+        else:
+            stages = self._changed_stages()
+            print 'Device changed: {0}'.format(', '.join(stages))
+            # The ledger still describes the catalog, which was applied
+            # before the device changed; only its generation moves.
+            self._apply(vips, stages, None)
+            self._ledger.refresh(self._bigip)
+        self._vips = vips
+        self._files = files
+        self._generation = self._ledger.generation
+        self._signatures = self._list_signatures()
+        return stages
+
+    def _changed_stages(self):
+        signatures = self._list_signatures()
+        stages = [stage for stage in self._stages
+                  if signatures.get(stage) != self._signatures.get(stage)]
+        return stages or self._stages
+
+    def _list_signatures(self):
+        device = state.DeviceState(self._bigip)
+        signatures = {}
+        for stage in self._stages:
+            keys = STAGE_KEYS[stage]
+            if keys:
+                lists = [sorted(getattr(device, key)) for key in keys]
+                signatures[stage] = hashlib.sha1(
+                    json.dumps(lists)).hexdigest()
+        return signatures
@@ -0,0 +1,206 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import contextlib
+import errno
+import fcntl
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import pycontrol.pycontrol as pc
+
+from suds import cache
+from suds import transport
+
+
+class WsdlCache(object):
+    """
+    A local copy of a device's WSDLs, keyed by host and TMOS version, kept
+    next to the suds object cache of the parsed documents.
+
+    Layout::
+
+      <directory>/<host>/current              last version seen on <host>
+      <directory>/<host>/<version>/*.wsdl     raw WSDL documents
+      <directory>/<host>/<version>/suds/      pickled suds definitions
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'),
+                                     '.bigpyp', 'wsdl')
+    DEFAULT_MAX_AGE = 30  # days
+    CURRENT = 'current'
+    LOCK = '.lock'
+    RE_UNSAFE = re.compile(r'[^\w.-]')
+
+    def __init__(self, host, directory=DEFAULT_DIRECTORY,
+                 max_age=DEFAULT_MAX_AGE, proto='https'):
+        """
+        Construct a WsdlCache with the supplied args.
+
+        :param host: A string containing the host the WSDLs belong to.
+        :param directory: A string containing the cache's base directory.
+        :param max_age: An int of days after which cached WSDLs are
+                        fetched again.
+        :param proto: A string containing the scheme of the host's
+                      management interface.
+        :returns: None
+        """
+        self._host = host
+        self._proto = proto
+        self._base = os.path.join(directory, self._safe(host))
+        self._max_age = max_age
+
+    def version(self):
+        """
+        Return the TMOS version last seen on the host, or None.
+
+        :returns: string
+        """
+        try:
+            with open(os.path.join(self._base, self.CURRENT), 'r') as file:
+                return file.read().strip() or None
+        except IOError:
+            return None
+
+    def path(self, version):
+        """
+        Return the directory holding the WSDLs of `version`.
+
+        :param version: A string containing the TMOS version.
+        :returns: string
+        """
+        return os.path.join(self._base, self._safe(version))
+
+    def is_fresh(self, version, wsdls):
+        """
+        Determine if every WSDL of `version` is cached and younger than the
+        maximum age.
+
+        :param version: A string containing the TMOS version.
+        :param wsdls: A list of WSDL names, e.g. 'LocalLB.Pool'.
+        :returns: boolean
+        """
+        oldest = time.time() - self._max_age * 86400
+        for wsdl in wsdls:
+            f = os.path.join(self.path(version), '{0}.wsdl'.format(wsdl))
+            if not os.path.isfile(f) or os.path.getmtime(f) < oldest:
+                return False
+        return True
+
+    def suds_cache(self, version):
+        """
+        Return the suds object cache for the parsed WSDLs of `version`.
+
+        :param version: A string containing the TMOS version.
+        :returns: suds.cache.ObjectCache
+        """
+        location = os.path.join(self.path(version), 'suds')
+        return cache.ObjectCache(location=location, days=self._max_age)
+
+    def stage(self):
+        """
+        Return a new directory to download WSDLs into before the version
+        they belong to is known.
+
+        :returns: string
+        """
+        self._makedirs(self._base)
+        return tempfile.mkdtemp(prefix='.stage-', dir=self._base)
+
+    def download(self, wsdl, path, t):
+        """
+        Fetch `wsdl` from the host's management interface into `path`.
+
+        :param wsdl: A string containing the WSDL name, e.g. 'LocalLB.Pool'.
+        :param path: A string containing the destination directory.
+        :param t: The suds transport to fetch over, carrying the
+                  credentials and SSL settings of the iControl calls.
+        :returns: None
+        """
+        url = '{0}://{1}{2}?WSDL={3}'.format(self._proto,
+                                             self._host,
+                                             pc.ICONTROL_URI,
+                                             wsdl)
+        data = t.open(transport.Request(url)).read()
+        self._makedirs(path)
+        # Clients loading the same interface at once each write their own
+        # file, and the last rename wins.
+        fd, tmp = tempfile.mkstemp(prefix='.{0}.'.format(wsdl), dir=path)
+        with os.fdopen(fd, 'w') as file:
+            file.write(data)
+        os.rename(tmp, os.path.join(path, '{0}.wsdl'.format(wsdl)))
+
+    def commit(self, staging, version, replace=False):
+        """
+        Move a staging directory into place as the WSDLs of `version`, and
+        record `version` as the host's current one.  When another process
+        already published WSDLs of `version`, the staged ones are moved in
+        among them, one file at a time, unless `replace` is set.
+
+        :param staging: A string containing a directory from `stage`.
+        :param version: A string containing the TMOS version.
+        :param replace: A boolean replacing every cached WSDL of
+                        `version`.
+        :returns: None
+        """
+        path = self.path(version)
+        with self._locked():
+            if not replace and os.path.isdir(path):
+                # Each rename replaces one file in one step, so readers
+                # never see a WSDL missing or half written.
+                for name in os.listdir(staging):
+                    os.rename(os.path.join(staging, name),
+                              os.path.join(path, name))
+                shutil.rmtree(staging)
+            else:
+                stale = None
+                if os.path.isdir(path):
+                    # Moved aside in one step, so the version directory
+                    # is never missing or half removed.
+                    stale = tempfile.mkdtemp(prefix='.stale-',
+                                             dir=self._base)
+                    os.rename(path, os.path.join(stale, 'wsdl'))
+                os.rename(staging, path)
+                if stale:
+                    shutil.rmtree(stale)
+            current = os.path.join(self._base, self.CURRENT)
+            with open(current + '.tmp', 'w') as file:
+                file.write(version)
+            os.rename(current + '.tmp', current)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # Serializes the processes sharing the cache of a host, e.g. fleet
+        # workers applying several zones to one device.
+        with open(os.path.join(self._base, self.LOCK), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _makedirs(self, path):
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _safe(self, name):
+        return self.RE_UNSAFE.sub('_', name)
@@ -0,0 +1,151 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import catalog
+from bigpyp import load_balancer
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, vips):
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        lines = ['load_balancing:']
+        for vip in vips:
+            lines.append('  {0}:'.format(vip))
+            lines.append('    dns: {0}.dpa1.attcompute.com'.format(vip))
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_load_file(self):
+        path = self._write('zone_vips.yml', ['foo', 'bar'])
+        result = catalog.load(path, None)
+        self.assertEqual(['bar', 'foo'], sorted(result['load_balancing']))
+        self.assertEqual('foo.dpa1.attcompute.com',
+                         result['load_balancing']['foo']['dns'])
+
+    def test_load_merges_directory_fragments(self):
+        self._write('zone_vips.d/a.yml', ['foo'])
+        self._write('zone_vips.d/b.yml', ['bar'])
+        path = os.path.join(self.directory, 'zone_vips.d')
+        result = catalog.load(path, None)
+        self.assertEqual(['bar', 'foo'], sorted(result['load_balancing']))
+
+    def test_load_raises_on_duplicate_vip(self):
+        self._write('zone_vips.d/a.yml', ['foo'])
+        self._write('zone_vips.d/b.yml', ['foo'])
+        path = os.path.join(self.directory, 'zone_vips.d')
+        with self.assertRaisesRegexp(ValueError, 'foo is defined in both'):
+            catalog.load(path, None)
+
+    def test_load_uses_cache_when_unchanged(self):
+        path = self._write('zone_vips.yml', ['foo'])
+        first = catalog.load(path, self.cache_dir)
+        with mock.patch('bigpyp.catalog.parse') as parse, \
+                mock.patch('bigpyp.catalog._read') as read:
+            result = catalog.load(path, self.cache_dir)
+        self.assertEqual(first, result)
+        self.assertFalse(parse.called)
+        self.assertFalse(read.called)
+
+    def test_load_skips_parse_when_only_mtime_changed(self):
+        path = self._write('zone_vips.yml', ['foo'])
+        first = catalog.load(path, self.cache_dir)
+        os.utime(path, (0, 0))
+        with mock.patch('bigpyp.catalog.parse') as parse:
+            result = catalog.load(path, self.cache_dir)
+        self.assertEqual(first, result)
+        self.assertFalse(parse.called)
+
+    def test_load_parses_again_when_changed(self):
+        path = self._write('zone_vips.yml', ['foo'])
+        catalog.load(path, self.cache_dir)
+        self._write('zone_vips.yml', ['foo', 'bazz'])
+        os.utime(path, (0, 0))
+        result = catalog.load(path, self.cache_dir)
+        self.assertEqual(['bazz', 'foo'], sorted(result['load_balancing']))
+
+    def test_load_ignores_corrupt_cache(self):
+        path = self._write('zone_vips.yml', ['foo'])
+        catalog.load(path, self.cache_dir)
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'w') as file:
+                file.write('garbage')
+        result = catalog.load(path, self.cache_dir)
+        self.assertEqual(['foo'], list(result['load_balancing']))
+
+    def test_zone_names_finds_files_and_directories(self):
+        self._write('foo_vips.yml', ['foo'])
+        self._write('bar_vips.d/a.yml', ['bar'])
+        with mock.patch.object(load_balancer, 'CONF_DIR', self.directory):
+            self.assertEqual(['bar', 'foo'], load_balancer.zone_names())
+            self.assertEqual(os.path.join(self.directory, 'bar_vips.d'),
+                             load_balancer.vips_file('bar'))
+
+
+class TestVipCatalog(unittest.TestCase):
+    def setUp(self):
+        self.vips = catalog.VipCatalog({'load_balancing': {
+            'auth': {'dns': 'auth.dpa1.attcompute.com',
+                     'ip': '10.0.0.1',
+                     'front_port': 443,
+                     'back_port': 5000,
+                     'monitor': 'http',
+                     'members': ['192.168.129.10']},
+            'db': {'dns': 'db.int.dpa1.attcompute.com',
+                   'ip': '10.0.0.2',
+                   'front_port': 3306,
+                   'back_port': 3306,
+                   'monitor': 'mysql_monitor',
+                   'members': None}}})
+
+    def test_derived_names(self):
+        vip = self.vips.by_domain['auth.dpa1.attcompute.com'][0]
+        self.assertEqual('/Common/auth.dpa1.attcompute.com_5000_pl',
+                         vip.pool)
+        self.assertEqual('/Common/auth.dpa1.attcompute.com_443',
+                         vip.virtual_server)
+        self.assertEqual('/Common/auth.dpa1.attcompute.com_pr',
+                         vip.ssl_profile)
+        self.assertEqual('dpa1', vip.zone)
+        self.assertEqual(os.path.join('dpa1', 'auth.dpa1.attcompute.com',
+                                      'auth.dpa1.attcompute.com.crt'),
+                         vip.cert_path)
+
+    def test_indexes(self):
+        self.assertEqual('db', self.vips.by_address[('10.0.0.2', 3306)].name)
+        pool = '/Common/auth.dpa1.attcompute.com_5000_pl'
+        self.assertEqual(['auth'], [v.name for v in self.vips.by_pool[pool]])
+
+    def test_public_and_configured(self):
+        self.assertEqual(['auth'], [v.name for v in self.vips.public])
+        self.assertEqual(['auth'], [v.name for v in self.vips.configured])
+        self.assertEqual((), self.vips.by_address[('10.0.0.2', 3306)].members)
@@ -0,0 +1,61 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import cert
+from bigpyp import plan
+
+
+class TestCert(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.bigip = mock.Mock()
+        self.key_cert = self.bigip.pc.Management.KeyCertificate
+        self.plan = mock.Mock()
+        actions = []
+        for name, replace, skip in [('a', False, False),
+                                    ('b', True, False),
+                                    ('c', True, True)]:
+            for op, ext in [('import_key_from_file', 'pem'),
+                            ('import_certificate_from_file', 'crt')]:
+                path = os.path.join(self.tmpdir, '{0}.{1}'.format(name, ext))
+                with open(path, 'w') as file:
+                    file.write('{0} {1}'.format(name, ext))
+                actions.append(plan.Action('cert', op, name,
+                                           {'file': path, 'replace': replace},
+                                           skip=skip))
+        self.plan.cert_actions.return_value = actions
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_create_imports_in_one_call_each(self):
+        cert.Cert(self.bigip, self.plan).create()
+        self.assertEqual(1, self.key_cert.key_import_from_pem.call_count)
+        args, kwargs = self.key_cert.key_import_from_pem.call_args
+        self.assertEqual(['a', 'b'], kwargs['key_ids'])
+        self.assertEqual(['a pem', 'b pem'], kwargs['pem_data'])
+        self.assertTrue(kwargs['overwrite'])
+        self.assertEqual(
+            1, self.key_cert.certificate_import_from_pem.call_count)
+        args, kwargs = self.key_cert.certificate_import_from_pem.call_args
+        self.assertEqual(['a', 'b'], kwargs['cert_ids'])
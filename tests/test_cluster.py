@@ -0,0 +1,99 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import cluster
+from bigpyp import fake_icontrol
+from bigpyp import fleet
+from bigpyp import load_balancer
+
+POOL = '/Common/a_80_pl'
+
+
+class TestCluster(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.active = fake_icontrol.FakeIControlServer().start()
+        self.standby = fake_icontrol.FakeIControlServer().start()
+        fake_icontrol.join_cluster([self.active, self.standby])
+        self.options = {'proto': 'http', 'wsdl_cache': self.tmpdir}
+        self.sleep = mock.Mock()
+
+    def tearDown(self):
+        self.active.stop()
+        self.standby.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _bigip(self, server):
+        return load_balancer.BigIP(host=server.host, **self.options)
+
+    def test_discover_finds_active_device(self):
+        c = cluster.discover(self._bigip(self.standby))
+        self.assertEqual('/Common/failover', c.group)
+        self.assertEqual(self.active.host, c.active.address)
+        self.assertEqual([self.active.host, self.standby.host], c.addresses)
+
+    def test_discover_standalone_device(self):
+        server = fake_icontrol.FakeIControlServer().start()
+        self.addCleanup(server.stop)
+        self.assertIsNone(cluster.discover(self._bigip(server)))
+
+    def test_cluster_bigip_switches_to_active_device(self):
+        b, group = load_balancer.cluster_bigip(self._bigip(self.standby))
+        self.assertEqual(self.active.host, b.host)
+        self.assertEqual('/Common/failover', group)
+
+    def test_sync_copies_config_to_peers(self):
+        self.active.device.sync_polls = 2
+        self.active.device.LocalLB_Pool_create_v2(
+            [POOL], ['LB_METHOD_ROUND_ROBIN'],
+            [[{'address': '10.0.0.1', 'port': 80}]])
+        cluster.sync(self._bigip(self.active), '/Common/failover',
+                     sleep=self.sleep)
+        self.assertIn(POOL, self.standby.device.pools)
+        self.assertEqual(2, self.sleep.call_count)
+        self.assertEqual(1, self.active.calls[
+            'System.ConfigSync.synchronize_to_group'])
+
+    def test_sync_times_out(self):
+        self.active.device.sync_polls = 100
+        now = [0]
+
+        def sleep(seconds):
+            now[0] += seconds
+        with self.assertRaisesRegexp(cluster.SyncError, 'after 10s'):
+            cluster.sync(self._bigip(self.active), '/Common/failover',
+                         timeout=10, sleep=sleep, clock=lambda: now[0])
+
+    def test_cluster_jobs_apply_once_per_group(self):
+        server = fake_icontrol.FakeIControlServer().start()
+        self.addCleanup(server.stop)
+        jobs = fleet.zone_jobs(['a'], {'a': [self.standby.host,
+                                             self.active.host, server.host]})
+        jobs = fleet.cluster_jobs(jobs, self.options)
+        self.assertEqual([(self.active.host, '/Common/failover'),
+                          (server.host, None)],
+                         [(j.host, j.sync_group) for j in jobs])
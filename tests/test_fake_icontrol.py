@@ -0,0 +1,295 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+import unittest2 as unittest
+
+from suds import WebFault
+
+from bigpyp import catalog
+from bigpyp import cert
+from bigpyp import fake_icontrol
+from bigpyp import ledger
+from bigpyp import load_balancer
+from bigpyp import plan
+from bigpyp import transaction
+
+DOMAIN = 'auth.dpa1.attcompute.com'
+
+
+def _vips():
+    return catalog.VipCatalog({'load_balancing': {
+        'auth': {'dns': DOMAIN,
+                 'ip': '10.0.0.1',
+                 'front_port': 443,
+                 'back_port': 5000,
+                 'monitor': 'http',
+                 'members': ['192.168.129.10', '192.168.129.11']},
+        'messaging': {'dns': 'messaging.int.dpa1.attcompute.com',
+                      'ip': '10.0.0.2',
+                      'front_port': 5672,
+                      'back_port': 5672,
+                      'monitor': 'tcp_half_open',
+                      'members': ['192.168.129.20']}}})
+
+
+def _pem(text):
+    return ('-----BEGIN CERTIFICATE-----\n{0}'
+            '-----END CERTIFICATE-----\n').format(text.encode('base64'))
+
+
+class TestFakeIControl(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = fake_icontrol.FakeIControlServer().start()
+        self.device = self.server.device
+        certs = os.path.join(self.tmpdir, 'certs')
+        path = os.path.join(certs, 'dpa1', DOMAIN)
+        os.makedirs(path)
+        for name, data in [(os.path.join(path, DOMAIN + '.pem'), 'key'),
+                           (os.path.join(path, DOMAIN + '.crt'),
+                            _pem('cert')),
+                           (os.path.join(certs,
+                                         'verisign_intermediate_bundle.crt'),
+                            _pem('bundle'))]:
+            with open(name, 'w') as file:
+                file.write(data)
+        patcher = mock.patch.object(cert.Cert, 'FILE_BASEDIR', certs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _bigip(self):
+        wsdls = os.path.join(self.tmpdir, 'wsdl')
+        return load_balancer.BigIP(host=self.server.host, proto='http',
+                                   wsdl_cache=wsdls)
+
+    def _apply(self, batch_size=1, vips=None, zone_ledger=None, **kwargs):
+        stages = ['cert', 'profile', 'rule', 'pool', 'virtual_server']
+        load_balancer.apply_zone(self._bigip(), vips or _vips(), stages,
+                                 batch_size, ledger=zone_ledger, **kwargs)
+
+    def _ledger(self):
+        return ledger.Ledger(os.path.join(self.tmpdir, 'ledger.json'))
+
+    def _writes(self):
+        reads = fake_icontrol.FakeDevice.READ_METHODS
+        return dict((k, v) for k, v in self.server.calls.items()
+                    if not k.split('.')[-1].startswith(reads))
+
+    def test_apply_zone_configures_device(self):
+        self._apply()
+        pool = '/Common/{0}_5000_pl'.format(DOMAIN)
+        self.assertEqual([('192.168.129.10', 5000), ('192.168.129.11', 5000)],
+                         self.device.pools[pool]['members'].keys())
+        self.assertEqual(['/Common/http'], self.device.pools[pool]['monitors'])
+        vs = self.device.virtual_servers['/Common/{0}_443'.format(DOMAIN)]
+        self.assertEqual(pool, vs['pool'])
+        self.assertIn('/Common/{0}_pr'.format(DOMAIN), vs['profiles'])
+        self.assertEqual('/Common/fake-backend-snat', vs['snat_pool'])
+
+    def test_second_apply_only_reads(self):
+        self._apply()
+        self.server.calls.clear()
+        self._apply()
+        self.assertEqual({}, self._writes())
+
+    def test_unchanged_apply_with_ledger_only_checks_generation(self):
+        self._apply(zone_ledger=self._ledger())
+        self.server.calls.clear()
+        self._apply(zone_ledger=self._ledger())
+        # Besides the WSDL cache's version check.
+        self.assertEqual({'Management.DBVariable.query': 1,
+                          'System.SystemInfo.get_version': 1},
+                         dict(self.server.calls))
+
+    def test_apply_with_ledger_applies_changed_vip(self):
+        self._apply(zone_ledger=self._ledger())
+        self.server.calls.clear()
+        vips_dict = {'load_balancing': {
+            'auth': {'dns': DOMAIN,
+                     'ip': '10.0.0.1',
+                     'front_port': 443,
+                     'back_port': 5000,
+                     'monitor': 'http',
+                     'members': ['192.168.129.10', '192.168.129.12']}}}
+        self._apply(vips=catalog.VipCatalog(vips_dict),
+                    zone_ledger=self._ledger())
+        self.assertEqual({'LocalLB.Pool.add_member_v2': 1},
+                         self._writes())
+        self.assertNotIn('LocalLB.Rule.get_list', self.server.calls)
+
+    def test_apply_with_ledger_keeps_members_of_unchanged_vips(self):
+        def vips(members):
+            return catalog.VipCatalog({'load_balancing': {
+                'auth': {'dns': DOMAIN, 'ip': '10.0.0.1', 'front_port': 443,
+                         'back_port': 5000, 'monitor': 'http',
+                         'members': members},
+                'auth-admin': {'dns': DOMAIN, 'ip': '10.0.0.1',
+                               'front_port': 35357, 'back_port': 5000,
+                               'monitor': 'http',
+                               'members': ['192.168.129.12']}}})
+        self._apply(vips=vips(['192.168.129.10']), prune_members=True,
+                    zone_ledger=self._ledger())
+        self._apply(vips=vips(['192.168.129.11']), prune_members=True,
+                    zone_ledger=self._ledger())
+        pool = '/Common/{0}_5000_pl'.format(DOMAIN)
+        self.assertEqual([('192.168.129.12', 5000), ('192.168.129.11', 5000)],
+                         self.device.pools[pool]['members'].keys())
+
+    def test_apply_with_ledger_after_device_change_reads_all(self):
+        self._apply(zone_ledger=self._ledger())
+        self.device.config_time += 1
+        self.server.calls.clear()
+        self._apply(zone_ledger=self._ledger())
+        self.assertEqual(1, self.server.calls['LocalLB.Rule.get_list'])
+        self.assertEqual({}, self._writes())
+
+    def test_apply_vips_sharing_a_pool_and_domain(self):
+        vips = _vips()
+        vips = vips.subset(list(vips) + [catalog.Vip('auth-admin', {
+            'dns': DOMAIN,
+            'ip': '10.0.0.1',
+            'front_port': 35357,
+            'back_port': 5000,
+            'monitor': 'http',
+            'members': ['192.168.129.12']})])
+        pool = '/Common/{0}_5000_pl'.format(DOMAIN)
+        for batch_size in [1, 100]:
+            self._apply(batch_size, vips=vips, prune_members=True)
+            self.assertEqual([('192.168.129.10', 5000),
+                              ('192.168.129.11', 5000),
+                              ('192.168.129.12', 5000)],
+                             self.device.pools[pool]['members'].keys())
+            for port in [443, 35357]:
+                vs = '/Common/{0}_{1}'.format(DOMAIN, port)
+                self.assertEqual(pool, self.device.virtual_servers[vs]['pool'])
+            self.device.__init__()
+
+    def test_stage_subset_without_prerequisites_fails_before_writing(self):
+        with self.assertRaises(plan.PrerequisiteError) as e:
+            load_balancer.apply_zone(self._bigip(), _vips(),
+                                     ['pool', 'virtual_server'])
+        self.assertIn('/Common/{0}_pr'.format(DOMAIN), e.exception.missing)
+        self.assertEqual({}, self._writes())
+
+    def test_stage_subset_runs_once_prerequisites_exist(self):
+        self._apply()
+        self.device.virtual_servers.clear()
+        load_balancer.apply_zone(self._bigip(), _vips(), ['virtual_server'])
+        self.assertIn('/Common/{0}_443'.format(DOMAIN),
+                      self.device.virtual_servers)
+
+    def test_batching_cuts_round_trips(self):
+        self._apply(batch_size=100)
+        self.assertEqual(1, self.server.calls['LocalLB.Pool.create_v2'])
+        self.assertEqual(
+            1, self.server.calls['LocalLB.VirtualServer.create'])
+
+    def test_run_transaction_commits_once(self):
+        self._apply(transaction_scope='run', concurrency=2)
+        self.assertIn('/Common/{0}_443'.format(DOMAIN),
+                      self.device.virtual_servers)
+        self.assertEqual(
+            1, self.server.calls['System.Session.get_session_identifier'])
+        self.assertEqual(
+            1, self.server.calls['System.Session.submit_transaction'])
+        self.assertEqual({}, self.device.transactions)
+
+    def test_stage_transactions_commit_each_stage(self):
+        self._apply(transaction_scope='stage')
+        self.assertEqual(
+            4, self.server.calls['System.Session.submit_transaction'])
+        self.assertIn('/Common/{0}_443'.format(DOMAIN),
+                      self.device.virtual_servers)
+
+    def test_failed_run_transaction_rolls_back(self):
+        self.server.fail('LocalLB.VirtualServer.create')
+        with self.assertRaises(WebFault):
+            self._apply(transaction_scope='run')
+        self.assertEqual(
+            1, self.server.calls['System.Session.rollback_transaction'])
+        self.assertEqual({}, dict(self.device.pools))
+        self.assertEqual({}, self.device.transactions)
+        # Certificates are imported outside the transaction.
+        self.assertIn('/Common/verisign_intermediate_bundle',
+                      self.device.certificates)
+
+    def test_failed_submit_leaves_config_unchanged(self):
+        pool = self._bigip().pc.LocalLB.Pool
+        args_dict = {'pool_names': ['/Common/a_80_pl'],
+                     'lb_methods': ['LB_METHOD_ROUND_ROBIN'],
+                     'members': [[]]}
+        pool.create_v2(**args_dict)
+        before = self.device.config_time
+        b = self._bigip()
+        with self.assertRaises(WebFault):
+            with transaction.Transaction(b):
+                b.pc.LocalLB.Pool.create_v2(
+                    pool_names=['/Common/b_80_pl'],
+                    lb_methods=['LB_METHOD_ROUND_ROBIN'], members=[[]])
+                b.pc.LocalLB.Pool.create_v2(**args_dict)
+        self.assertEqual(['/Common/a_80_pl'], self.device.pools.keys())
+        self.assertEqual(before, self.device.config_time)
+
+    def test_injected_failure_raises_fault(self):
+        self.server.fail('LocalLB.Pool.get_list')
+        pool = self._bigip().pc.LocalLB.Pool
+        with self.assertRaises(WebFault):
+            pool.get_list()
+        self.assertEqual([], pool.get_list())
+
+    def test_device_faults_on_duplicate_objects(self):
+        pool = self._bigip().pc.LocalLB.Pool
+        args_dict = {'pool_names': ['/Common/a_80_pl'],
+                     'lb_methods': ['LB_METHOD_ROUND_ROBIN'],
+                     'members': [[]]}
+        pool.create_v2(**args_dict)
+        with self.assertRaises(WebFault):
+            pool.create_v2(**args_dict)
+
+    def test_injected_latency(self):
+        pool = self._bigip().pc.LocalLB.Pool
+        pool.get_list()
+        self.server.set_latency(0.2, 'LocalLB.Pool.get_list')
+        start = time.time()
+        pool.get_list()
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+
+class TestParseTransaction(unittest.TestCase):
+    def test_defaults_to_no_transaction(self):
+        self.assertIsNone(load_balancer.parse_transaction(None))
+
+    def test_raises_on_unknown_scope(self):
+        self.assertRaises(ValueError, load_balancer.parse_transaction, 'zone')
+
+    def test_raises_with_drain(self):
+        self.assertRaises(ValueError, load_balancer.parse_transaction, 'run',
+                          60)
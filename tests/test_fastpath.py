@@ -0,0 +1,165 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from suds import sudsobject
+
+from bigpyp import fake_icontrol
+from bigpyp import fastpath
+from bigpyp import load_balancer
+from bigpyp import metrics
+from bigpyp import structs
+
+POOL = '/Common/a_80_pl'
+VS = '/Common/a_80_vs'
+
+
+def _plain(value):
+    if isinstance(value, sudsobject.Object):
+        return dict((k, _plain(v)) for k, v in sudsobject.items(value))
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+class TestFastPath(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = fake_icontrol.FakeIControlServer().start()
+        device = self.server.device
+        device.LocalLB_Pool_create_v2(
+            [POOL], ['LB_METHOD_ROUND_ROBIN'],
+            [[{'address': '10.0.0.1', 'port': 80},
+              {'address': '10.0.0.2', 'port': 80}]])
+        device.LocalLB_VirtualServer_create(
+            [{'name': VS, 'address': '10.1.0.1', 'port': 80}], [],
+            [{'default_pool_name': POOL}],
+            [[{'profile_name': '/Common/http'}]])
+        device.LocalLB_VirtualServer_set_snat_pool([VS], ['/Common/snat'])
+        device.certificates['/Common/a'] = 'pem & <data>'
+        # Statistics are stamped with the time they are read at.
+        patcher = mock.patch.object(device, '_time_stamp', return_value={
+            'year': 2013, 'month': 1, 'day': 1, 'hour': 0, 'minute': 0,
+            'second': 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _bigip(self, **kwargs):
+        return load_balancer.BigIP(host=self.server.host, proto='http',
+                                   wsdl_cache=self.tmpdir, **kwargs)
+
+    def _members(self, bigip, *addresses):
+        factory = structs.StructFactory(bigip.pc.LocalLB.Pool)
+        sequence = factory.create('Common.IPPortDefinitionSequence')
+        sequence.items = [factory.create('Common.AddressPort', address=a,
+                                         port=80) for a in addresses]
+        return [sequence]
+
+    def test_every_method_matches_suds(self):
+        slow = self._bigip()
+        fast = self._bigip(fast_path=sorted(fastpath.METHODS))
+        members = self._members(slow, '10.0.0.1', '10.0.0.2')
+        calls = {'LocalLB.Pool.get_all_member_statistics': ([[POOL]], {}),
+                 'LocalLB.Pool.get_member_object_status': (
+                     [[POOL], members], {}),
+                 'LocalLB.Pool.get_member_v2': ([[POOL]], {}),
+                 'LocalLB.Pool.get_monitor_association': ([[POOL]], {}),
+                 'LocalLB.ProfileClientSSL.get_chain_file': (
+                     [['/Common/clientssl']], {}),
+                 # suds reads a lone empty string item as an empty array.
+                 'LocalLB.ProfileHttp.get_default_profile': (
+                     [['/Common/http', '/Common/http']], {}),
+                 'LocalLB.ProfileHttp.'
+                 'get_insert_xforwarded_for_header_mode': (
+                     [], {'profile_names': ['/Common/http']}),
+                 'LocalLB.ProfileTCP.get_keep_alive_interval': (
+                     [['/Common/tcp']], {}),
+                 'LocalLB.VirtualServer.get_snat_pool': ([[VS]], {}),
+                 'LocalLB.VirtualServer.get_statistics': ([[VS]], {}),
+                 'Management.DBVariable.query': (
+                     [['Configsync.LocalConfigTime']], {}),
+                 'Management.KeyCertificate.get_certificate_list': (
+                     [], {'mode': 'MANAGEMENT_MODE_DEFAULT'}),
+                 'Management.KeyCertificate.get_key_list': (
+                     [], {'mode': 'MANAGEMENT_MODE_DEFAULT'}),
+                 'Management.KeyCertificate.certificate_export_to_pem': (
+                     [], {'mode': 'MANAGEMENT_MODE_DEFAULT',
+                          'cert_ids': ['/Common/a']})}
+        for name in sorted(fastpath.METHODS):
+            module, interface, method = name.split('.')
+            args, kwargs = calls.get(name, ([], {}))
+            expected = getattr(getattr(getattr(slow.pc, module), interface),
+                               method)(*args, **kwargs)
+            self.server.calls.clear()
+            result = getattr(getattr(getattr(fast.pc, module), interface),
+                             method)(*args, **kwargs)
+            self.assertEqual(_plain(expected), result, name)
+            self.assertEqual(1, self.server.calls[name], name)
+
+    def test_records_read_as_attributes(self):
+        b = self._bigip(fast_path=['LocalLB.Pool.get_member_v2'])
+        result = b.pc.LocalLB.Pool.get_member_v2(pool_names=[POOL])
+        self.assertEqual([('/Common/10.0.0.1', 80), ('/Common/10.0.0.2', 80)],
+                         [(m.address, m.port) for m in result[0]])
+
+    def test_falls_back_to_suds_on_fault(self):
+        b = self._bigip(fast_path=['LocalLB.Pool.get_list'])
+        self.server.fail('LocalLB.Pool.get_list')
+        self.assertEqual([POOL], b.pc.LocalLB.Pool.get_list())
+        self.assertEqual(2, self.server.calls['LocalLB.Pool.get_list'])
+
+    def test_sends_the_session_header(self):
+        b = self._bigip(fast_path=['LocalLB.Pool.get_list'])
+        device = self.server.device
+        with mock.patch.object(device, 'call', wraps=device.call) as call:
+            b.pc.LocalLB.Pool.get_list()
+            b.set_session(7)
+            b.pc.LocalLB.Pool.get_list()
+        sessions = [c[0][3] for c in call.call_args_list
+                    if c[0][1] == 'get_list']
+        self.assertEqual([None, '7'], sessions)
+        self.assertEqual(2, self.server.calls['LocalLB.Pool.get_list'])
+
+    def test_records_payload_metrics(self):
+        m = metrics.Metrics()
+        b = self._bigip(fast_path=['LocalLB.Pool.get_list'], metrics=m)
+        b.pc.LocalLB.Pool.get_list()
+        series = [s for s in m.to_dict()['methods']
+                  if s['method'] == 'LocalLB.Pool.get_list'][0]
+        self.assertGreater(series['request_bytes'], 0)
+        self.assertGreater(series['response_bytes'], 0)
+
+    def test_parse_raises_on_fault(self):
+        with self.assertRaisesRegexp(fastpath.FastPathError, 'not found'):
+            fastpath.parse(fake_icontrol.fault('pool not found'))
+
+    def test_unknown_method_rejected(self):
+        self.assertRaises(ValueError, load_balancer.parse_fast_path,
+                          'LocalLB.Pool.create_v2')
@@ -0,0 +1,66 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import fleet
+
+
+class TestFleet(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.options = {'bigip': {'password': 'secret'},
+                        'stages': ['pool'],
+                        'batch_size': 1,
+                        'log_dir': self.log_dir}
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir)
+
+    def test_zone_jobs_one_per_device(self):
+        devices = {'zone1': ['10.0.0.1', '10.0.0.2'], 'zone2': ['10.0.1.1']}
+        result = fleet.zone_jobs(['zone1', 'zone2'], devices)
+        self.assertEqual([('zone1', '10.0.0.1'),
+                          ('zone1', '10.0.0.2'),
+                          ('zone2', '10.0.1.1')],
+                         [(j.zone, j.host) for j in result])
+
+    def test_zone_jobs_raises_on_unmapped_zone(self):
+        self.assertRaises(KeyError, fleet.zone_jobs, ['zone3'], {})
+
+    @mock.patch('bigpyp.load_balancer.apply_zone')
+    @mock.patch('bigpyp.load_balancer.BigIP')
+    @mock.patch('bigpyp.load_balancer.load_vips')
+    def test_run_logs_to_own_file(self, load_vips, bigip, apply_zone):
+        apply_zone.side_effect = lambda *args: fleet.utils.print_green('hi')
+        job = fleet.Job('zone1', '10.0.0.1', self.options)
+        result = fleet.run(job)
+        self.assertTrue(result.ok)
+        bigip.assert_called_once_with(host='10.0.0.1', password='secret')
+        with open(result.log, 'r') as file:
+            self.assertEqual('hi\n', file.read())
+
+    @mock.patch('bigpyp.load_balancer.load_vips')
+    def test_run_reports_failure(self, load_vips):
+        load_vips.side_effect = IOError('missing catalog')
+        job = fleet.Job('zone1', '10.0.0.1', self.options)
+        result = fleet.run(job)
+        self.assertFalse(result.ok)
+        self.assertEqual('IOError: missing catalog', result.error)
@@ -0,0 +1,55 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import lazy
+from bigpyp import load_balancer
+
+
+class TestLazyBIGIP(unittest.TestCase):
+    def setUp(self):
+        self.loader = mock.Mock()
+        self.pc = lazy.LazyBIGIP(['LocalLB.Pool', 'System.Inet'],
+                                 self.loader)
+
+    def test_nothing_loaded_up_front(self):
+        self.pc.LocalLB.Pool
+        self.assertFalse(self.loader.called)
+        self.assertFalse(self.pc.LocalLB.Pool.loaded)
+
+    def test_loads_interface_once_on_first_attribute_access(self):
+        self.pc.LocalLB.Pool.get_list()
+        self.pc.LocalLB.Pool.get_list()
+        self.loader.assert_called_once_with('LocalLB.Pool')
+        self.assertFalse(self.pc.System.Inet.loaded)
+
+    def test_unknown_module_raises_attribute_error(self):
+        self.assertRaises(AttributeError, getattr, self.pc, 'Networking')
+
+
+class TestParseStages(unittest.TestCase):
+    def test_defaults_to_every_stage(self):
+        result = load_balancer.parse_stages(None)
+        self.assertEqual(load_balancer.STAGES.keys(), result)
+
+    def test_returns_stages_in_apply_order(self):
+        result = load_balancer.parse_stages('virtual_server,pool')
+        self.assertEqual(['pool', 'virtual_server'], result)
+
+    def test_raises_on_unknown_stage(self):
+        self.assertRaises(ValueError, load_balancer.parse_stages, 'pools')
@@ -0,0 +1,88 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import catalog
+from bigpyp import ledger
+
+
+def _vips(members):
+    return catalog.VipCatalog({'load_balancing': {
+        'db': {'dns': 'db.int.dpa1.attcompute.com',
+               'ip': '10.0.0.2',
+               'front_port': 3306,
+               'back_port': 3306,
+               'monitor': 'mysql_monitor',
+               'members': members}}})
+
+
+class TestLedger(unittest.TestCase):
+    STAGES = ['cert', 'profile', 'system', 'rule', 'monitor', 'pool',
+              'virtual_server']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'zone-host.json')
+        self.bigip = mock.Mock()
+        self.generation = '5'
+        self.bigip.pc.Management.DBVariable.query.side_effect = \
+            lambda variables: [mock.Mock(value=self.generation)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _run(self, vips, stages=STAGES, options=None):
+        result = ledger.Ledger(self.path)
+        changed, dirty_stages = result.changes(self.bigip, vips, stages,
+                                               options or {})
+        result.commit(self.bigip, dirty_stages)
+        return [v.name for v in changed], dirty_stages
+
+    def test_first_run_applies_everything(self):
+        self.assertEqual((['db'], self.STAGES), self._run(_vips(['a'])))
+
+    def test_unchanged_run_applies_nothing(self):
+        self._run(_vips(['a']))
+        self.assertEqual(([], []), self._run(_vips(['a'])))
+
+    def test_changed_vip_runs_only_vip_stages(self):
+        self._run(_vips(['a']))
+        self.assertEqual((['db'], ['cert', 'profile', 'pool',
+                                   'virtual_server']),
+                         self._run(_vips(['a', 'b'])))
+
+    def test_device_change_applies_everything(self):
+        self._run(_vips(['a']))
+        self.generation = '6'
+        self.assertEqual((['db'], self.STAGES), self._run(_vips(['a'])))
+
+    def test_changed_options_apply_everything(self):
+        self._run(_vips(['a']))
+        result = self._run(_vips(['a']), options={'prune_members': True})
+        self.assertEqual((['db'], self.STAGES), result)
+
+    def test_partial_stages_leave_vip_pending(self):
+        self._run(_vips(['a']), stages=['pool', 'rule'])
+        self.assertEqual(['rule'], ledger.Ledger(self.path).shared.keys())
+        changed, stages = self._run(_vips(['a']))
+        self.assertEqual(['db'], changed)
+        self.assertNotIn('rule', stages)
@@ -0,0 +1,114 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import json
+import logging
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from bigpyp import fake_icontrol
+from bigpyp import load_balancer
+from bigpyp import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        h = metrics.Histogram()
+        for seconds in [0.001, 0.02, 0.02, 30]:
+            h.observe(seconds)
+        buckets = dict(h.cumulative())
+        self.assertEqual(1, buckets[0.005])
+        self.assertEqual(3, buckets[0.025])
+        self.assertEqual(3, buckets[10.0])
+        self.assertEqual(4, buckets['+Inf'])
+
+    def test_wrap_records_calls_and_errors_per_stage(self):
+        m = metrics.Metrics()
+
+        def fail():
+            raise ValueError('boom')
+
+        with metrics.stage('pool'):
+            m.wrap('LocalLB.Pool', 'get_list', lambda: [])()
+            with self.assertRaises(ValueError):
+                m.wrap('LocalLB.Pool', 'create_v2', fail)()
+        m.wrap('LocalLB.Pool', 'get_list', lambda: [])()
+        series = dict(((s['method'], s['stage']), s)
+                      for s in m.to_dict()['methods'])
+        self.assertEqual(1, series[('LocalLB.Pool.get_list', 'pool')]['calls'])
+        self.assertEqual(1, series[('LocalLB.Pool.get_list', '-')]['calls'])
+        self.assertEqual(
+            1, series[('LocalLB.Pool.create_v2', 'pool')]['errors'])
+
+    def test_to_prometheus(self):
+        m = metrics.Metrics({'zone': 'zone1'})
+        m.record('LocalLB.Pool.get_list', 0.02, 100, 200, stage='pool')
+        m.set_gauge('concurrency_limit', 4, host='h')
+        text = m.to_prometheus()
+        labels = 'method="LocalLB.Pool.get_list",stage="pool",zone="zone1"'
+        self.assertIn('bigpyp_icontrol_calls_total{{{0}}} 1'.format(labels),
+                      text)
+        self.assertIn('bigpyp_icontrol_response_bytes_total{{{0}}} 200'
+                      .format(labels), text)
+        self.assertIn('bigpyp_icontrol_call_seconds_bucket{{le="0.01",{0}}} 0'
+                      .format(labels), text)
+        self.assertIn('bigpyp_icontrol_call_seconds_bucket{{le="+Inf",{0}}} 1'
+                      .format(labels), text)
+        self.assertIn('bigpyp_icontrol_concurrency_limit'
+                      '{host="h",zone="zone1"} 4', text)
+
+    def test_to_prometheus_declares_each_gauge_once(self):
+        m = metrics.Metrics()
+        m.set_gauge('concurrency_limit', 4, host='a')
+        m.set_gauge('concurrency_limit', 8, host='b')
+        lines = m.to_prometheus().splitlines()
+        name = 'bigpyp_icontrol_concurrency_limit'
+        self.assertEqual(['# HELP {0} iControl calls allowed in flight to '
+                          'the device.'.format(name),
+                          '# TYPE {0} gauge'.format(name),
+                          '{0}{{host="a"}} 4'.format(name),
+                          '{0}{{host="b"}} 8'.format(name)],
+                         lines[-4:])
+
+
+class TestMetricsOnDevice(unittest.TestCase):
+    def setUp(self):
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = fake_icontrol.FakeIControlServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_records_payload_sizes(self):
+        m = metrics.Metrics({'zone': 'zone1', 'host': 'fake'})
+        b = load_balancer.BigIP(host=self.server.host, proto='http',
+                                wsdl_cache=self.tmpdir, metrics=m)
+        with metrics.stage('pool'):
+            b.pc.LocalLB.Pool.get_list()
+        load_balancer.write_metrics(m, self.tmpdir)
+        with open('{0}/zone1-fake.json'.format(self.tmpdir)) as file:
+            data = json.load(file)
+        series = [s for s in data['methods']
+                  if s['method'] == 'LocalLB.Pool.get_list']
+        self.assertEqual('pool', series[0]['stage'])
+        self.assertGreater(series[0]['request_bytes'], 0)
+        self.assertGreater(series[0]['response_bytes'], 0)
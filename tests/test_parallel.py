@@ -0,0 +1,105 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+import shutil
+import tempfile
+import time
+
+import unittest2 as unittest
+
+from suds import WebFault
+
+from bigpyp import fake_icontrol
+from bigpyp import load_balancer
+from bigpyp import metrics
+from bigpyp import parallel
+from bigpyp import state
+
+POOLS = ['/Common/p{0}_80_pl'.format(i) for i in range(250)]
+
+
+class TestAsyncBIGIP(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = fake_icontrol.FakeIControlServer().start()
+        self.server.device.LocalLB_Pool_create_v2(
+            POOLS, ['LB_METHOD_ROUND_ROBIN'] * len(POOLS),
+            [[{'address': '10.0.0.{0}'.format(i % 256), 'port': 80}]
+             for i in range(len(POOLS))])
+        self.m = metrics.Metrics()
+        self.bigip = load_balancer.BigIP(host=self.server.host, proto='http',
+                                         wsdl_cache=self.tmpdir,
+                                         metrics=self.m)
+        self.client = parallel.AsyncBIGIP(self.bigip, 4)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_methods_return_futures(self):
+        future = self.client.LocalLB.Pool.get_list()
+        self.assertEqual(sorted(POOLS), sorted(future.result()))
+        self.assertTrue(future.done())
+
+    def test_map_splits_names_into_chunks(self):
+        members = self.client.map('LocalLB.Pool', 'get_member_v2',
+                                  'pool_names', POOLS)
+        self.assertEqual(len(POOLS), len(members))
+        self.assertEqual('/Common/10.0.0.249', members[-1][0].address)
+        self.assertEqual(3, self.server.calls['LocalLB.Pool.get_member_v2'])
+
+    def test_calls_run_at_once(self):
+        self.server.latencies['LocalLB.Pool.get_list'] = 0.5
+        start = time.time()
+        parallel.gather([self.client.LocalLB.Pool.get_list()
+                         for i in range(4)])
+        self.assertLess(time.time() - start, 1.5)
+
+    def test_errors_raise_on_result(self):
+        self.server.fail('LocalLB.Pool.get_list', msg='boom')
+        future = self.client.LocalLB.Pool.get_list()
+        with self.assertRaisesRegexp(WebFault, 'boom'):
+            future.result()
+
+    def test_calls_keep_the_callers_stage(self):
+        with metrics.stage('pool'):
+            self.client.LocalLB.Pool.get_list().result()
+        stages = [s['stage'] for s in self.m.to_dict()['methods']
+                  if s['method'] == 'LocalLB.Pool.get_list']
+        self.assertEqual(['pool'], stages)
+
+    def test_device_state_matches_serial_reads(self):
+        self.server.device.LocalLB_ProfileClientSSL_get_list()
+        serial = state.DeviceState(self.bigip).load()
+        concurrent = state.DeviceState(self.bigip, client=self.client).load()
+        for key in state.DeviceState.KEYS:
+            self.assertEqual(getattr(serial, key), getattr(concurrent, key),
+                             key)
+
+    def test_device_semaphore_is_shared_per_host_and_limit(self):
+        self.assertIs(parallel.device_semaphore(self.server.host, 4),
+                      parallel.device_semaphore(self.server.host, 4))
+        semaphore = parallel.device_semaphore(self.server.host, 8)
+        self.assertIsNot(parallel.device_semaphore(self.server.host, 4),
+                         semaphore)
+        for i in range(8):
+            self.assertTrue(semaphore.acquire(False))
@@ -0,0 +1,339 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import catalog
+from bigpyp import cert
+from bigpyp import plan
+from bigpyp import state
+from bigpyp import utils
+
+
+def _vips():
+    return catalog.VipCatalog({'load_balancing': {
+        'auth': {'dns': 'auth.dpa1.attcompute.com',
+                 'ip': '10.0.0.1',
+                 'front_port': 443,
+                 'back_port': 5000,
+                 'monitor': 'http',
+                 'members': ['192.168.129.10', '192.168.129.11']},
+        'db': {'dns': 'db.int.dpa1.attcompute.com',
+               'ip': '10.0.0.2',
+               'front_port': 3306,
+               'back_port': 3306,
+               'monitor': 'mysql_monitor',
+               'members': []}}})
+
+
+def _pem(der):
+    return ('-----BEGIN CERTIFICATE-----\n{0}\n'
+            '-----END CERTIFICATE-----\n').format(der.encode('base64'))
+
+
+def _empty_state():
+    data = dict((key, []) for key in state.DeviceState.KEYS)
+    for key in ['certificates', 'http_xff_modes', 'http_default_profiles',
+                'chain_files', 'tcp_keep_alive_intervals', 'pool_monitors',
+                'pool_members', 'snat_pools']:
+        data[key] = {}
+    return data
+
+
+class TestPlan(unittest.TestCase):
+    def setUp(self):
+        self.data = _empty_state()
+
+    def _plan(self):
+        return plan.Plan(state.DeviceState(data=self.data), _vips())
+
+    def test_pool_actions_create_missing_pool(self):
+        actions = self._plan().pool_actions()
+        ops = [(a.op, a.name, a.skip) for a in actions]
+        pool = '/Common/auth.dpa1.attcompute.com_5000_pl'
+        self.assertEqual([('create_pool', pool, False),
+                          ('set_monitor', pool, False)], ops)
+
+    def test_pool_actions_add_only_missing_members(self):
+        pool = '/Common/auth.dpa1.attcompute.com_5000_pl'
+        self.data['pools'] = [pool]
+        self.data['pool_monitors'] = {pool: ['/Common/http']}
+        self.data['pool_members'] = {pool: [['192.168.129.10', 5000]]}
+        actions = self._plan().pool_actions()
+        self.assertTrue(actions[0].skip)
+        self.assertTrue(actions[1].skip)
+        self.assertEqual('add_member', actions[2].op)
+        self.assertEqual('192.168.129.11', actions[2].args['member'])
+        self.assertEqual(3, len(actions))
+
+    def test_pool_actions_keep_stale_members_by_default(self):
+        pool = '/Common/auth.dpa1.attcompute.com_5000_pl'
+        self.data['pools'] = [pool]
+        self.data['pool_members'] = {pool: [['192.168.129.10', 5000],
+                                            ['192.168.129.11', 5000],
+                                            ['192.168.129.9', 5000]]}
+        actions = self._plan().pool_actions()
+        self.assertEqual(['create_pool', 'set_monitor'],
+                         [a.op for a in actions])
+
+    def test_pool_actions_prune_and_drain_stale_members(self):
+        pool = '/Common/auth.dpa1.attcompute.com_5000_pl'
+        self.data['pools'] = [pool]
+        self.data['pool_members'] = {pool: [['192.168.129.10', 5000],
+                                            ['192.168.129.11', 4999],
+                                            ['192.168.129.9', 5000]]}
+        p = plan.Plan(state.DeviceState(data=self.data), _vips(),
+                      prune_members=True, drain=30)
+        ops = [(a.op, a.args.get('member'), a.args.get('port'))
+               for a in p.pool_actions()[2:]]
+        self.assertEqual([('add_member', '192.168.129.11', 5000),
+                          ('disable_member', '192.168.129.11', 4999),
+                          ('disable_member', '192.168.129.9', 5000),
+                          ('remove_member', '192.168.129.11', 4999),
+                          ('remove_member', '192.168.129.9', 5000)], ops)
+
+    def test_vips_sharing_a_pool_and_domain_emit_each_object_once(self):
+        vips = _vips()
+        vips = vips.subset(list(vips) + [catalog.Vip('auth-admin', {
+            'dns': 'auth.dpa1.attcompute.com',
+            'ip': '10.0.0.1',
+            'front_port': 35357,
+            'back_port': 5000,
+            'monitor': 'http',
+            'members': ['192.168.129.11', '192.168.129.12']})])
+        p = plan.Plan(state.DeviceState(data=self.data), vips)
+        pool = '/Common/auth.dpa1.attcompute.com_5000_pl'
+        actions = p.pool_actions()
+        self.assertEqual([('create_pool', pool), ('set_monitor', pool)],
+                         [(a.op, a.name) for a in actions])
+        self.assertEqual(['192.168.129.10', '192.168.129.11',
+                          '192.168.129.12'], actions[0].args['members'])
+        self.assertEqual(['create_ssl_profile', 'set_chain_file'],
+                         [a.op for a in p.ssl_profile_actions()])
+        self.assertEqual(['import_key_from_file',
+                          'import_certificate_from_file',
+                          'import_certificate_from_file'],
+                         [a.op for a in p.cert_actions()])
+        self.assertEqual(2, len(set(a.name for a in
+                                    p.virtual_server_actions())))
+
+    def test_prune_keeps_members_of_every_vip_sharing_a_pool(self):
+        pool = '/Common/auth.dpa1.attcompute.com_5000_pl'
+        self.data['pools'] = [pool]
+        self.data['pool_members'] = {pool: [['192.168.129.10', 5000],
+                                            ['192.168.129.11', 5000],
+                                            ['192.168.129.12', 5000]]}
+        vips = _vips()
+        vips = vips.subset(list(vips) + [catalog.Vip('auth-admin', {
+            'dns': 'auth.dpa1.attcompute.com',
+            'ip': '10.0.0.1',
+            'front_port': 35357,
+            'back_port': 5000,
+            'monitor': 'http',
+            'members': ['192.168.129.12']})])
+        p = plan.Plan(state.DeviceState(data=self.data), vips,
+                      prune_members=True)
+        self.assertEqual(['create_pool', 'set_monitor'],
+                         [a.op for a in p.pool_actions()])
+
+    def test_virtual_server_actions_skip_existing(self):
+        name = '/Common/auth.dpa1.attcompute.com_443'
+        self.data['virtual_servers'] = [name]
+        self.data['snat_pools'] = {name: '/Common/fake-backend-snat'}
+        actions = self._plan().virtual_server_actions()
+        self.assertEqual([True, True], [a.skip for a in actions])
+
+    def test_ssl_profile_actions_only_public_domains(self):
+        actions = self._plan().ssl_profile_actions()
+        names = set(a.name for a in actions)
+        self.assertEqual(set(['/Common/auth.dpa1.attcompute.com_pr']), names)
+
+    def test_cert_actions_include_intermediate_bundle(self):
+        actions = self._plan().cert_actions()
+        self.assertEqual('/Common/verisign_intermediate_bundle',
+                         actions[-1].name)
+        self.assertEqual(3, len(actions))
+
+    def test_cert_actions_skip_matching_fingerprints(self):
+        name = '/Common/{0}-auth.dpa1.attcompute.com'.format(
+            self._plan()._year)
+        pem = _pem('device cert')
+        self.data['keys'] = [name]
+        self.data['certificates'] = {name: utils.pem_fingerprint(pem)}
+        with self._cert_files(pem):
+            actions = self._plan().cert_actions()
+        self.assertEqual([True, True], [a.skip for a in actions[:2]])
+
+    def test_cert_actions_replace_changed_cert_and_key(self):
+        name = '/Common/{0}-auth.dpa1.attcompute.com'.format(
+            self._plan()._year)
+        self.data['keys'] = [name]
+        self.data['certificates'] = {
+            name: utils.pem_fingerprint(_pem('old cert'))}
+        with self._cert_files(_pem('renewed cert')):
+            actions = self._plan().cert_actions()
+        self.assertEqual([False, False], [a.skip for a in actions[:2]])
+        self.assertEqual([True, True],
+                         [a.args['replace'] for a in actions[:2]])
+
+    def _cert_files(self, pem):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        domain = 'auth.dpa1.attcompute.com'
+        path = os.path.join(tmpdir, 'dpa1', domain)
+        os.makedirs(path)
+        with open(os.path.join(path, domain + '.crt'), 'w') as file:
+            file.write(pem)
+        return mock.patch.object(cert.Cert, 'FILE_BASEDIR', tmpdir)
+
+    def test_missing_lists_objects_of_stages_left_out(self):
+        p = self._plan()
+        domain = 'auth.dpa1.attcompute.com'
+        self.assertEqual(['/Common/http-xff',
+                          '/Common/{0}_pr'.format(domain),
+                          '/Common/{0}_5000_pl'.format(domain)],
+                         p.missing(['virtual_server']))
+        self.assertEqual(['/Common/http-xff',
+                          '/Common/{0}_pr'.format(domain)],
+                         p.missing(['pool', 'virtual_server']))
+        self.assertEqual([], p.missing(plan.Plan.STAGES))
+
+    def test_missing_skips_existing_virtual_servers(self):
+        self.data['virtual_servers'] = [
+            '/Common/auth.dpa1.attcompute.com_443']
+        self.assertEqual([], self._plan().missing(['virtual_server']))
+
+    def test_missing_certificates_of_new_ssl_profiles(self):
+        name = '/Common/{0}-auth.dpa1.attcompute.com'.format(
+            self._plan()._year)
+        self.assertEqual([name], self._plan().missing(['ssl_profile']))
+        self.data['keys'] = [name]
+        self.data['certificates'] = {name: 'fingerprint'}
+        self.assertEqual([], self._plan().missing(['ssl_profile']))
+
+    def test_actions_in_stage_order(self):
+        stages = [a.stage for a in self._plan().actions()]
+        self.assertEqual(sorted(stages, key=plan.Plan.STAGES.index), stages)
+
+
+class TestDeviceState(unittest.TestCase):
+    def test_certificates_are_fingerprinted_in_one_export(self):
+        bigip = mock.Mock()
+        key_cert = bigip.pc.Management.KeyCertificate
+        c = mock.Mock()
+        c.certificate.cert_info = {'id': '/Common/2014-a.example.com'}
+        key_cert.get_certificate_list.return_value = [c]
+        key_cert.certificate_export_to_pem.return_value = [_pem('a')]
+        s = state.DeviceState(bigip)
+        self.assertEqual({'/Common/2014-a.example.com':
+                          utils.pem_fingerprint(_pem('a'))},
+                         s.certificates)
+        self.assertEqual(1, key_cert.certificate_export_to_pem.call_count)
+
+    def test_exports_only_certificates_a_plan_references(self):
+        bigip = mock.Mock()
+        key_cert = bigip.pc.Management.KeyCertificate
+        cert_list = []
+        for cert_id in ['/Common/ca-bundle', '/Common/2014-a.example.com',
+                        '/Common/default', cert.Cert.INTERMEDIATE_BUNDLE]:
+            c = mock.Mock()
+            c.certificate.cert_info = {'id': cert_id}
+            cert_list.append(c)
+        key_cert.get_certificate_list.return_value = cert_list
+        key_cert.certificate_export_to_pem.return_value = [_pem('a'),
+                                                           _pem('b')]
+        s = state.DeviceState(bigip)
+        self.assertEqual(['/Common/2014-a.example.com',
+                          cert.Cert.INTERMEDIATE_BUNDLE],
+                         sorted(s.certificates))
+        key_cert.certificate_export_to_pem.assert_called_once_with(
+            mode='MANAGEMENT_MODE_DEFAULT',
+            cert_ids=['/Common/2014-a.example.com',
+                      cert.Cert.INTERMEDIATE_BUNDLE])
+
+    def test_skips_export_without_managed_certificates(self):
+        bigip = mock.Mock()
+        key_cert = bigip.pc.Management.KeyCertificate
+        c = mock.Mock()
+        c.certificate.cert_info = {'id': '/Common/ca-bundle'}
+        key_cert.get_certificate_list.return_value = [c]
+        self.assertEqual({}, state.DeviceState(bigip).certificates)
+        self.assertFalse(key_cert.certificate_export_to_pem.called)
+
+    def test_reads_each_object_type_once(self):
+        bigip = mock.Mock()
+        pool = bigip.pc.LocalLB.Pool
+        pool.get_list.return_value = ['/Common/a_80_pl']
+        s = state.DeviceState(bigip)
+        self.assertEqual(['/Common/a_80_pl'], s.pools)
+        self.assertEqual(['/Common/a_80_pl'], s.pools)
+        self.assertEqual(1, pool.get_list.call_count)
+
+    def test_skips_bulk_getters_without_objects(self):
+        bigip = mock.Mock()
+        bigip.pc.LocalLB.Pool.get_list.return_value = []
+        s = state.DeviceState(bigip)
+        self.assertEqual({}, s.pool_members)
+        self.assertFalse(bigip.pc.LocalLB.Pool.get_member_v2.called)
+
+
+class TestDeviceStateSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'state.json.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_and_from_file_round_trip(self):
+        data = _empty_state()
+        pool = '/Common/auth.dpa1.attcompute.com_5000_pl'
+        data['pools'] = [pool]
+        data['pool_members'] = {pool: [['192.168.129.10', 5000]]}
+        state.DeviceState(data=data).save(self.path, host='10.0.0.1')
+        s = state.DeviceState.from_file(self.path)
+        self.assertEqual([pool], s.pools)
+        self.assertEqual({pool: [['192.168.129.10', 5000]]}, s.pool_members)
+
+    def test_plan_from_file_matches_live_plan(self):
+        data = _empty_state()
+        state.DeviceState(data=data).save(self.path)
+        live = plan.Plan(state.DeviceState(data=data), _vips())
+        offline = plan.Plan(state.DeviceState.from_file(self.path),
+                            _vips())
+        self.assertEqual(live.actions(), offline.actions())
+
+    def test_from_file_rejects_other_format(self):
+        with gzip.open(self.path, 'wb') as file:
+            json.dump({'format': 0, 'meta': {}, 'state': {}}, file)
+        with self.assertRaises(ValueError):
+            state.DeviceState.from_file(self.path)
+
+    def test_from_file_rejects_missing_keys(self):
+        doc = {'format': state.DeviceState.FORMAT_VERSION,
+               'meta': {},
+               'state': {'pools': []}}
+        with gzip.open(self.path, 'wb') as file:
+            json.dump(doc, file)
+        with self.assertRaises(ValueError):
+            state.DeviceState.from_file(self.path)
@@ -0,0 +1,79 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import plan
+from bigpyp import pool
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        self.bigip = mock.Mock()
+        self.lb_pool = self.bigip.pc.LocalLB.Pool
+        self.plan = mock.Mock()
+        self.plan.pool_actions.return_value = [
+            plan.Action('pool', 'create_pool', '/Common/a_80_pl',
+                        {'members': ['10.0.0.1'], 'port': 80}),
+            plan.Action('pool', 'create_pool', '/Common/b_80_pl',
+                        {'members': ['10.0.0.2'], 'port': 80}),
+            plan.Action('pool', 'create_pool', '/Common/c_80_pl',
+                        {'members': ['10.0.0.3'], 'port': 80}),
+            plan.Action('pool', 'add_member', '/Common/d_80_pl',
+                        {'member': '10.0.0.4', 'port': 80}),
+            plan.Action('pool', 'add_member', '/Common/d_80_pl',
+                        {'member': '10.0.0.5', 'port': 80})]
+
+    def test_create_sends_one_element_per_call_by_default(self):
+        pool.Pool(self.bigip, self.plan).create()
+        self.assertEqual(3, self.lb_pool.create_v2.call_count)
+        self.assertEqual(2, self.lb_pool.add_member_v2.call_count)
+
+    def test_create_batches_pools_and_members(self):
+        pool.Pool(self.bigip, self.plan, batch_size=100).create()
+        self.assertEqual(1, self.lb_pool.create_v2.call_count)
+        args, kwargs = self.lb_pool.create_v2.call_args
+        self.assertEqual(['/Common/a_80_pl',
+                          '/Common/b_80_pl',
+                          '/Common/c_80_pl'], kwargs['pool_names'])
+        self.assertEqual(1, self.lb_pool.add_member_v2.call_count)
+        args, kwargs = self.lb_pool.add_member_v2.call_args
+        self.assertEqual(['/Common/d_80_pl'], kwargs['pool_names'])
+
+    @mock.patch('bigpyp.pool.time.sleep')
+    def test_create_drains_members_before_removing_them(self, sleep):
+        calls = []
+        self.lb_pool.set_member_session_enabled_state.side_effect = \
+            lambda **kwargs: calls.append('disable')
+        self.lb_pool.remove_member_v2.side_effect = \
+            lambda **kwargs: calls.append('remove')
+        sleep.side_effect = lambda seconds: calls.append(seconds)
+        self.plan.drain = 30
+        self.plan.pool_actions.return_value = [
+            plan.Action('pool', 'remove_member', '/Common/a_80_pl',
+                        {'member': '10.0.0.1', 'port': 80}),
+            plan.Action('pool', 'remove_member', '/Common/b_80_pl',
+                        {'member': '10.0.0.2', 'port': 80}),
+            plan.Action('pool', 'disable_member', '/Common/a_80_pl',
+                        {'member': '10.0.0.1', 'port': 80}),
+            plan.Action('pool', 'disable_member', '/Common/b_80_pl',
+                        {'member': '10.0.0.2', 'port': 80})]
+        pool.Pool(self.bigip, self.plan, batch_size=100).create()
+        self.assertEqual(['disable', 30, 'remove'], calls)
+        args, kwargs = self.lb_pool.remove_member_v2.call_args
+        self.assertEqual(['/Common/a_80_pl', '/Common/b_80_pl'],
+                         kwargs['pool_names'])
@@ -0,0 +1,132 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import json
+import logging
+import shutil
+import tempfile
+
+import mock
+import numpy
+import unittest2 as unittest
+
+from bigpyp import catalog
+from bigpyp import fake_icontrol
+from bigpyp import load_balancer
+from bigpyp import report
+
+
+def _vips(*domains):
+    return catalog.VipCatalog({'load_balancing': dict(
+        (domain, {'dns': domain,
+                  'ip': '10.0.0.{0}'.format(i),
+                  'front_port': 80,
+                  'back_port': 80,
+                  'monitor': 'http',
+                  'members': []})
+        for i, domain in enumerate(domains))})
+
+
+class TestAggregate(unittest.TestCase):
+    def test_sums_members_per_pool(self):
+        members = report.Members(
+            pool=numpy.array([0, 0, 0, 2], numpy.intp),
+            available=numpy.array([True, True, False, True]),
+            enabled=numpy.array([True, False, True, True]),
+            statistics=numpy.array([[1, 30, 100, 1000],
+                                    [0, 0, 0, 0],
+                                    [2, 15, 2 ** 40, 2000],
+                                    [0, 0, 0, 0]], numpy.uint64))
+        rows = report.aggregate(['a', 'b', 'c'], members)
+        self.assertEqual({'pool': 'a',
+                          'members': 3,
+                          'up': 1,
+                          'down': 1,
+                          'disabled': 1,
+                          'current_connections': 3,
+                          'total_connections': 45,
+                          'bytes_in': 2 ** 40 + 100,
+                          'bytes_out': 3000,
+                          'imbalance': 2.0}, rows[0])
+        self.assertEqual((0, None), (rows[1]['members'],
+                                     rows[1]['imbalance']))
+        self.assertEqual((1, 1, None), (rows[2]['members'], rows[2]['up'],
+                                        rows[2]['imbalance']))
+
+
+class TestPoolReport(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = fake_icontrol.FakeIControlServer().start()
+        device = self.server.device
+        device.LocalLB_Pool_create_v2(
+            ['/Common/a_80_pl', '/Common/b_80_pl'],
+            ['LB_METHOD_ROUND_ROBIN'] * 2,
+            [[{'address': '10.1.0.1', 'port': 80},
+              {'address': '10.1.0.2', 'port': 80}],
+             [{'address': '10.2.0.1', 'port': 80}]])
+        members = device.pools['/Common/a_80_pl']['members']
+        members[('10.1.0.1', 80)]['statistics'] = {
+            'STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS': 90,
+            'STATISTIC_SERVER_SIDE_BYTES_IN': 5 * 2 ** 32}
+        members[('10.1.0.2', 80)]['statistics'] = {
+            'STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS': 10}
+        members[('10.1.0.2', 80)]['availability'] = \
+            'AVAILABILITY_STATUS_RED'
+        self.vips = _vips('a', 'b', 'c')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _bigip(self, **kwargs):
+        return load_balancer.BigIP(host=self.server.host, proto='http',
+                                   wsdl_cache=self.tmpdir, **kwargs)
+
+    def test_reports_catalog_pools_in_three_calls(self):
+        rows, missing = report.pool_report(self._bigip(), self.vips)
+        self.assertEqual(['/Common/c_80_pl'], missing)
+        self.assertEqual(['/Common/a_80_pl', '/Common/b_80_pl'],
+                         [r['pool'] for r in rows])
+        a = rows[0]
+        self.assertEqual((2, 1, 1), (a['members'], a['up'], a['down']))
+        self.assertEqual(100, a['total_connections'])
+        self.assertEqual(5 * 2 ** 32, a['bytes_in'])
+        self.assertEqual(1.8, a['imbalance'])
+        self.assertEqual(1, self.server.calls['LocalLB.Pool.get_list'])
+        self.assertEqual(
+            1, self.server.calls['LocalLB.Pool.get_all_member_statistics'])
+        self.assertEqual(
+            1, self.server.calls['LocalLB.Pool.get_member_object_status'])
+
+    def test_fast_path_reports_the_same(self):
+        expected = report.pool_report(self._bigip(), self.vips)
+        fast = self._bigip(fast_path=[
+            'LocalLB.Pool.get_all_member_statistics',
+            'LocalLB.Pool.get_member_object_status'])
+        self.assertEqual(expected, report.pool_report(fast, self.vips))
+
+    def test_prints_json(self):
+        rows, missing = report.pool_report(self._bigip(), self.vips)
+        with mock.patch('sys.stdout') as stdout:
+            report.print_report(rows, missing, as_json=True)
+        doc = json.loads(''.join(c[0][0] for c in stdout.write.call_args_list))
+        self.assertEqual(missing, doc['missing'])
+        self.assertEqual(rows, doc['pools'])
@@ -0,0 +1,145 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import csv
+import logging
+import os
+import shutil
+import tempfile
+
+import mock
+import numpy
+import unittest2 as unittest
+
+from bigpyp import catalog
+from bigpyp import fake_icontrol
+from bigpyp import load_balancer
+from bigpyp import sampler
+
+VS = '/Common/a_80'
+
+
+def _sample(*values):
+    return numpy.array([values], numpy.uint64)
+
+
+class TestRingBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = sampler.RingBuffer(['a'], ['requests'], 3)
+
+    def test_keeps_the_last_samples_in_order(self):
+        for i in range(5):
+            self.buffer.append(float(i), _sample(i * 10))
+        times, values = self.buffer.series('requests')
+        self.assertEqual([2.0, 3.0, 4.0], list(times))
+        self.assertEqual([[20], [30], [40]], values.tolist())
+        self.assertEqual((3, 1), self.buffer.columns['requests'].shape)
+
+    def test_rates_skip_counter_resets(self):
+        for timestamp, value in [(0, 100), (10, 150), (20, 5)]:
+            self.buffer.append(float(timestamp), _sample(value))
+        times, rates = self.buffer.rates('requests')
+        self.assertEqual([10.0, 20.0], list(times))
+        self.assertEqual(5.0, rates[0, 0])
+        self.assertTrue(numpy.isnan(rates[1, 0]))
+
+    def test_rates_of_large_counters(self):
+        self.buffer.append(0.0, _sample(2 ** 60))
+        self.buffer.append(2.0, _sample(2 ** 60 + 8))
+        self.assertEqual(4.0, self.buffer.rates('requests')[1][0, 0])
+
+
+class TestSampler(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = fake_icontrol.FakeIControlServer().start()
+        device = self.server.device
+        device.LocalLB_Pool_create_v2(['/Common/a_80_pl'],
+                                      ['LB_METHOD_ROUND_ROBIN'], [[]])
+        device.LocalLB_VirtualServer_create(
+            [{'name': VS, 'address': '10.0.0.1', 'port': 80}], [],
+            [{'default_pool_name': '/Common/a_80_pl'}],
+            [[{'profile_name': '/Common/http'}]])
+        self.statistics = device.virtual_servers[VS]['statistics']
+        self.bigip = load_balancer.BigIP(host=self.server.host, proto='http',
+                                         wsdl_cache=self.tmpdir)
+        self.now = [100.0]
+        device.clock = lambda: self.now[0]
+        self.sampler = sampler.Sampler(self.bigip, [VS], capacity=4,
+                                       clock=lambda: self.now[0],
+                                       sleep=self._sleep)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _sleep(self, seconds):
+        self.now[0] += seconds
+        self.statistics['STATISTIC_TOTAL_REQUESTS'] = \
+            self.statistics.get('STATISTIC_TOTAL_REQUESTS', 0) + 50
+        self.statistics['STATISTIC_CLIENT_SIDE_CURRENT_CONNECTIONS'] = 7
+
+    def test_virtual_servers_of_the_catalog(self):
+        vips = catalog.VipCatalog({'load_balancing': dict(
+            (name, {'dns': name, 'ip': '10.0.0.1', 'front_port': 80,
+                    'back_port': 80, 'monitor': 'http', 'members': []})
+            for name in ('a', 'b'))})
+        self.assertEqual(([VS], ['/Common/b_80']),
+                         sampler.virtual_servers(self.bigip, vips))
+
+    def test_run_samples_in_one_call_each(self):
+        path = os.path.join(self.tmpdir, 'vs.npz')
+        self.sampler.run(path, interval=10, samples=3)
+        self.assertEqual(
+            3, self.server.calls['LocalLB.VirtualServer.get_statistics'])
+        times, rates = self.sampler.buffer.rates('requests')
+        self.assertEqual([[5.0], [5.0]], rates.tolist())
+        saved = numpy.load(path)
+        self.assertEqual([VS], saved['names'].tolist())
+        self.assertEqual([[0], [50], [100]], saved['requests'].tolist())
+
+    def test_rates_are_timed_by_the_device(self):
+        # Calls that take 3s, 0s and 4s to reach the device, read by a
+        # clock taken before each call.
+        local = iter([97.0, 110.0, 116.0])
+        s = sampler.Sampler(self.bigip, [VS], capacity=4,
+                            clock=lambda: next(local), sleep=self._sleep)
+        s.run(os.path.join(self.tmpdir, 'vs.npz'), interval=10, samples=3)
+        times, rates = s.buffer.rates('requests')
+        self.assertEqual([110.0, 120.0], times.tolist())
+        self.assertEqual([[5.0], [5.0]], rates.tolist())
+
+    def test_saves_rates_as_csv(self):
+        path = os.path.join(self.tmpdir, 'vs.csv')
+        self.sampler.run(path, interval=10, samples=2)
+        with open(path) as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(1, len(rows))
+        self.assertEqual(VS, rows[0]['name'])
+        self.assertEqual('5.000', rows[0]['requests_per_second'])
+        self.assertEqual('7', rows[0]['current_connections'])
+
+    def test_failed_sample_is_skipped(self):
+        self.server.fail('LocalLB.VirtualServer.get_statistics')
+        with mock.patch('bigpyp.utils.print_red') as print_red:
+            self.sampler.run(os.path.join(self.tmpdir, 'vs.npz'),
+                             interval=10, samples=2)
+        self.assertEqual(1, print_red.call_count)
+        self.assertEqual(1, self.sampler.buffer.count)
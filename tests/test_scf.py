@@ -0,0 +1,209 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import copy
+import logging
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import catalog
+from bigpyp import cert
+from bigpyp import fake_icontrol
+from bigpyp import load_balancer
+from bigpyp import plan
+from bigpyp import scf
+
+PUBLIC = 'horizon.dpa1.attcompute.com'
+INTERNAL = 'messaging.int.dpa1.attcompute.com'
+STAGES = ['cert', 'profile', 'rule', 'pool', 'virtual_server']
+CONFIG = ('pools', 'virtual_servers', 'http_profiles', 'ssl_profiles',
+          'tcp_profiles', 'rules')
+
+
+def _pem(text, kind='CERTIFICATE'):
+    return '-----BEGIN {0}-----\n{1}-----END {0}-----\n'.format(
+        kind, text.encode('base64'))
+
+
+class TestRender(unittest.TestCase):
+    def test_covers_only_the_objects_created(self):
+        actions = [
+            plan.Action('pool', 'create_pool', '/Common/a', skip=True),
+            plan.Action('pool', 'set_monitor', '/Common/a',
+                        {'monitor': '/Common/tcp'}),
+            plan.Action('pool', 'create_pool', '/Common/b',
+                        {'members': ['10.0.0.1'], 'port': 80}),
+            plan.Action('pool', 'set_monitor', '/Common/b',
+                        {'monitor': '/Common/http'})]
+        objects = scf.covered(actions)
+        self.assertEqual([('pool', '/Common/b')], objects.keys())
+        self.assertEqual(actions[2:], objects[('pool', '/Common/b')])
+
+    def test_renders_pool(self):
+        objects = scf.covered([
+            plan.Action('pool', 'create_pool', '/Common/b',
+                        {'members': ['10.0.0.1', 'fd00::1'], 'port': 80}),
+            plan.Action('pool', 'set_monitor', '/Common/b',
+                        {'monitor': '/Common/http'})])
+        self.assertEqual('ltm pool /Common/b {\n'
+                         '    load-balancing-mode round-robin\n'
+                         '    members {\n'
+                         '        /Common/10.0.0.1:80 {\n'
+                         '            address 10.0.0.1\n'
+                         '        }\n'
+                         '        /Common/fd00::1.80 {\n'
+                         '            address fd00::1\n'
+                         '        }\n'
+                         '    }\n'
+                         '    monitor /Common/http\n'
+                         '}\n', scf.render(objects))
+
+    def test_renders_virtual_server_profiles(self):
+        objects = scf.covered([
+            plan.Action('virtual_server', 'create_virtual_server',
+                        '/Common/v', {'domain': PUBLIC,
+                                      'address': '10.0.0.2',
+                                      'port': 443,
+                                      'pool': '/Common/b',
+                                      'monitor': 'http',
+                                      'ssl_profile': '/Common/s'})])
+        data = scf.render(objects)
+        self.assertIn('    destination /Common/10.0.0.2:443\n', data)
+        self.assertIn('        /Common/s {\n'
+                      '            context clientside\n', data)
+        self.assertNotIn('source-address-translation', data)
+
+
+class TestBulkLoad(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        certs = os.path.join(self.tmpdir, 'certs')
+        vip_certs = os.path.join(certs, 'dpa1', PUBLIC)
+        os.makedirs(vip_certs)
+        for path, pem in [
+                (os.path.join(certs, 'verisign_intermediate_bundle.crt'),
+                 _pem('bundle')),
+                (os.path.join(vip_certs, PUBLIC + '.pem'),
+                 _pem('key', 'RSA PRIVATE KEY')),
+                (os.path.join(vip_certs, PUBLIC + '.crt'), _pem('cert'))]:
+            with open(path, 'w') as file:
+                file.write(pem)
+        patcher = mock.patch.object(cert.Cert, 'FILE_BASEDIR', certs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.vips = catalog.VipCatalog({'load_balancing': {
+            'horizon': {'dns': PUBLIC, 'ip': '10.0.0.1', 'front_port': 443,
+                        'back_port': 80, 'monitor': 'http',
+                        'members': ['192.168.0.1', '192.168.0.2']},
+            'messaging': {'dns': INTERNAL, 'ip': '10.0.0.2',
+                          'front_port': 5672, 'back_port': 5672,
+                          'monitor': 'tcp_half_open',
+                          'members': ['192.168.0.3']}}})
+        self.server = self._server()
+        self.bigip = self._bigip(self.server)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _server(self):
+        server = fake_icontrol.FakeIControlServer().start()
+        self.addCleanup(server.stop)
+        return server
+
+    def _bigip(self, server):
+        return load_balancer.BigIP(
+            host=server.host, proto='http',
+            wsdl_cache=os.path.join(self.tmpdir, 'wsdl'))
+
+    def _config(self, device):
+        return dict((key, copy.deepcopy(getattr(device, key)))
+                    for key in CONFIG)
+
+    def test_matches_applying_each_stage(self):
+        load_balancer.apply_zone(self.bigip, self.vips, STAGES,
+                                 bulk_load=True)
+        server = self._server()
+        load_balancer.apply_zone(self._bigip(server), self.vips, STAGES)
+        self.assertEqual(self._config(server.device),
+                         self._config(self.server.device))
+
+    def test_creates_objects_with_one_load(self):
+        load_balancer.apply_zone(self.bigip, self.vips, STAGES,
+                                 bulk_load=True)
+        calls = self.server.calls
+        self.assertEqual(
+            1, calls['System.ConfigSync.install_single_configuration_file'])
+        for method in ['LocalLB.Pool.create_v2',
+                       'LocalLB.VirtualServer.create',
+                       'LocalLB.ProfileClientSSL.create_v2',
+                       'LocalLB.Rule.create']:
+            self.assertNotIn(method, calls)
+
+    def test_existing_objects_are_left_to_their_stages(self):
+        load_balancer.apply_zone(self.bigip, self.vips, STAGES,
+                                 bulk_load=True)
+        pool = '/Common/{0}_5672_pl'.format(INTERNAL)
+        self.server.device.pools[pool]['members'].clear()
+        self.server.calls.clear()
+        load_balancer.apply_zone(self.bigip, self.vips, STAGES,
+                                 bulk_load=True)
+        self.assertNotIn('System.ConfigSync.upload_file', self.server.calls)
+        self.assertEqual(1, self.server.calls['LocalLB.Pool.add_member_v2'])
+        self.assertEqual([('192.168.0.3', 5672)],
+                         self.server.device.pools[pool]['members'].keys())
+
+    def test_objects_missing_after_the_load_raise(self):
+        with mock.patch.object(
+                fake_icontrol.FakeDevice,
+                'System_ConfigSync_install_single_configuration_file'):
+            with self.assertRaisesRegexp(scf.LoadError, 'create_pool'):
+                load_balancer.apply_zone(self.bigip, self.vips, STAGES,
+                                         bulk_load=True)
+
+    def test_failed_load_changes_nothing(self):
+        self.server.device.monitors.remove('/Common/tcp_half_open')
+        before = self._config(self.server.device)
+        self.assertRaises(Exception, load_balancer.apply_zone, self.bigip,
+                          self.vips, STAGES, bulk_load=True)
+        self.assertEqual(before, self._config(self.server.device))
+
+    def test_loaded_file_is_deleted(self):
+        load_balancer.apply_zone(self.bigip, self.vips, STAGES,
+                                 bulk_load=True)
+        self.assertEqual(1, self.server.calls['System.ConfigSync.delete_file'])
+        self.assertEqual({}, self.server.device.files)
+
+    def test_failed_load_deletes_file(self):
+        self.server.fail(
+            'System.ConfigSync.install_single_configuration_file')
+        self.assertRaises(Exception, load_balancer.apply_zone, self.bigip,
+                          self.vips, STAGES, bulk_load=True)
+        self.assertEqual({}, self.server.device.files)
+
+    def test_upload_sends_chunks(self):
+        scf.upload(self.bigip, '/var/local/scf/a.scf', 'abcdefghij',
+                   chunk_size=4)
+        self.assertEqual('abcdefghij',
+                         self.server.device.files['/var/local/scf/a.scf'])
+        self.assertEqual(3, self.server.calls['System.ConfigSync.upload_file'])
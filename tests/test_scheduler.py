@@ -0,0 +1,77 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import threading
+import time
+
+import unittest2 as unittest
+
+from bigpyp import load_balancer
+from bigpyp import scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.stages = load_balancer.STAGES.keys()
+        self.finished = []
+        self.lock = threading.Lock()
+
+    def _record(self, stage):
+        time.sleep(0.01)
+        with self.lock:
+            self.finished.append(stage)
+
+    def test_runs_dependencies_first(self):
+        scheduler.Scheduler(self.stages, 4).run(self._record)
+        self.assertEqual(set(self.stages), set(self.finished))
+        order = self.finished.index
+        self.assertLess(order('cert'), order('profile'))
+        self.assertLess(order('profile'), order('virtual_server'))
+        self.assertLess(order('pool'), order('virtual_server'))
+
+    def test_runs_independent_stages_at_once(self):
+        running = []
+        peak = []
+
+        def fn(stage):
+            with self.lock:
+                running.append(stage)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with self.lock:
+                running.remove(stage)
+
+        scheduler.Scheduler(['system', 'rule', 'monitor'], 3).run(fn)
+        self.assertEqual(3, max(peak))
+
+    def test_ignores_dependencies_not_selected(self):
+        scheduler.Scheduler(['virtual_server'], 2).run(self._record)
+        self.assertEqual(['virtual_server'], self.finished)
+
+    def test_failure_skips_dependents(self):
+        def fn(stage):
+            if stage == 'cert':
+                raise ValueError('boom')
+            self._record(stage)
+
+        s = scheduler.Scheduler(self.stages, 4)
+        with self.assertRaises(scheduler.StageError) as cm:
+            s.run(fn)
+        self.assertEqual(['cert'], cm.exception.failures.keys())
+        self.assertEqual(set(['profile', 'virtual_server']),
+                         cm.exception.skipped)
+        self.assertNotIn('profile', self.finished)
+        self.assertIn('pool', self.finished)
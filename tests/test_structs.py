@@ -0,0 +1,75 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import fake_icontrol
+from bigpyp import load_balancer
+from bigpyp import structs
+
+
+class TestStructFactory(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        cls.level = logger.level
+        logger.setLevel(logging.INFO)
+        cls.server = fake_icontrol.FakeIControlServer().start()
+        cls.tmpdir = tempfile.mkdtemp()
+        b = load_balancer.BigIP(host=cls.server.host, proto='http',
+                                wsdl_cache=cls.tmpdir)
+        cls.pool = b.pc.LocalLB.Pool
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        shutil.rmtree(cls.tmpdir)
+        logging.getLogger('suds').setLevel(cls.level)
+
+    def test_create_matches_typefactory(self):
+        expected = self.pool.typefactory.create('Common.AddressPort')
+        expected.address = '10.0.0.1'
+        expected.port = 80
+        factory = structs.StructFactory(self.pool)
+        result = factory.create('Common.AddressPort', address='10.0.0.1',
+                                port=80)
+        self.assertEqual(str(expected), str(result))
+        self.assertIs(expected.__class__, result.__class__)
+
+    def test_create_returns_independent_structs(self):
+        factory = structs.StructFactory(self.pool)
+        first = factory.create('LocalLB.MonitorRule',
+                               monitor_templates=['/Common/http'])
+        second = factory.create('LocalLB.MonitorRule')
+        self.assertNotEqual(first.monitor_templates,
+                            second.monitor_templates)
+        self.assertIs(first.__metadata__, second.__metadata__)
+
+    def test_create_resolves_type_once(self):
+        interface = mock.Mock()
+        interface.typefactory.create.side_effect = \
+            self.pool.typefactory.create
+        factory = structs.StructFactory(interface)
+        for i in range(3):
+            factory.create('Common.AddressPort', address='10.0.0.1', port=i)
+        interface.typefactory.create.assert_called_once_with(
+            'Common.AddressPort')
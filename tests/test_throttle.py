@@ -0,0 +1,178 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+import shutil
+import socket
+import tempfile
+import threading
+
+import mock
+import unittest2 as unittest
+
+from suds import WebFault
+
+from bigpyp import fake_icontrol
+from bigpyp import load_balancer
+from bigpyp import metrics
+from bigpyp import throttle
+
+
+class TestLimiter(unittest.TestCase):
+    def setUp(self):
+        self.now = [100.0]
+        self.m = metrics.Metrics()
+        self.limiter = throttle.Limiter(8, initial=4, slow=5.0,
+                                        metrics=self.m,
+                                        clock=lambda: self.now[0])
+
+    def _call(self, seconds=0.1, overloaded=False):
+        self.limiter.acquire()
+        self.limiter.release(seconds, overloaded)
+
+    def _gauge(self):
+        return [g['value'] for g in self.m.to_dict()['gauges']
+                if g['name'] == 'concurrency_limit'][0]
+
+    def test_grows_by_one_per_round_of_calls(self):
+        for i in range(5):
+            self._call()
+        self.assertEqual(5, int(self.limiter.limit))
+        self.assertEqual(5, self._gauge())
+
+    def test_never_exceeds_maximum(self):
+        for i in range(100):
+            self._call()
+        self.assertEqual(8, self.limiter.limit)
+
+    def test_halves_once_per_burst_of_overloads(self):
+        self._call(overloaded=True)
+        self._call(overloaded=True)
+        self.assertEqual(2, self.limiter.limit)
+        self.now[0] += 5
+        self._call(seconds=6)
+        self.assertEqual(1, self.limiter.limit)
+        self.now[0] += 5
+        self._call(overloaded=True)
+        self.assertEqual(1, self.limiter.limit)
+        self.assertEqual(1, self._gauge())
+
+    def test_acquire_waits_under_the_limit(self):
+        limiter = throttle.Limiter(1, initial=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def acquire():
+            limiter.acquire()
+            acquired.set()
+        t = threading.Thread(target=acquire)
+        t.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release(0.1)
+        self.assertTrue(acquired.wait(1))
+        t.join()
+
+
+class TestDeviceLimiter(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(throttle._limiters, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _gauge(self, m):
+        return [g['value'] for g in m.to_dict()['gauges']
+                if g['name'] == 'concurrency_limit']
+
+    def test_shared_per_host_and_maximum(self):
+        limiter = throttle.device_limiter('10.0.0.1', 8)
+        self.assertIs(limiter, throttle.device_limiter('10.0.0.1', 8))
+        self.assertIsNot(limiter, throttle.device_limiter('10.0.0.1', 16))
+        self.assertEqual(16, throttle.device_limiter('10.0.0.1', 16).maximum)
+
+    def test_reports_to_every_callers_metrics(self):
+        first, second = metrics.Metrics(), metrics.Metrics()
+        limiter = throttle.device_limiter('10.0.0.1', 8, first)
+        throttle.device_limiter('10.0.0.1', 8, second)
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True)
+        self.assertEqual([2], self._gauge(first))
+        self.assertEqual([2], self._gauge(second))
+
+
+class TestThrottle(unittest.TestCase):
+    def setUp(self):
+        self.sleep = mock.Mock()
+        self.throttle = throttle.Throttle(throttle.Limiter(4), retries=2,
+                                          sleep=self.sleep)
+
+    def test_retries_reads_with_growing_backoff(self):
+        method = mock.Mock(side_effect=[socket.error('reset'),
+                                        socket.error('reset'), 'ok'])
+        with mock.patch('random.uniform', side_effect=lambda a, b: b):
+            result = self.throttle.wrap('LocalLB.Pool', 'get_list', method)()
+        self.assertEqual('ok', result)
+        self.assertEqual([mock.call(0.5), mock.call(1.0)],
+                         self.sleep.call_args_list)
+
+    def test_gives_up_after_retries(self):
+        method = mock.Mock(side_effect=socket.error('reset'))
+        call = self.throttle.wrap('LocalLB.Pool', 'get_list', method)
+        self.assertRaises(socket.error, call)
+        self.assertEqual(3, method.call_count)
+
+    def test_does_not_retry_writes(self):
+        method = mock.Mock(side_effect=socket.error('reset'))
+        call = self.throttle.wrap('LocalLB.Pool', 'create_v2', method)
+        self.assertRaises(socket.error, call)
+        self.assertEqual(1, method.call_count)
+
+    def test_does_not_retry_other_errors(self):
+        method = mock.Mock(side_effect=KeyError('a'))
+        call = self.throttle.wrap('LocalLB.Pool', 'get_list', method)
+        self.assertRaises(KeyError, call)
+        self.assertEqual(1, method.call_count)
+        self.assertEqual(0, self.throttle.limiter.inflight)
+
+
+class TestThrottledBigIP(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = fake_icontrol.FakeIControlServer().start()
+        self.m = metrics.Metrics()
+        self.b = load_balancer.BigIP(host=self.server.host, proto='http',
+                                     wsdl_cache=self.tmpdir, metrics=self.m,
+                                     max_inflight=8)
+        self.b.throttle._sleep = mock.Mock()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_retries_reads_the_device_is_too_busy_for(self):
+        self.server.fail('LocalLB.Pool.get_list', msg='Operation timed out')
+        self.assertEqual([], self.b.pc.LocalLB.Pool.get_list())
+        self.assertEqual(2, self.server.calls['LocalLB.Pool.get_list'])
+        gauges = [g['name'] for g in self.m.to_dict()['gauges']]
+        self.assertIn('concurrency_limit', gauges)
+
+    def test_reports_faults_of_the_call_itself(self):
+        self.server.fail('LocalLB.Pool.get_list', msg='Pool not found')
+        self.assertRaises(WebFault, self.b.pc.LocalLB.Pool.get_list)
+        self.assertEqual(1, self.server.calls['LocalLB.Pool.get_list'])
@@ -0,0 +1,150 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import BaseHTTPServer
+import errno
+import gzip
+import httplib
+import socket
+import SocketServer
+import StringIO
+import threading
+
+import mock
+import unittest2 as unittest
+
+from suds import transport as suds_transport
+
+from bigpyp import transport
+
+
+class EchoHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length']))
+        if self.headers.get('content-encoding') == 'gzip':
+            body = gzip.GzipFile(fileobj=StringIO.StringIO(body)).read()
+        self.server.seen.append(self.headers.get('authorization'))
+        code = 500 if body == 'fail' else 200
+        reply = 'echo:' + body
+        self.send_response(code)
+        if 'gzip' in self.headers.get('accept-encoding', ''):
+            buf = StringIO.StringIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as file:
+                file.write(reply)
+            reply = buf.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Connections the tests close on purpose reset.
+        pass
+
+
+class TestKeepAliveTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), EchoHandler)
+        self.server.seen = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:{0}/iControl/iControlPortal.cgi'.format(
+            self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _send(self, t, message):
+        return t.send(suds_transport.Request(self.url, message))
+
+    def test_reuses_one_connection(self):
+        t = transport.KeepAliveTransport('admin', 'admin')
+        for i in range(3):
+            reply = self._send(t, 'call{0}'.format(i))
+            self.assertEqual('echo:call{0}'.format(i), reply.message)
+        self.assertEqual(1, t.opened)
+        self.assertEqual(2, t.reused)
+        self.assertEqual([3], [s['requests'] for s in t.stats()])
+        t.close()
+
+    def test_sends_credentials_up_front(self):
+        t = transport.KeepAliveTransport('admin', 'secret')
+        self._send(t, 'call')
+        self.assertEqual(['Basic YWRtaW46c2VjcmV0'], self.server.seen)
+        t.close()
+
+    def test_gzip_round_trip(self):
+        t = transport.KeepAliveTransport('admin', 'admin', compress=True)
+        reply = self._send(t, 'compressed')
+        self.assertEqual('echo:compressed', reply.message)
+        t.close()
+
+    def test_error_raises_transport_error(self):
+        t = transport.KeepAliveTransport('admin', 'admin')
+        with self.assertRaises(suds_transport.TransportError) as cm:
+            self._send(t, 'fail')
+        self.assertEqual(500, cm.exception.httpcode)
+        self.assertEqual('echo:fail', cm.exception.fp.read())
+        t.close()
+
+    def _stale(self, t, method, error):
+        # Leave one idle connection which fails the next request.
+        self._send(t, 'first')
+        conn = t._pool.idle.values()[0][0].connection
+        setattr(conn, method, mock.Mock(side_effect=error))
+
+    def test_resends_over_connection_closed_before_response(self):
+        t = transport.KeepAliveTransport('admin', 'admin')
+        self._stale(t, 'getresponse', httplib.BadStatusLine(
+            'No status line received - the server has closed the '
+            'connection'))
+        self.assertEqual('echo:call', self._send(t, 'call').message)
+        self.assertEqual(2, t.opened)
+        t.close()
+
+    def test_resends_over_connection_reset_while_sending(self):
+        t = transport.KeepAliveTransport('admin', 'admin')
+        self._stale(t, 'request', socket.error(errno.EPIPE, 'Broken pipe'))
+        self.assertEqual('echo:call', self._send(t, 'call').message)
+        self.assertEqual(2, t.opened)
+        t.close()
+
+    def test_does_not_resend_after_timeout(self):
+        t = transport.KeepAliveTransport('admin', 'admin')
+        self._stale(t, 'getresponse', socket.timeout('timed out'))
+        self.assertRaises(socket.timeout, self._send, t, 'call')
+        self.assertEqual(1, t.opened)
+        t.close()
+
+    def test_does_not_resend_after_reset_awaiting_response(self):
+        t = transport.KeepAliveTransport('admin', 'admin')
+        self._stale(t, 'getresponse',
+                    socket.error(errno.ECONNRESET, 'Connection reset'))
+        self.assertRaises(socket.error, self._send, t, 'call')
+        self.assertEqual(1, t.opened)
+        self.assertEqual([], t.stats())
+        t.close()
@@ -16,6 +16,7 @@
 
 import unittest2 as unittest
 
+from bigpyp import plan
 from bigpyp import utils
 
 
@@ -49,3 +50,42 @@ class TestUtils(unittest.TestCase):
         domain = 'foo.dpa1.attcompute.com'
         result = utils.ssl_profile_name(domain)
         self.assertEqual('/Common/foo.dpa1.attcompute.com_pr', result)
+
+    def test_chunks(self):
+        result = list(utils.chunks(range(5), 2))
+        self.assertEqual([[0, 1], [2, 3], [4]], result)
+
+    def test_apply_actions_groups_by_op_in_batches(self):
+        calls = []
+
+        class Stage(object):
+            def _a(self, actions):
+                calls.append(('a', [x.name for x in actions]))
+
+            def _b(self, actions):
+                calls.append(('b', [x.name for x in actions]))
+
+        actions = [plan.Action('s', 'a', '1'),
+                   plan.Action('s', 'b', '1'),
+                   plan.Action('s', 'a', '2', skip=True),
+                   plan.Action('s', 'a', '3'),
+                   plan.Action('s', 'a', '4')]
+        utils.apply_actions(Stage(), actions, batch_size=2)
+        self.assertEqual([('a', ['2']),
+                          ('a', ['1', '3']),
+                          ('a', ['4']),
+                          ('b', ['1'])], calls)
+
+    def test_pem_fingerprint_ignores_formatting(self):
+        pem = ('-----BEGIN CERTIFICATE-----\nZGV2aWNl\nY2VydA==\n'
+               '-----END CERTIFICATE-----\n')
+        reformatted = pem.replace('\n', '\r\n').replace('ZGV2aWNl\r\n',
+                                                        'ZGV2aWNl')
+        self.assertEqual(utils.pem_fingerprint(pem),
+                         utils.pem_fingerprint('subject=x\n' + reformatted))
+
+    def test_pem_fingerprint_differs_by_certificate(self):
+        a = '-----BEGIN CERTIFICATE-----\nYQ==\n-----END CERTIFICATE-----'
+        b = '-----BEGIN CERTIFICATE-----\nYg==\n-----END CERTIFICATE-----'
+        self.assertNotEqual(utils.pem_fingerprint(a),
+                            utils.pem_fingerprint(b))
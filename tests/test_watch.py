@@ -0,0 +1,143 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import logging
+import os
+import shutil
+import tempfile
+
+import mock
+import unittest2 as unittest
+import yaml
+
+from bigpyp import catalog
+from bigpyp import cert
+from bigpyp import fake_icontrol
+from bigpyp import ledger
+from bigpyp import load_balancer
+from bigpyp import watch
+
+DOMAIN = 'messaging.int.dpa1.attcompute.com'
+POOL = '/Common/{0}_5672_pl'.format(DOMAIN)
+VS = '/Common/{0}_5672'.format(DOMAIN)
+STAGES = ['cert', 'profile', 'rule', 'pool', 'virtual_server']
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        # suds fails formatting some of its own debug messages.
+        logger = logging.getLogger('suds')
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.INFO)
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = fake_icontrol.FakeIControlServer().start()
+        self.device = self.server.device
+        certs = os.path.join(self.tmpdir, 'certs')
+        os.makedirs(certs)
+        with open(os.path.join(certs, 'verisign_intermediate_bundle.crt'),
+                  'w') as file:
+            file.write('-----BEGIN CERTIFICATE-----\n{0}'
+                       '-----END CERTIFICATE-----\n'.format(
+                           'bundle'.encode('base64')))
+        patcher = mock.patch.object(cert.Cert, 'FILE_BASEDIR', certs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = os.path.join(self.tmpdir, 'a_vips.yml')
+        self._write_catalog(['192.168.129.20'])
+        self.bigip = load_balancer.BigIP(
+            host=self.server.host, proto='http',
+            wsdl_cache=os.path.join(self.tmpdir, 'wsdl'))
+        self.ledger = ledger.Ledger(os.path.join(self.tmpdir, 'ledger.json'))
+        self.sleep = mock.Mock()
+        self.watcher = watch.Watcher(self.bigip, self.path, STAGES,
+                                     self._load, self._apply, self.ledger,
+                                     sleep=self.sleep)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _write_catalog(self, members):
+        doc = {'load_balancing': {
+            'messaging': {'dns': DOMAIN,
+                          'ip': '10.0.0.2',
+                          'front_port': 5672,
+                          'back_port': 5672,
+                          'monitor': 'tcp_half_open',
+                          'members': members}}}
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) \
+            else 0
+        with open(self.path, 'w') as file:
+            yaml.dump(doc, file)
+        # Within the same second, the mtime alone would not move.
+        os.utime(self.path, (mtime + 1, mtime + 1))
+
+    def _load(self):
+        return catalog.VipCatalog(catalog.load(self.path, None))
+
+    def _apply(self, vips, stages, zone_ledger):
+        load_balancer.apply_zone(self.bigip, vips, stages,
+                                 ledger=zone_ledger)
+
+    def _members(self):
+        return self.device.pools[POOL]['members'].keys()
+
+    def test_first_check_applies_everything(self):
+        self.assertEqual(STAGES, self.watcher.check())
+        self.assertEqual([('192.168.129.20', 5672)], self._members())
+        self.assertEqual(self.device.config_time,
+                         int(self.ledger.generation))
+
+    def test_unchanged_check_only_reads_generation(self):
+        self.watcher.check()
+        self.server.calls.clear()
+        self.assertEqual([], self.watcher.check())
+        self.assertEqual({'Management.DBVariable.query': 1},
+                         dict(self.server.calls))
+
+    def test_catalog_change_is_applied(self):
+        self.watcher.check()
+        self._write_catalog(['192.168.129.20', '192.168.129.21'])
+        self.watcher.check()
+        self.assertEqual([('192.168.129.20', 5672), ('192.168.129.21', 5672)],
+                         self._members())
+
+    def test_removed_object_reconciles_its_stage(self):
+        self.watcher.check()
+        del self.device.virtual_servers[VS]
+        self.device.config_time += 1
+        self.server.calls.clear()
+        self.assertEqual(['virtual_server'], self.watcher.check())
+        self.assertIn(VS, self.device.virtual_servers)
+        self.assertNotIn('LocalLB.Pool.get_member_v2', self.server.calls)
+        self.assertEqual(self.device.config_time,
+                         int(self.ledger.generation))
+
+    def test_object_edited_in_place_reconciles_every_stage(self):
+        self.watcher.check()
+        self.device.call('LocalLB.Pool', 'remove_member_v2',
+                         {'pool_names': [POOL],
+                          'members': [[{'address': '192.168.129.20',
+                                        'port': 5672}]]})
+        self.assertEqual([], self._members())
+        self.assertEqual(STAGES, self.watcher.check())
+        self.assertEqual([('192.168.129.20', 5672)], self._members())
+
+    def test_run_reports_failed_checks_and_retries(self):
+        self.server.fail('LocalLB.Pool.get_list', msg='boom')
+        self.watcher.run(checks=2)
+        self.assertEqual(1, self.sleep.call_count)
+        self.assertEqual([('192.168.129.20', 5672)], self._members())
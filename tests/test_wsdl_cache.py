@@ -0,0 +1,158 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013, AT&T Services, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+
+import multiprocessing
+import os
+import shutil
+import ssl
+import StringIO
+import tempfile
+
+import mock
+import unittest2 as unittest
+
+from bigpyp import load_balancer
+from bigpyp import transport
+from bigpyp import wsdl_cache
+
+
+def _cold_start(directory):
+    # One fleet worker filling the cache of a device the others fill too.
+    cache = wsdl_cache.WsdlCache('10.0.0.1', directory)
+    staging = cache.stage()
+    with open(os.path.join(staging, 'System.SystemInfo.wsdl'), 'w') as file:
+        file.write('<definitions/>')
+    cache.commit(staging, 'v11')
+    return cache.is_fresh('v11', ['System.SystemInfo'])
+
+
+class TestWsdlCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = wsdl_cache.WsdlCache('10.0.0.1', self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _stage(self, wsdls):
+        staging = self.cache.stage()
+        for wsdl in wsdls:
+            with open(os.path.join(staging, wsdl + '.wsdl'), 'w') as file:
+                file.write('<definitions/>')
+        return staging
+
+    def test_version_is_none_when_empty(self):
+        self.assertEqual(None, self.cache.version())
+
+    def test_commit_records_version(self):
+        self.cache.commit(self._stage(['LocalLB.Pool']), 'BIG-IP_v11.4.1')
+        self.assertEqual('BIG-IP_v11.4.1', self.cache.version())
+        self.assertTrue(self.cache.is_fresh('BIG-IP_v11.4.1',
+                                            ['LocalLB.Pool']))
+
+    def test_commit_adds_to_published_version_unless_replacing(self):
+        self.cache.commit(self._stage(['LocalLB.Pool']), 'v11')
+        self.cache.commit(self._stage(['LocalLB.Rule']), 'v11')
+        self.assertTrue(self.cache.is_fresh('v11', ['LocalLB.Pool',
+                                                    'LocalLB.Rule']))
+        self.cache.commit(self._stage(['LocalLB.Pool']), 'v11', replace=True)
+        self.assertTrue(self.cache.is_fresh('v11', ['LocalLB.Pool']))
+        self.assertFalse(self.cache.is_fresh('v11', ['LocalLB.Rule']))
+        staged = [f for f in os.listdir(os.path.join(self.directory,
+                                                     '10.0.0.1'))
+                  if f.startswith('.st')]
+        self.assertEqual([], staged)
+
+    def test_concurrent_cold_starts(self):
+        workers = multiprocessing.Pool(8)
+        try:
+            results = workers.map(_cold_start, [self.directory] * 48)
+        finally:
+            workers.close()
+            workers.join()
+        self.assertEqual([True] * 48, results)
+        self.assertEqual('v11', self.cache.version())
+
+    def test_is_fresh_false_when_wsdl_missing(self):
+        self.cache.commit(self._stage(['LocalLB.Pool']), 'v11')
+        self.assertFalse(self.cache.is_fresh('v11', ['LocalLB.Pool',
+                                                     'LocalLB.Rule']))
+
+    def test_download_fetches_over_the_given_transport(self):
+        t = mock.Mock()
+        t.open.return_value = StringIO.StringIO('<definitions/>')
+        path = os.path.join(self.directory, 'v11')
+        self.cache.download('LocalLB.Pool', path, t)
+        url = t.open.call_args[0][0].url
+        self.assertEqual('https://10.0.0.1/iControl/iControlPortal.cgi'
+                         '?WSDL=LocalLB.Pool', url)
+        with open(os.path.join(path, 'LocalLB.Pool.wsdl')) as file:
+            self.assertEqual('<definitions/>', file.read())
+
+    def test_is_fresh_false_when_too_old(self):
+        self.cache.commit(self._stage(['LocalLB.Pool']), 'v11')
+        f = os.path.join(self.cache.path('v11'), 'LocalLB.Pool.wsdl')
+        os.utime(f, (0, 0))
+        self.assertFalse(self.cache.is_fresh('v11', ['LocalLB.Pool']))
+
+
+class TestBigIPWsdlCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        wsdls = load_balancer.BigIP.WSDL_LIST
+        cache = wsdl_cache.WsdlCache('10.0.0.1', self.directory)
+        staging = cache.stage()
+        for wsdl in wsdls:
+            open(os.path.join(staging, wsdl + '.wsdl'), 'w').close()
+        cache.commit(staging, 'v11')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @mock.patch.object(wsdl_cache.WsdlCache, 'download')
+    @mock.patch('pycontrol.pycontrol.BIGIP')
+    def test_warm_start_skips_download(self, bigip, download):
+        bigip.return_value.System.SystemInfo.get_version.return_value = 'v11'
+        b = load_balancer.BigIP(host='10.0.0.1', wsdl_cache=self.directory)
+        b.pc.LocalLB.Pool.get_list()
+        self.assertFalse(download.called)
+        kwargs = bigip.call_args[1]
+        self.assertFalse(kwargs['fromurl'])
+        self.assertEqual(['LocalLB.Pool'], kwargs['wsdls'])
+
+    @mock.patch.object(wsdl_cache.WsdlCache, 'download')
+    @mock.patch('pycontrol.pycontrol.BIGIP')
+    def test_version_change_fetches_again(self, bigip, download):
+        bigip.return_value.System.SystemInfo.get_version.return_value = 'v12'
+        b = load_balancer.BigIP(host='10.0.0.1', wsdl_cache=self.directory)
+        b.pc.LocalLB.Pool.get_list()
+        wsdls = [args[0] for args, kwargs in download.call_args_list]
+        self.assertEqual(['System.SystemInfo', 'LocalLB.Pool'], wsdls)
+
+    @mock.patch.object(wsdl_cache.WsdlCache, 'download')
+    @mock.patch('pycontrol.pycontrol.BIGIP')
+    def test_download_uses_the_calls_ssl_settings(self, bigip, download):
+        bigip.return_value.System.SystemInfo.get_version.return_value = 'v12'
+        for keepalive in [True, False]:
+            download.reset_mock()
+            b = load_balancer.BigIP(host='10.0.0.1', keepalive=keepalive,
+                                    verify_ssl=False,
+                                    wsdl_cache=self.directory,
+                                    refresh_wsdl=True)
+            b.pc.LocalLB.Pool.get_list()
+            t = download.call_args[0][2]
+            self.assertIsInstance(t, transport.KeepAliveTransport)
+            self.assertEqual(ssl.CERT_NONE, t._context.verify_mode)